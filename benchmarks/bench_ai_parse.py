@@ -0,0 +1,123 @@
+"""Compares the old CSV round-trip AI parse with the structured-record path.
+
+Both paths are fed the same stubbed Gemini responses, so only local parsing
+cost is measured.
+
+    PYTHONPATH=src python benchmarks/bench_ai_parse.py [invoices] [lines]
+"""
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from constants.dates import DATE_M_D_Y
+from parsers.invoices import AIParser, get_description, make_clinic_abbreviation, parse_ai_invoices
+
+DESCRIPTIONS = [
+    "office exam", "dhpp vaccine", "bordetella vaccination", "apoquel 16mg", "cbc bloodwork",
+    "heartworm test", "nail trim", "microchip", "simparica 20.1-44lb", "fecal flotation",
+    "spay surgery", "bandage change", "k9 treats", "cerenia 24mg", "ear cytology",
+]
+
+
+def make_records(invoices: int, lines: int, seed: int = 7) -> list[list[dict]]:
+    rng = random.Random(seed)
+    fixtures = []
+    for n in range(invoices):
+        day = rng.randint(1, 28)
+        fixtures.append([
+            {
+                "clinic": "Kailua Animal Clinic",
+                "invoiceNumber": str(10000 + n),
+                "date": f"03/{day:02d}/2024",
+                "dogName": rng.choice(["Mochi", "Bella Rose", "Koa", "Lani"]),
+                "description": rng.choice(DESCRIPTIONS),
+                "quantity": 1,
+                "totalPrice": round(rng.uniform(5, 300), 2),
+            }
+            for _ in range(lines)
+        ])
+    return fixtures
+
+
+def legacy_parse(csv_string: str) -> pd.DataFrame:
+    """The pre-structured-output AIParser.parse_invoice, kept here for comparison."""
+    df = pd.read_csv(io.StringIO(csv_string))
+    df["date"] = pd.to_datetime(df["date"])
+    clinic = df["clinic"].values[0]
+    make_clinic_abbreviation(clinic)
+    invoice_items = []
+
+    def _inner_parse(row) -> None:
+        charges = {}
+        date = row["date"]
+        price = row["totalPrice"]
+        description = row["description"]
+        if not description and price <= 0:
+            invoice_items.append({})
+            return
+        charges["COSTDATE"] = date.strftime(DATE_M_D_Y)
+        charges["COSTDESCRIPTION"] = f"[{row['clinic']} - {row['invoiceNumber']} - {date.date()}] "
+        charges["COSTAMOUNT"] = price
+        charges["ANIMALNAME"] = row["dogName"]
+        invoice_items.append(get_description(description, charges, date))
+
+    df.apply(lambda x: _inner_parse(x), axis=1)
+    return pd.DataFrame(invoice_items)
+
+
+def structured_parse(records: list[dict]) -> pd.DataFrame:
+    parser = AIParser("", Path("bench.pdf"), is_drive=True)
+    parser.parse_invoice(records=records)
+    return parser.items
+
+
+def batched_parse(fixtures: list[list[dict]]) -> list[pd.DataFrame]:
+    """How the processor parses its queue of unknown-clinic invoices."""
+    parsers = [AIParser("", Path("bench.pdf"), is_drive=True) for _ in fixtures]
+    parse_ai_invoices(parsers, fixtures)
+    return [parser.items for parser in parsers]
+
+
+def main(invoices: int = 200, lines: int = 15) -> None:
+    fixtures = make_records(invoices, lines)
+    csv_responses = [pd.DataFrame(records).to_csv(index=False) for records in fixtures]
+
+    # Warm the fuzzy matchers so neither path pays first-call costs
+    legacy_parse(csv_responses[0])
+    structured_parse(fixtures[0])
+
+    start = time.perf_counter()
+    legacy = [legacy_parse(csv) for csv in csv_responses]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    structured = [structured_parse(records) for records in fixtures]
+    structured_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = batched_parse(fixtures)
+    batched_time = time.perf_counter() - start
+
+    def _same(old: pd.DataFrame, new: pd.DataFrame) -> bool:
+        return new[old.columns].fillna("").astype(str).equals(old.fillna("").astype(str))
+
+    total = invoices * lines
+    print(f"{invoices} invoices x {lines} lines ({total} charges)")
+    for label, seconds in [
+        ("csv + row apply", legacy_time),
+        ("structured, per invoice", structured_time),
+        ("structured, whole queue", batched_time),
+    ]:
+        print(
+            f"  {label:24}: {seconds:8.3f}s  {total / seconds:10.0f} charges/s"
+            f"  {legacy_time / seconds:6.2f}x"
+        )
+    print(f"  identical output        : {all(map(_same, legacy, structured)) and all(map(_same, legacy, batched))}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,73 @@
+"""Charge-date parsing for 100k charge lines, strptime loop vs DateParser.
+
+Lines come in invoices of 20, each invoice using its clinic's date shape and
+a few distinct service dates, as the parsers see them.
+
+    PYTHONPATH=src python benchmarks/bench_dates.py [lines]
+"""
+import random
+import sys
+import time
+from datetime import datetime as dt, timedelta as td
+from pathlib import Path
+
+from parsers.dates import DateParser
+from parsers.invoices import DATE_FORMATS, WaipioParser
+
+SHAPES = [
+    lambda d: d.strftime("%m-%d-%y"),
+    lambda d: f"{d.month}/{d.day}/{d.year}",
+    lambda d: d.strftime("%m-%d-%Y"),
+]
+LINES_PER_INVOICE = 20
+
+
+def make_invoices(lines: int, seed: int = 3) -> list[list[str]]:
+    rng = random.Random(seed)
+    invoices = []
+    for _ in range(lines // LINES_PER_INVOICE):
+        shape = rng.choice(SHAPES)
+        first = dt(2023, 1, 1) + td(days=rng.randint(0, 700))
+        dates = [shape(first + td(days=i)) for i in range(rng.randint(1, 3))]
+        invoices.append([rng.choice(dates) for _ in range(LINES_PER_INVOICE)])
+    return invoices
+
+
+def strptime_loop(text: str) -> dt | None:
+    """InvoiceParser.get_date before DateParser."""
+    for format in DATE_FORMATS:
+        try:
+            return dt.strptime(text, format)
+        except Exception:
+            continue
+    return None
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(lines: int = 100_000) -> None:
+    invoices = make_invoices(lines)
+    legacy = timed(lambda: [strptime_loop(text) for invoice in invoices for text in invoice])
+    memoized = timed(lambda: [
+        parser.parse(text) for invoice in invoices for parser in [DateParser(DATE_FORMATS)] for text in invoice
+    ])
+
+    waipio_line = "03-02-24  mochi             1.00   examination - wellness*          65.00"
+    parser = WaipioParser("", Path("invoice.pdf"), is_drive=True)
+    tokenize = timed(lambda: [parser.tokenize_line(waipio_line) for _ in range(lines)])
+    parser.parse_charge_date = lambda text, *args: strptime_loop(text)
+    tokenize_legacy_dates = timed(lambda: [parser.tokenize_line(waipio_line) for _ in range(lines)])
+
+    print(f"{lines} charge lines in {len(invoices)} invoices")
+    print(f"  strptime loop    : {legacy:6.3f} s  {legacy / lines * 1e6:6.2f} us/line")
+    print(f"  DateParser       : {memoized:6.3f} s  {memoized / lines * 1e6:6.2f} us/line  ({legacy / memoized:.1f}x)")
+    print(f"  tokenize_line, strptime loop : {tokenize_legacy_dates:6.3f} s")
+    print(f"  tokenize_line, DateParser    : {tokenize:6.3f} s  ({tokenize_legacy_dates / tokenize:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,84 @@
+"""get_likely_animal latency and match rate, regex matching vs the name index.
+
+Invoice names are drawn from the roster and mangled the way clinic invoices
+and OCR mangle them: hyphens dropped or added, a letter doubled, dropped or
+swapped. Lookups carry no date, so every one searches the whole roster.
+
+    PYTHONPATH=src python benchmarks/bench_name_match.py [animals] [lookups]
+"""
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+
+from animal_db_handler import get_likely_animal
+
+SYLLABLES = "ba ko la ni mo chi lu na ma ka ri su to be li ro se da fi zu".split()
+
+
+def legacy_likely_animal(animal: str, date, df: pd.DataFrame) -> pd.Series:
+    """get_likely_animal before the name index, without the date filter."""
+    cleaned_animal = re.sub(r"['?,\"]", "", animal.lower()).strip()
+    pattern = r"\b" + r"\b|\b".join(cleaned_animal.split()) + r"\b"
+    tmp = df[df["name"].str.contains(cleaned_animal, case=False, na=False)]
+    if tmp.shape[0] == 1:
+        return tmp[["ANIMALNAME", "SHELTERCODE"]].iloc[0]
+    tmp = df[df["name"].str.contains(pattern, regex=True, case=False, na=False)]
+    if tmp.shape[0] == 1:
+        return tmp[["ANIMALNAME", "SHELTERCODE"]].iloc[0]
+    return pd.Series([animal, "ERROR_CODE"], index=["ANIMALNAME", "SHELTERCODE"])
+
+
+def make_roster(animals: int, rng: random.Random) -> pd.DataFrame:
+    def word():
+        return "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+
+    names = {}
+    while len(names) < animals:
+        parts = [word() for _ in range(rng.choice([1, 1, 2]))]
+        names["-".join(parts) if len(parts) == 2 and rng.random() < 0.5 else " ".join(parts)] = None
+    df = pd.DataFrame({"ANIMALNAME": [name.title() for name in names], "SHELTERCODE": [f"D{i:06d}" for i in range(animals)]})
+    df["name"] = df["ANIMALNAME"].str.lower()
+    return df
+
+
+def mangle(name: str, rng: random.Random) -> str:
+    kind = rng.randrange(4)
+    if kind == 0:
+        return name.replace("-", "").replace(" ", "") if ("-" in name or " " in name) else name + name[-1]
+    i = rng.randrange(1, len(name) - 1)
+    if kind == 1:
+        return name[:i] + name[i] + name[i:]
+    if kind == 2:
+        return name[:i] + name[i + 1:]
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def run(match, df, queries):
+    start = time.perf_counter()
+    codes = [match(name, None, df)["SHELTERCODE"] for name, _ in queries]
+    elapsed = (time.perf_counter() - start) / len(queries)
+    right = sum(got == code for got, (_, code) in zip(codes, queries))
+    wrong = sum(got not in (code, "ERROR_CODE") for got, (_, code) in zip(codes, queries))
+    return elapsed, right / len(queries), wrong / len(queries)
+
+
+def main(animals: int = 20_000, lookups: int = 300) -> None:
+    rng = random.Random(5)
+    df = make_roster(animals, rng)
+    sample = df.sample(lookups, random_state=5)
+    queries = [(mangle(name, rng), code) for name, code in zip(sample["ANIMALNAME"], sample["SHELTERCODE"])]
+
+    start = time.perf_counter()
+    get_likely_animal("warm up", None, df)
+    build = time.perf_counter() - start
+    print(f"{animals} animals, {lookups} mangled names, index built in {build * 1e3:.0f} ms")
+    for label, match in [("regex", legacy_likely_animal), ("index", get_likely_animal)]:
+        elapsed, right, wrong = run(match, df, queries)
+        print(f"  {label} : {elapsed * 1e3:7.2f} ms/lookup  {right:6.1%} right  {wrong:6.1%} wrong")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,50 @@
+"""Layout-mode extraction of a long synthetic invoice, page by page vs across the page pool.
+
+Each page is a dense table of charge lines, like an emergency-hospital stay.
+The first parallel run includes starting the pool's workers.
+
+    PYTHONPATH=src:tests python benchmarks/bench_parallel_pages.py [pages] [workers]
+"""
+import io
+import random
+import sys
+import time
+
+from conftest import pdf_bytes
+from parsers import pdf_text
+from parsers.pdf_text import PdfText
+
+LINES_PER_PAGE = 60
+
+
+def make_pages(count: int, seed: int = 5) -> list[str]:
+    rng = random.Random(seed)
+    words = ["Hospitalization", "ICU", "Monitoring", "Fluids", "IV", "Catheter", "CBC", "Chemistry", "Radiograph", "Maropitant"]
+    return [
+        "\n".join(
+            f"    {rng.randint(1, 12)}/{rng.randint(1, 28)}/2024   {' '.join(rng.sample(words, 4)):<48}"
+            f"{rng.randint(1, 9)}.00   ${rng.randint(5, 900)}.{rng.randint(0, 99):02d}"
+            for _ in range(LINES_PER_PAGE)
+        )
+        for _ in range(count)
+    ]
+
+
+def timed(data: bytes, threshold: int) -> tuple[float, str]:
+    start = time.perf_counter()
+    text = PdfText(io.BytesIO(data), "layout", parallel_threshold=threshold).read_until()
+    return time.perf_counter() - start, text
+
+
+def main(pages: int = 40, workers: int = 4) -> None:
+    pdf_text.EXTRACTION_WORKERS = workers
+    data = pdf_bytes(make_pages(pages))
+    sequential, expected = timed(data, 0)
+    print(f"{pages} pages, sequential: {sequential:.2f}s")
+    for run in ("cold", "warm"):
+        elapsed, text = timed(data, 1)
+        print(f"{workers} workers ({run}): {elapsed:.2f}s, {sequential / elapsed:.1f}x, identical: {text == expected}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
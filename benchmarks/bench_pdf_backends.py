@@ -0,0 +1,76 @@
+"""Runs every PDF text backend over a corpus of invoices: extraction throughput, and whether each
+clinic parser still produces the same charge table as it does from pypdf's text.
+
+The corpus is every PDF under the given directory, or by default the
+synthetic clinic invoices from tests/test_line_grammar.py, each followed by
+two pages of medical records.
+
+    PYTHONPATH=src:tests python benchmarks/bench_pdf_backends.py [invoice_dir] [repeats]
+"""
+import io
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+from parsers.invoices import get_parser
+from parsers.pdf_text import BACKENDS
+
+RECORDS = "MEDICAL RECORD - Patient history\nWeight 24.3 kg, temperature normal.\n"
+
+
+def load_corpus(directory: str | None) -> dict[str, bytes]:
+    if directory:
+        return {path.name: path.read_bytes() for path in sorted(Path(directory).rglob("*.pdf"))}
+    from conftest import pdf_bytes
+    from test_line_grammar import FIXTURES
+    return {f"{cls.__name__}.pdf": pdf_bytes([text, RECORDS, RECORDS]) for cls, text in FIXTURES.items()}
+
+
+def charges(data: bytes, backend: str):
+    """(parser, charge table or the parsing error) for one invoice."""
+    parser = get_parser(io.BytesIO(data), "invoice.pdf", is_drive=True, backend=backend)
+    try:
+        parser.parse_invoice()
+    except Exception as e:
+        return parser, repr(e)
+    return parser, parser.items
+
+
+def same(a, b) -> bool:
+    if isinstance(a, pd.DataFrame) or isinstance(b, pd.DataFrame):
+        return isinstance(a, pd.DataFrame) and isinstance(b, pd.DataFrame) and a.equals(b)
+    return a == b
+
+
+def main(directory: str | None = None, repeats: int = 5) -> None:
+    corpus = load_corpus(directory)
+    if not corpus:
+        raise SystemExit(f"No PDFs under {directory}")
+    reference = {name: charges(data, "pypdf")[1] for name, data in corpus.items()}
+    print(f"{len(corpus)} invoices, {repeats} passes\n")
+    print(f"{'backend':<8} {'pages/s':>9} {'identical':>10}  differing clinics")
+    for backend in BACKENDS:
+        try:
+            charges(next(iter(corpus.values())), backend)
+        except ImportError as e:
+            print(f"{backend:<8} unavailable: {e}")
+            continue
+        pages, differing = 0, defaultdict(int)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for name, data in corpus.items():
+                parser, items = charges(data, backend)
+                pages += parser.pages_read
+                if not same(items, reference[name]):
+                    differing[type(parser).__name__] += 1
+        elapsed = time.perf_counter() - start
+        identical = len(corpus) - sum(differing.values()) // repeats
+        clinics = ", ".join(f"{clinic} ({count // repeats})" for clinic, count in sorted(differing.items()))
+        print(f"{backend:<8} {pages / elapsed:>9.0f} {identical:>6}/{len(corpus):<3}  {clinics or '-'}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None, *map(int, sys.argv[2:3]))
@@ -0,0 +1,94 @@
+"""Bytes per animal of the prepared roster, default-dtype read vs the typed read.
+
+The synthetic report mimics the ShelterManager export: the four columns the
+app uses plus a couple dozen it doesn't.
+
+    PYTHONPATH=src python benchmarks/bench_roster_memory.py [animals]
+"""
+import io
+import random
+import sys
+from datetime import date, timedelta as td
+
+import pandas as pd
+
+from animal_db_handler import (
+    DATECOL,
+    DAYCOL,
+    NAMECOL,
+    add_failure_matching_columns,
+    read_roster_csv,
+)
+
+EXTRA_COLUMNS = {
+    "ANIMALTYPENAME": ["Dog", "Puppy", "Cat"],
+    "SPECIESNAME": ["Dog", "Cat"],
+    "BREEDNAME": ["Labrador Retriever Mix", "Pit Bull Terrier", "Poi Dog", "Chihuahua", "German Shepherd"],
+    "SEXNAME": ["Male", "Female", "Unknown"],
+    "BASECOLOURNAME": ["Black", "Brown", "Tan", "White", "Brindle"],
+    "SIZENAME": ["Small", "Medium", "Large"],
+    "SHELTERLOCATIONNAME": ["Kennel A", "Kennel B", "Foster", "Clinic"],
+    "OWNERNAME": ["Foster Home", "Adopter", ""],
+    "NEUTERED": ["Yes", "No"],
+    "IDENTICHIPPED": ["Yes", "No"],
+    "ARCHIVED": ["0", "1"],
+    "ACTIVEMOVEMENTTYPENAME": ["Adoption", "Foster", "Transfer", ""],
+}
+FREE_TEXT_COLUMNS = ["ANIMALCOMMENTS", "HIDDENANIMALDETAILS", "HEALTHPROBLEMS", "MARKINGS"]
+WORDS = "friendly shy loves walks treats kennel cough vaccinated needs meds playful calm".split()
+
+
+def make_report(animals: int, seed: int = 11) -> str:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(animals):
+        brought_in = date(2020, 1, 1) + td(days=rng.randint(0, 1800))
+        row = {
+            NAMECOL: " ".join(rng.choice(["Mochi", "Koa", "Lani", "Bella", "Luna", "Max", "Nala"]) for _ in range(rng.randint(1, 2))),
+            "SHELTERCODE": f"D{brought_in.year}{i:06d}",
+            DATECOL: brought_in.strftime("%m/%d/%Y"),
+            DAYCOL: rng.randint(1, 400),
+            "ID": 100000 + i,
+        }
+        for col, values in EXTRA_COLUMNS.items():
+            row[col] = rng.choice(values)
+        for col in FREE_TEXT_COLUMNS:
+            row[col] = " ".join(rng.choices(WORDS, k=rng.randint(0, 12)))
+        rows.append(row)
+    return pd.DataFrame(rows).to_csv(index=False)
+
+
+def legacy_roster(csv_text: str) -> pd.DataFrame:
+    """get_all_animals + prepare_animals_for_failure_matching before typed reads."""
+    df = pd.read_csv(io.StringIO(csv_text))
+    df[DATECOL] = pd.to_datetime(df[DATECOL], format="mixed").dt.date
+    df[DATECOL] = pd.to_datetime(df[DATECOL])
+    df["name"] = df[NAMECOL].str.lower().replace(r"[,'\"]", regex=True)
+    df[DAYCOL] = pd.to_timedelta(df[DAYCOL], unit="days")
+    df["end_date"] = pd.to_datetime(df[DATECOL] + df[DAYCOL] + td(days=1))
+    df = df.sort_values(by="end_date").sort_values(by=DATECOL)
+    df["date_in"] = df[DATECOL].dt.date
+    df["last_day_on_shelter"] = df["end_date"].dt.date
+    return df
+
+
+def main(animals: int = 50_000) -> None:
+    csv_text = make_report(animals)
+    legacy = legacy_roster(csv_text)
+    typed = add_failure_matching_columns(read_roster_csv(csv_text))
+
+    legacy_bytes = legacy.memory_usage(deep=True).sum()
+    same_columns_bytes = legacy[typed.columns].memory_usage(deep=True).sum()
+    typed_bytes = typed.memory_usage(deep=True).sum()
+    print(f"{animals} animals, {len(legacy.columns)} vs {len(typed.columns)} columns")
+    print(f"  default dtypes : {legacy_bytes / 1e6:8.1f} MB  {legacy_bytes / animals:8.0f} B/animal")
+    print(f"  same 8 columns : {same_columns_bytes / 1e6:8.1f} MB  {same_columns_bytes / animals:8.0f} B/animal")
+    print(f"  typed          : {typed_bytes / 1e6:8.1f} MB  {typed_bytes / animals:8.0f} B/animal")
+    print(f"  reduction      : {legacy_bytes / typed_bytes:8.1f}x")
+    print("  per column (typed, B/animal):")
+    for col, size in typed.memory_usage(deep=True, index=False).items():
+        print(f"    {col:22} {str(typed[col].dtype):16} {size / animals:6.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,52 @@
+"""On-shelter filtering, boolean mask vs StayIndex, across roster sizes.
+
+Stays are spread over the shelter's history with mostly short stays and a
+long tail, the shape of the ShelterManager export.
+
+    PYTHONPATH=src python benchmarks/bench_stay_index.py [queries]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from roster_index import StayIndex
+
+SIZES = [10_000, 50_000, 100_000, 500_000]
+
+
+def make_stays(stays: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    history_days = max(stays // 10, 365)
+    starts = pd.Timestamp("2000-01-01") + pd.to_timedelta(rng.integers(0, history_days, stays), unit="D")
+    ends = starts + pd.to_timedelta(rng.exponential(30, stays).astype(int) + 1, unit="D")
+    return pd.DataFrame({"DATEBROUGHTIN": starts, "end_date": ends}).sort_values("end_date").reset_index(drop=True)
+
+
+def timed(fn, dates) -> float:
+    start = time.perf_counter()
+    for date in dates:
+        fn(date)
+    return (time.perf_counter() - start) / len(dates)
+
+
+def main(queries: int = 200) -> None:
+    print(f"{'stays':>8} {'build ms':>9} {'mask us':>9} {'index us':>9} {'speedup':>8} {'hits':>6}")
+    for stays in SIZES:
+        df = make_stays(stays)
+        rng = np.random.default_rng(stays)
+        dates = df["DATEBROUGHTIN"].to_numpy()[rng.integers(0, stays, queries)]
+
+        start = time.perf_counter()
+        index = StayIndex.from_frame(df)
+        build = time.perf_counter() - start
+
+        mask = timed(lambda d: np.flatnonzero(((df["DATEBROUGHTIN"] <= d) & (df["end_date"] >= d)).to_numpy()), dates)
+        indexed = timed(index.on_shelter, dates)
+        hits = np.mean([len(index.on_shelter(d)) for d in dates])
+        print(f"{stays:>8} {build * 1e3:>9.1f} {mask * 1e6:>9.0f} {indexed * 1e6:>9.0f} {mask / indexed:>7.1f}x {hits:>6.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -1,18 +1,31 @@
+import hashlib
 import logging
 import re
+import threading
+import time
 from datetime import datetime as dt
 from datetime import timedelta as td
 from io import StringIO
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 import requests
+from cachetools import LRUCache
 
 from constants.database import (
+    DATABASE_URL,
     LOGIN_URL,
-    CSV_URL,
     CSV_UPLOAD_URL,
-    DB_LOGIN_DATA
+    DB_LOGIN_DATA,
+    ROSTER_DELTA_REPORT_ID,
+    ROSTER_FULL_SYNC_SECONDS,
+    ROSTER_REPORT_ID,
+    ROSTER_SNAPSHOT_FILE,
+    ROSTER_TTL_SECONDS,
 )
+from roster_index import name_index, stay_index, unique_closest
+from roster_snapshot import Roster, RosterSnapshot
 
 log = logging.getLogger(__name__)
 
@@ -23,6 +36,44 @@ log = logging.getLogger(__name__)
 DATECOL = "DATEBROUGHTIN"
 DAYCOL = "TOTALDAYSONSHELTER"
 NAMECOL = "ANIMALNAME"
+CODECOL = "SHELTERCODE"
+# The report has many more columns; only these are read. Strings are
+# pyarrow-backed. SHELTERCODE is unique per animal, so a categorical would
+# only add a codes array on top of the same strings.
+ROSTER_DTYPES = {
+    NAMECOL: "string[pyarrow]",
+    CODECOL: "string[pyarrow]",
+    DATECOL: "string[pyarrow]",
+    DAYCOL: "float32",
+}
+
+
+_snapshot = RosterSnapshot(ROSTER_SNAPSHOT_FILE)
+_failure_rosters: LRUCache = LRUCache(maxsize=2)
+_failure_lock = threading.Lock()
+
+
+def download_roster_csv(
+    login_data: dict, base_url: str = DATABASE_URL, report_id: str = ROSTER_REPORT_ID, params: Optional[dict] = None,
+) -> str:
+    """Logs into sheltermanager and returns an animal report as CSV text."""
+    session = requests.Session()
+    session.post(f"{base_url}/login?smaccount={login_data['database']}", data=login_data)
+
+    resp = session.get(f"{base_url}/report_export_csv", params={"id": report_id, **(params or {})})
+    resp.raise_for_status()
+
+    csv_text = resp.text
+    return csv_text[csv_text.find('"') :]
+
+
+def read_roster_csv(csv_text: str) -> pd.DataFrame:
+    df = pd.read_csv(
+        StringIO(csv_text),
+        usecols=lambda col: col in ROSTER_DTYPES,
+        dtype=ROSTER_DTYPES,
+    )
+    return prep_animal_df(df, DATECOL, DAYCOL, NAMECOL)
 
 
 def get_all_animals(login_data: dict) -> pd.DataFrame:
@@ -35,16 +86,9 @@ def get_all_animals(login_data: dict) -> pd.DataFrame:
 
     """
     try:
-        session = requests.Session()
-        session.post(LOGIN_URL + login_data["database"], data=login_data)
-
-        resp = session.get(CSV_URL)
-
-        csv_text = resp.text
-        csv_text = csv_text[csv_text.find('"') :]
+        csv_text = download_roster_csv(login_data)
         try:
-            df = pd.read_csv(StringIO(csv_text))
-            return prep_animal_df(df, DATECOL, DAYCOL, NAMECOL)
+            return read_roster_csv(csv_text)
         except pd.errors.EmptyDataError:
             pass
     except requests.exceptions.RequestException:
@@ -53,6 +97,84 @@ def get_all_animals(login_data: dict) -> pd.DataFrame:
         return pd.DataFrame()
 
 
+def roster_version(animals: pd.DataFrame) -> str:
+    """A content hash of the prepared roster, independent of row order."""
+    row_hashes = np.sort(pd.util.hash_pandas_object(animals, index=False).to_numpy())
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()[:16]
+
+
+def merge_roster(animals: pd.DataFrame, changes: pd.DataFrame) -> pd.DataFrame:
+    """Applies a delta download: changed animals replace their rows (by SHELTERCODE), new ones are added."""
+    merged = pd.concat([animals, changes], ignore_index=True)
+    merged = merged[~merged.duplicated(CODECOL, keep="last")]
+    return merged.sort_values(by="end_date", kind="stable").reset_index(drop=True)
+
+
+def sync_roster(login_data: dict, snapshot: RosterSnapshot, base_url: str = DATABASE_URL) -> Roster:
+    """Refreshes the snapshot from sheltermanager and returns the new roster.
+    With a delta report configured, only animals changed since the last sync (and those still on
+    shelter) are downloaded and merged in, so the cost follows intake activity rather than the
+    shelter's history. The whole report is downloaded for the first snapshot and again every
+    ROSTER_FULL_SYNC_SECONDS, which also drops deleted animals.
+    Args:
+        login_data: (dict): A dictionary of keys:  [database, username, password].
+        snapshot (RosterSnapshot): The snapshot to merge into and replace.
+        base_url (str): The sheltermanager server.
+    Returns:
+        Roster: The animals dataframe (read-only) and its version.
+    """
+    now = time.time()
+    current = snapshot.read()
+    if current is None or not ROSTER_DELTA_REPORT_ID or now - snapshot.full_sync_at > ROSTER_FULL_SYNC_SECONDS:
+        animals = read_roster_csv(download_roster_csv(login_data, base_url))
+        full_sync_at = now
+    else:
+        # The report filters by day; a day of overlap covers time zones and same-day edits
+        since = dt.fromtimestamp(snapshot.written_at) - td(days=1)
+        csv_text = download_roster_csv(
+            login_data, base_url, ROSTER_DELTA_REPORT_ID, {"ASK1": since.strftime("%Y-%m-%d")},
+        )
+        try:
+            changes = read_roster_csv(csv_text)
+        except pd.errors.EmptyDataError:
+            changes = current.animals.iloc[:0]
+        animals = merge_roster(current.animals, changes)
+        full_sync_at = snapshot.full_sync_at
+        log.info(f"Merged {len(changes)} changed animals into the roster")
+    snapshot.write(animals, roster_version(animals), full_sync_at)
+    return snapshot.read()
+
+
+def get_roster(login_data: dict = DB_LOGIN_DATA, snapshot: Optional[RosterSnapshot] = None) -> Roster:
+    """Returns the prepared roster with a version stamp, shared by all workers through a snapshot file.
+    The snapshot is memory-mapped; when it is older than ROSTER_TTL_SECONDS one worker syncs it
+    (see `sync_roster`) and atomically replaces it while the others wait, then all of them map the
+    new file. The version is a hash of the roster's contents, so an unchanged roster keeps its
+    version across refreshes and anything memoized against it stays valid. If the sync fails the
+    stale snapshot is served, or with no snapshot a direct `get_all_animals` download.
+    Args:
+        login_data: (dict): A dictionary of keys:  [database, username, password].
+        snapshot (RosterSnapshot): Defaults to the one at ROSTER_SNAPSHOT_FILE.
+    Returns:
+        Roster: The animals dataframe (read-only) and its version.
+    """
+    snapshot = snapshot or _snapshot
+    roster = snapshot.read(max_age=ROSTER_TTL_SECONDS)
+    if roster is not None:
+        return roster
+    with snapshot.refresh_lock():
+        # Another worker may have refreshed it while this one waited for the lock
+        roster = snapshot.read(max_age=ROSTER_TTL_SECONDS)
+        if roster is not None:
+            return roster
+        try:
+            return sync_roster(login_data, snapshot)
+        except Exception as e:
+            log.exception(f"Failed to load the roster: {e}")
+            # Without a snapshot to serve (say it can't be written), download the roster directly
+            return snapshot.read() or Roster(get_all_animals(login_data), "")
+
+
 def upload_dataframe_to_database(df: pd.DataFrame, is_debug: bool = False) -> bool:
     """Uploads the given dataframe to the sheltermanager DB
     Args:
@@ -100,8 +222,7 @@ def prep_animal_df(
         pd.DataFrame: The normalized dataframe.
 
     """
-    df[date_col] = pd.to_datetime(df[date_col], format="mixed").dt.date
-    df[date_col] = pd.to_datetime(df[date_col])
+    df[date_col] = pd.to_datetime(df[date_col], format="mixed").dt.normalize()
     df["name"] = df[name_col].str.lower().replace(r"[,'\"]", regex=True)
     df[days_col] = pd.to_timedelta(df[days_col], unit="days")
     df["end_date"] = pd.to_datetime(df[date_col] + df[days_col] + td(days=1))
@@ -112,9 +233,32 @@ def prep_animal_df(
 def prepare_animals_for_failure_matching() -> pd.DataFrame:
     animals = get_all_animals(DB_LOGIN_DATA)
     assert isinstance(animals, pd.DataFrame)
+    return add_failure_matching_columns(animals)
+
+
+def get_failure_matching_roster(login_data: dict = DB_LOGIN_DATA) -> Roster:
+    """The shared roster with the retry page's display columns, prepared once per roster version.
+    Returning the same frame across requests also keeps its name and stay indexes warm.
+    """
+    roster = get_roster(login_data)
+    with _failure_lock:
+        cached = _failure_rosters.get(roster.version)
+    if cached is not None:
+        return cached
+    if roster.animals.empty:
+        return roster
+    prepared = Roster(add_failure_matching_columns(roster.animals), roster.version)
+    if roster.version:
+        with _failure_lock:
+            _failure_rosters[roster.version] = prepared
+    return prepared
+
+
+def add_failure_matching_columns(animals: pd.DataFrame) -> pd.DataFrame:
     animals = animals.sort_values(by="DATEBROUGHTIN")
-    animals["date_in"] = animals["DATEBROUGHTIN"].dt.date
-    animals["last_day_on_shelter"] = animals["end_date"].dt.date
+    # Display-only; strings render the same as the dates did, at a fraction of the memory
+    animals["date_in"] = animals["DATEBROUGHTIN"].dt.strftime("%Y-%m-%d").astype("string[pyarrow]")
+    animals["last_day_on_shelter"] = animals["end_date"].dt.strftime("%Y-%m-%d").astype("string[pyarrow]")
     return animals
 
 
@@ -122,19 +266,24 @@ def get_probable_matches(
     animal: str, df: pd.DataFrame, date: dt | None = None,
 ) -> pd.DataFrame:
     animal = re.sub(r"[?'\"]", "", animal.lower())
-    pattern = r"\b" + r"\b|\b".join(animal.split()) + r"\b"
     of = df
+    rows = None
     if date:
-        tmp = df[(df["DATEBROUGHTIN"] <= date) & (df["end_date"] >= date)]
-        if not tmp.empty:
-            df = tmp
-    tmp = df[df["name"].str.contains(animal)]
+        on_date = stay_index(df).on_shelter(date)
+        if len(on_date):
+            df = df.iloc[on_date]
+            rows = on_date
+    tmp = df[df["name"].str.contains(animal, regex=False)]
     if tmp.shape[0] == 1:
         return tmp
-    df = df[df["name"].str.contains(pattern, regex=True)]
-    if df.empty:
-        df = of[of["name"].str.contains(pattern, regex=True)]
-    return df
+    index = name_index(of)
+    matches = index.rows_with_words(animal.split(), rows)
+    if not len(matches):
+        matches = index.rows_with_words(animal.split())
+    if not len(matches):
+        # Spelling variants, best first: on shelter that day, then anywhere
+        matches = [row for row, _ in index.closest(animal, rows) or index.closest(animal)]
+    return of.iloc[matches]
 
 
 def get_likely_animal(animal: str, date: dt, df: pd.DataFrame) -> pd.Series:
@@ -147,30 +296,123 @@ def get_likely_animal(animal: str, date: dt, df: pd.DataFrame) -> pd.Series:
         pd.Series: A pd.Series with either a fixed name and sheltercode or the unedited animal with an ERROR_CODE.
     """
     cleaned_animal = re.sub(r"['?,\"]", "", animal.lower()).strip()
-    pattern = r"\b" + r"\b|\b".join(cleaned_animal.split()) + r"\b"
 
     # Apply date filtering if a date is provided
+    filtered_df = df
+    rows = None
     if date is not None:
-        tmp = df[(df["DATEBROUGHTIN"] <= date) & (df["end_date"] >= date)]
-        if not tmp.empty:
-            filtered_df = tmp
+        on_date = stay_index(df).on_shelter(date)
+        if len(on_date):
+            filtered_df = df.iloc[on_date]
+            rows = on_date
 
     # Direct match on 'name'
     tmp = filtered_df[
-        filtered_df["name"].str.contains(cleaned_animal, case=False, na=False)
+        filtered_df["name"].str.contains(cleaned_animal, case=False, na=False, regex=False)
     ]
     if tmp.shape[0] == 1:
         return tmp[["ANIMALNAME", "SHELTERCODE"]].iloc[0]
 
-    # Regex match with pattern
-    tmp = filtered_df[
-        filtered_df["name"].str.contains(pattern, regex=True, case=False, na=False)
-    ]
-    if tmp.shape[0] == 1:
-        return tmp[["ANIMALNAME", "SHELTERCODE"]].iloc[0]
+    # Whole-word match, then a clear fuzzy match for spelling variants
+    index = name_index(df)
+    matches = index.rows_with_words(cleaned_animal.split(), rows)
+    if len(matches) == 1:
+        return df[["ANIMALNAME", "SHELTERCODE"]].iloc[matches[0]]
+    if not len(matches):
+        row = unique_closest(index, cleaned_animal, rows)
+        if row is not None:
+            return df[["ANIMALNAME", "SHELTERCODE"]].iloc[row]
     return pd.Series([animal, "ERROR_CODE"], index=["ANIMALNAME", "SHELTERCODE"])
 
 
+def match_animals_bulk(cost_df: pd.DataFrame, animal_df: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized `get_likely_animal` for re-matching many charges against the roster at once.
+
+    Each distinct (name, date) is looked up once. Whole-name substring
+    candidates are found per distinct name, word candidates by joining name
+    tokens against the roster's word tokens, and both are narrowed to animals
+    on the shelter that day. A charge is matched when the substring search or,
+    failing that, the word search finds exactly one animal, or when the word
+    search finds none and there is a single clear fuzzy match; otherwise it
+    keeps its name and ERROR_CODE.
+    Args:
+        cost_df (pd.DataFrame): Charges with ANIMALNAME and COSTDATE columns, e.g. the failures CSV
+        animal_df (pd.DataFrame): The sheltermanager DB, dataframe
+    Returns:
+        pd.DataFrame: A copy of cost_df with ANIMALNAME and ANIMALCODE updated for unique matches.
+    """
+    result = cost_df.copy()
+    if "ANIMALCODE" not in result:
+        result["ANIMALCODE"] = "ERROR_CODE"
+    if result.empty or animal_df.empty:
+        return result
+    cleaned = (
+        result["ANIMALNAME"].fillna("").astype(str).str.lower()
+        .str.replace(r"['?,\"]", "", regex=True).str.strip()
+    )
+    lookups = pd.DataFrame({"cleaned": cleaned, "date": pd.to_datetime(result["COSTDATE"])})
+    keys = lookups.drop_duplicates().reset_index(drop=True)
+
+    roster = animal_df.reset_index(drop=True)
+    roster_names = roster["name"].fillna("").astype(str)
+    distinct = keys["cleaned"].unique()
+
+    substring_pairs = [
+        (name, idx)
+        for name in distinct
+        for idx in roster_names.index[roster_names.str.contains(name, regex=False)]
+    ]
+    roster_tokens = (
+        roster_names.str.findall(r"\w+").explode().dropna()
+        .rename("token").rename_axis("animal").reset_index().drop_duplicates()
+    )
+    name_tokens = (
+        pd.Series(distinct, index=distinct).str.split().explode().dropna()
+        .rename("token").rename_axis("cleaned").reset_index()
+    )
+    plain = name_tokens["token"].str.fullmatch(r"\w+")
+    word_pairs = name_tokens[plain].merge(roster_tokens, on="token")[["cleaned", "animal"]]
+    # Tokens with punctuation can't be joined on \w+ words; search them directly
+    odd_pairs = [
+        (name, idx)
+        for name, token in name_tokens[~plain].itertuples(index=False)
+        for idx in roster_names.index[roster_names.str.contains(rf"\b{re.escape(token)}\b", regex=True)]
+    ]
+    candidates = pd.concat([
+        pd.DataFrame(substring_pairs, columns=["cleaned", "animal"]).assign(stage=0),
+        pd.concat([word_pairs, pd.DataFrame(odd_pairs, columns=["cleaned", "animal"])]).assign(stage=1),
+    ]).astype({"animal": int}).drop_duplicates()
+
+    candidates = keys.reset_index(names="key").merge(candidates, on="cleaned")
+    animals = candidates["animal"].to_numpy()
+    brought_in = roster[DATECOL].to_numpy()[animals]
+    end_date = roster["end_date"].to_numpy()[animals]
+    present = (brought_in <= candidates["date"].to_numpy()) & (end_date >= candidates["date"].to_numpy())
+    candidates = candidates[present]
+
+    counts = candidates.groupby(["key", "stage"])["animal"].agg(["nunique", "first"]).reset_index()
+    unique = counts[counts["nunique"] == 1].sort_values("stage").drop_duplicates("key")
+    keys["animal"] = unique.set_index("key")["first"].reindex(keys.index)
+
+    # Names without a whole-word candidate that day fall back to a clear fuzzy match, as in get_likely_animal
+    with_words = set(candidates.loc[candidates["stage"] == 1, "key"])
+    index, stays = name_index(animal_df), stay_index(animal_df)
+    for key in keys.index[keys["animal"].isna()]:
+        if key in with_words:
+            continue
+        on_date = stays.on_shelter(keys.at[key, "date"])
+        row = unique_closest(index, keys.at[key, "cleaned"], on_date if len(on_date) else None)
+        if row is not None:
+            keys.at[key, "animal"] = row
+
+    matched = lookups.merge(keys, on=["cleaned", "date"], how="left")["animal"].to_numpy()
+    found = ~pd.isna(matched)
+    rows = matched[found].astype(int)
+    result.loc[found, "ANIMALNAME"] = roster[NAMECOL].to_numpy()[rows]
+    result.loc[found, "ANIMALCODE"] = roster["SHELTERCODE"].to_numpy()[rows]
+    return result
+
+
 def match_animals(cost_df: pd.DataFrame, animal_df: pd.DataFrame) -> pd.DataFrame:
     """Convenience function to prepare the dataframe for getting the likely animals, while removing duplicates
     Args:
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Parses a local archive of invoice PDFs, without Gmail or Drive.
+
+    python batch.py ARCHIVE [--out DIR] [--roster FILE] [--workers N] [--gemini]
+
+ARCHIVE is a directory (searched recursively) or a tarball of PDFs. Every
+invoice is matched against the roster snapshot and copied under its parsed
+name to OUT/<clinic>_completed or OUT/<clinic>_incomplete, the folders the
+Gmail processor files it in on Drive, and all of its charges go into
+OUT/charges.csv. PDFs that can't be parsed go to OUT/unprocessed and scans
+to OUT/needs_ocr; non-invoices are only counted. Unknown clinics are sent
+to Gemini only with --gemini.
+"""
+import argparse
+import io
+import logging
+import multiprocessing
+import shutil
+import sys
+import tarfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+import pandas as pd
+
+from animal_db_handler import match_animals
+from constants.database import ROSTER_SNAPSHOT_FILE
+from constants.project import PARALLEL_PAGE_THRESHOLD
+from parsers.classify import DocumentKind, classify_document
+from parsers.invoices import AIParser, get_parser
+from parsers.pdf_text import PdfText
+from roster_snapshot import RosterSnapshot
+
+UNPROCESSED = "unprocessed"
+NEEDS_OCR = "needs_ocr"
+CHARGES_FILE = "charges.csv"
+# PDFs queued per worker, so a tarball is streamed rather than read into memory up front
+QUEUED_PER_WORKER = 4
+log = logging.getLogger(__name__)
+
+# Set in each worker by `init_worker`
+_animals: Optional[pd.DataFrame] = None
+_out = Path()
+_gemini = False
+_parallel_threshold = PARALLEL_PAGE_THRESHOLD
+
+
+class BatchResult(NamedTuple):
+    source: str
+    # A DocumentKind, UNPROCESSED, or the clinic folder the invoice was filed in
+    outcome: str
+    reason: str = ""
+    items: Optional[pd.DataFrame] = None
+
+
+def iter_pdfs(archive: Path) -> Iterator[tuple[str, Path | bytes]]:
+    """(name, path or contents) of every PDF in a directory tree or tarball, in archive order."""
+    if archive.is_dir():
+        for path in sorted(archive.rglob("*")):
+            if path.is_file() and path.suffix.lower() == ".pdf":
+                yield path.relative_to(archive).as_posix(), path
+        return
+    with tarfile.open(archive, "r|*") as tar:
+        for member in tar:
+            if member.isfile() and member.name.lower().endswith(".pdf"):
+                yield member.name, tar.extractfile(member).read()
+
+
+def init_worker(roster_file: str, out: str, gemini: bool, parallel_threshold: int = PARALLEL_PAGE_THRESHOLD) -> None:
+    """Maps the roster snapshot once per worker; the workers share its pages."""
+    global _animals, _out, _gemini, _parallel_threshold
+    roster = RosterSnapshot(roster_file).read()
+    if roster is None:
+        msg = f"No roster snapshot at {roster_file}"
+        raise FileNotFoundError(msg)
+    _animals, _out, _gemini, _parallel_threshold = roster.animals, Path(out), gemini, parallel_threshold
+
+
+def file_pdf(data: Path | bytes, folder: str, name: str, out: Optional[Path] = None) -> None:
+    target = (out or _out) / folder / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, Path):
+        shutil.copyfile(data, target)
+    else:
+        target.write_bytes(data)
+
+
+def parse_pdf(source: str, data: Path | bytes) -> BatchResult:
+    """Parses, matches and files one PDF of the archive."""
+    pdf = data if isinstance(data, Path) else io.BytesIO(data)
+    flat_name = source.replace("/", "_")
+    try:
+        document = PdfText(pdf, parallel_threshold=_parallel_threshold)
+        decision = classify_document(document)
+        if decision.kind == DocumentKind.IMAGE_ONLY:
+            file_pdf(data, NEEDS_OCR, flat_name)
+            return BatchResult(source, NEEDS_OCR, decision.reason)
+        if decision.kind == DocumentKind.NON_INVOICE:
+            return BatchResult(source, DocumentKind.NON_INVOICE, decision.reason)
+        parser = get_parser(pdf, source, is_drive=True, text=document, parallel_threshold=_parallel_threshold)
+        if isinstance(parser, AIParser) and not _gemini:
+            file_pdf(data, UNPROCESSED, flat_name)
+            return BatchResult(source, UNPROCESSED, "unknown clinic")
+        parser.parse_invoice()
+        if parser.items.empty:
+            file_pdf(data, UNPROCESSED, flat_name)
+            return BatchResult(source, UNPROCESSED, "no charges found")
+        items = match_animals(parser.items, _animals)
+    except Exception as e:
+        log.exception(f"{source}: {e}")
+        file_pdf(data, UNPROCESSED, flat_name)
+        return BatchResult(source, UNPROCESSED, str(e))
+    complete = (items["ANIMALCODE"] != "ERROR_CODE").all()
+    folder = parser.drive_completed if complete else parser.drive_incomplete
+    file_pdf(data, folder, parser.name)
+    return BatchResult(source, folder, parser.name, items)
+
+
+def run_batch(archive: Path, out: Path, roster_file: Path, workers: int = 1, gemini: bool = False) -> Counter:
+    """Parses every PDF of `archive` into `out`, returning how many PDFs ended up in each outcome.
+
+    Charges are appended to the CSV as each invoice finishes, so an interrupted
+    run keeps everything parsed before it stopped.
+    """
+    out.mkdir(parents=True, exist_ok=True)
+    charges_file = out / CHARGES_FILE
+    charges_file.unlink(missing_ok=True)
+    settings = (str(roster_file), str(out), gemini)
+    columns, outcomes = None, Counter()
+    for result in parse_all(archive, settings, workers):
+        outcomes[result.outcome] += 1
+        if result.items is not None:
+            if columns is None:
+                columns = result.items.columns
+            result.items.reindex(columns=columns).to_csv(charges_file, mode="a", header=not charges_file.exists(), index=False)
+        log.info(f"{result.source}: {result.outcome} {result.reason}".rstrip())
+    return outcomes
+
+
+def collect(future: Future, source: str, data: Path | bytes, out: Path) -> BatchResult:
+    """The result of a worker, or an UNPROCESSED one if the worker itself failed."""
+    try:
+        return future.result()
+    except Exception as e:
+        log.exception(f"{source}: {e}")
+        file_pdf(data, UNPROCESSED, source.replace("/", "_"), out)
+        return BatchResult(source, UNPROCESSED, str(e))
+
+
+def parse_all(archive: Path, settings: tuple, workers: int) -> Iterator[BatchResult]:
+    if workers <= 1:
+        init_worker(*settings)
+        yield from (parse_pdf(*pdf) for pdf in iter_pdfs(archive))
+        return
+    out = Path(settings[1])
+    context = multiprocessing.get_context("spawn")
+    # Each worker already has a core; don't fan a single PDF out further
+    initargs = (*settings, 0)
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=initargs) as pool:
+        pending: dict[Future, tuple[str, Path | bytes]] = {}
+        try:
+            for source, data in iter_pdfs(archive):
+                pending[pool.submit(parse_pdf, source, data)] = (source, data)
+                if len(pending) >= workers * QUEUED_PER_WORKER:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield collect(future, *pending.pop(future), out)
+        except BrokenProcessPool as e:
+            log.error(f"The parser pool died, the rest of {archive} is not parsed: {e}")
+        for future, (source, data) in pending.items():
+            yield collect(future, source, data, out)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    args.add_argument("archive", type=Path, help="directory or tarball of invoice PDFs")
+    args.add_argument("--out", type=Path, default=Path("../data/batch"), help="output directory")
+    args.add_argument("--roster", type=Path, default=ROSTER_SNAPSHOT_FILE, help="roster snapshot (.arrow) to match against")
+    args.add_argument("--workers", type=int, default=1, help="parser processes")
+    args.add_argument("--gemini", action="store_true", help="send unknown clinics to Gemini")
+    options = args.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    if not options.archive.exists():
+        log.error(f"{options.archive} doesn't exist")
+        return 2
+    if RosterSnapshot(options.roster).read() is None:
+        log.error(f"No roster snapshot at {options.roster}; run the processor once to write one")
+        return 2
+    outcomes = run_batch(options.archive, options.out, options.roster, options.workers, options.gemini)
+    for outcome, count in sorted(outcomes.items()):
+        print(f"{outcome}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
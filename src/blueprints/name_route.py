@@ -1,6 +1,5 @@
 from flask import Blueprint, render_template, Response
 import logging
-from features.name_generator import get_unique_animal_names
 
 
 
@@ -11,5 +10,7 @@ name_bp = Blueprint('name', __name__, url_prefix='/names')
 
 @name_bp.route("/")
 def check_names():
+    from features.name_generator import get_unique_animal_names
+
     unique_names = get_unique_animal_names()
     return Response(render_template("names.html", names=unique_names['name'].tolist()))
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 ## DATABASE ENV ##
 DB_NAME = os.environ.get("DB_NAME", "")
 DB_USERNAME = os.environ.get("DB_USER", "")
@@ -6,8 +7,18 @@ DB_PASS = os.environ.get("DB_PASS", "")
 
 DATABASE_URL = "https://us06d.sheltermanager.com"
 LOGIN_URL = DATABASE_URL + "/login?smaccount="
-CSV_URL = DATABASE_URL + "/report_export_csv?id=216"
+ROSTER_REPORT_ID = "216"
+CSV_URL = DATABASE_URL + "/report_export_csv?id=" + ROSTER_REPORT_ID
 CSV_UPLOAD_URL = DATABASE_URL + "/csvimport"
+ROSTER_TTL_SECONDS = int(os.environ.get("ROSTER_TTL_SECONDS", "300"))
+# Local disk shared by the workers of one instance
+ROSTER_SNAPSHOT_FILE = Path(os.environ.get("ROSTER_SNAPSHOT_FILE", "../data/roster.arrow"))
+# Same columns as report 216, asking for a date (ASK1): animals brought in or
+# changed since then, plus every animal still on shelter, whose day count
+# grows daily. Unset, every refresh downloads the whole history.
+ROSTER_DELTA_REPORT_ID = os.environ.get("ROSTER_DELTA_REPORT_ID", "")
+# Deltas can't express deleted animals; a full download reconciles them
+ROSTER_FULL_SYNC_SECONDS = int(os.environ.get("ROSTER_FULL_SYNC_SECONDS", str(24 * 60 * 60)))
 
 DB_LOGIN_DATA = {
         "database": DB_NAME,
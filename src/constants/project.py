@@ -4,13 +4,29 @@ from pathlib import Path
 IS_DEBUG = int(os.environ.get("DEBUG_STATUS", "1"))
 PROJECT_ID = os.environ.get("PROJECT_ID", "")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_REQUESTS_PER_MINUTE = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "15"))
+GEMINI_MAX_WORKERS = int(os.environ.get("GEMINI_MAX_WORKERS", "4"))
+GEMINI_BATCH_SIZE = int(os.environ.get("GEMINI_BATCH_SIZE", "5"))
+AI_CACHE_DIR = Path(os.environ.get("AI_CACHE_DIR", "../data/ai_cache"))
 LOG_FILE = Path(os.environ.get("LOG_FILE", ""))
+PARSE_CACHE_DIR = Path(os.environ.get("PARSE_CACHE_DIR", "../data/parse_cache"))
+GOOGLE_HTTP_TIMEOUT = int(os.environ.get("GOOGLE_HTTP_TIMEOUT", "60"))
+SERVICE_CACHE_SIZE = int(os.environ.get("SERVICE_CACHE_SIZE", "32"))
+MATCH_CACHE_SIZE = int(os.environ.get("MATCH_CACHE_SIZE", "4096"))
+# PDFs with at least this many pages are extracted across a process pool (0 disables it)
+PARALLEL_PAGE_THRESHOLD = int(os.environ.get("PARALLEL_PAGE_THRESHOLD", "30"))
+EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Default text backend for clinic parsers, see parsers.pdf_text.BACKENDS
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "pypdf")
+LEDGER_DB_FILE = Path(os.environ.get("LEDGER_DB_FILE", "../data/run_ledger.sqlite3"))
 
 ## OAUTH ##
 SERVICE_ACCOUNT_CONFIG_FILE = os.environ.get("SERVICE_ACCOUNT_FILE", "")
 OAUTH_CLIENT_CONFIG_JSON_FILE = os.environ.get("AUTH_FILE", "")
 ANIMALS_NAME_FILE = os.environ.get("ANIMALS_NAME_FILE", "all_names.txt")
 SECRET_NAME = os.environ.get("SECRET_NAME", "")
+SECRET_REFRESH_SECONDS = int(os.environ.get("SECRET_REFRESH_SECONDS", "300"))
 TEST_TOKEN = Path(os.environ.get("TEST_TOKEN", ""))
 PROD_TOKEN = Path(os.environ.get("PROD_TOKEN", ""))
 REDIRECT_URI = os.environ.get("REDIRECT_URL", "")
@@ -26,6 +42,8 @@ GMAIL_TO_LABEL = "Label_342337121491929089"
 
 # Drive Constants #
 DRIVE_INVOICES_FOLDER = "VET_INVOICES"
+# Longest `'a' in parents or ...` clause put in one files().list query; the query travels in the URL
+DRIVE_QUERY_MAX_LENGTH = 2000
 
 GMAIL_TEST_LABEL = "Label_8306108300123845242"
 GMAIL_TEST_LABEL_COMPLETE = "Label_7884775180973112661"
@@ -1,6 +1,12 @@
 from parsers.items import Cost
 
 NON_INVOICE_REGEXES = r"statement|treatment|estimate|record|payment|Medical_history|care_instructions|Reval|\.jpe?g|RESCUE"
+# First-page header keywords for `parsers.classify.classify_document`
+INVOICE_HEADER_REGEX = r"(?i)\b(?:invoice|receipt)\b"
+NON_INVOICE_HEADER_REGEX = (
+    r"(?i)\b(?:estimate|statement|treatment plan|medical (?:record|history)|patient history"
+    r"|(?:vaccination|rabies|health) certificate|discharge instructions|care instructions|lab(?:oratory)? results?)\b"
+)
 
 class Regex:
     surgery = r"surgery|extract|ectomy|mass rem|ablation|rooted|\w+tomy"
@@ -1,9 +1,19 @@
+import functools
 import re
+import threading
 import pandas as pd
-from constants.database import DB_LOGIN_DATA
+from cachetools import LRUCache
 from constants.project import ANIMALS_NAME_FILE
-from animal_db_handler import get_all_animals
-from typing import NamedTuple 
+from animal_db_handler import get_roster
+from typing import NamedTuple
+
+# Everything but letters, digits, underscore and whitespace separates words,
+# including hyphens and curly quotes
+NON_WORD = re.compile(r"[^\w\s]")
+
+_disjoint_cache: LRUCache = LRUCache(maxsize=4)
+_disjoint_lock = threading.Lock()
+
 
 class Names(NamedTuple):
     name: str
@@ -15,16 +25,28 @@ def load_names(name_file: str) -> pd.DataFrame:
         for lines in f:
             split = lines.split()
             if len(split) == 1:
-                n = split[0]
-                g = 'Unknown'
+                all_names.append(Names(split[0], 'Unknown'))
             elif len(split) == 2:
-                n,g = split
-            else:
-                pass
-            all_names.append(Names(n,g))
+                all_names.append(Names(*split))
 
     return pd.DataFrame(all_names)
 
+
+@functools.lru_cache(maxsize=None)
+def load_name_set(name_file: str) -> tuple[str, ...]:
+    """
+    Lowercased names from the names file, parsed once per process.
+    Kept in file order (a dict-ordered set) so the page lists names stably.
+    """
+    names = {}
+    with open(name_file, 'r') as f:
+        for line in f:
+            split = line.split()
+            if 1 <= len(split) <= 2:
+                names[split[0].lower()] = None
+    return tuple(names)
+
+
 def extract_extra_names(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
     Extracts individual words from a Series of strings,
@@ -39,9 +61,9 @@ def extract_extra_names(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """
 
 
-    df[col] = clean_and_split_names(df[col])
+    df = df.assign(**{col: clean_and_split_names(df[col])})
     df = df.explode(col)
-    df = df[df[col] != ''].reset_index(drop=True).copy()
+    df = df[df[col].notna() & (df[col] != '')].reset_index(drop=True)
 
     return df
 
@@ -50,19 +72,16 @@ def clean_and_split_names(series: pd.Series) -> pd.Series:
     """
     Cleans strings and splits them into lists of words.
     """
-    cleaned_series = series.astype(str).str.lower()
-    cleaned_series = cleaned_series.apply(lambda x: re.sub(r"[^\w\s-]", " ", x))
-    cleaned_series = cleaned_series.apply(lambda x: re.sub(r"[\u2018\u2019\u201c\u201d]", " ", x))
-    cleaned_series = cleaned_series.str.replace(r"[',\"]", " ", regex=True)
-    cleaned_series = cleaned_series.str.replace("-", " ", regex=False) # Split hyphenated words
-    cleaned_series = cleaned_series.str.strip().str.replace(r"\s+", " ", regex=True) # Normalize whitespace
-    return cleaned_series.str.split() # Return a Series of lists
+    cleaned_series = series.fillna("").astype(str).str.lower()
+    return cleaned_series.str.replace(NON_WORD, " ", regex=True).str.split() # Return a Series of lists
+
 
+def animal_name_words(animal_df: pd.DataFrame) -> frozenset[str]:
+    return frozenset(clean_and_split_names(animal_df['name']).explode().dropna())
 
 
 def get_disjoint(animal_df: pd.DataFrame, unique_names: pd.DataFrame) -> pd.DataFrame:
-    animal_names = extract_extra_names(animal_df, 'name')
-    animal_names = animal_names['name']
+    animal_names = animal_name_words(animal_df)
 
     unique_names = unique_names['name'].str.lower()
     disjoint = unique_names[~unique_names.isin(animal_names)]
@@ -71,9 +90,20 @@ def get_disjoint(animal_df: pd.DataFrame, unique_names: pd.DataFrame) -> pd.Data
 
 
 def get_unique_animal_names() -> pd.DataFrame:
-    animals = extract_extra_names(get_all_animals(DB_LOGIN_DATA), 'name')
-    unique_names = load_names(ANIMALS_NAME_FILE)
-
-    return get_disjoint(animals, unique_names)
-
-    
+    """
+    Names from ANIMALS_NAME_FILE not used by any animal, memoized per roster version.
+    The returned frame is shared between requests; don't modify it.
+    """
+    roster = get_roster()
+    key = (roster.version, ANIMALS_NAME_FILE)
+    with _disjoint_lock:
+        cached = _disjoint_cache.get(key)
+    if cached is not None:
+        return cached
+    used = animal_name_words(roster.animals) if not roster.animals.empty else frozenset()
+    names = [name.capitalize() for name in load_name_set(ANIMALS_NAME_FILE) if name not in used]
+    disjoint = pd.DataFrame({'name': names})
+    if roster.version:
+        with _disjoint_lock:
+            _disjoint_cache[key] = disjoint
+    return disjoint
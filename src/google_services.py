@@ -2,16 +2,23 @@ import base64
 import logging
 import io
 import re
+import time
 import pandas as pd
-from typing import Tuple, Union, Optional, Dict, List
+from typing import NamedTuple, Tuple, Union, Optional, Dict, List
 from datetime import datetime as dt, timedelta as td
 from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
-from parsers.invoices import get_parser
+from service_factory import build_service, get_service
+from parsers.invoices import AIParser, InvoiceParser, get_parser, parse_ai_invoices
+from parsers.classify import Classification, DocumentKind, classify_document
+from parsers.pdf_text import PdfText
+from parsers.gemini import GeminiExtractor
+from parse_cache import ParseCache
 from animal_db_handler import add_invoices_col, match_animals, upload_dataframe_to_database
 from utils import error_logger, get_email_dates_sender, Folders, EmailLabels
+from run_ledger import RunLedger, Outcome, content_hash
+from constants.project import DRIVE_QUERY_MAX_LENGTH
 from constants.regex import NON_INVOICE_REGEXES
 from constants.dates import (
     GMAIL_DATE,
@@ -28,7 +35,7 @@ log = logging.getLogger(__name__)
 
 class GmailService:
     def __init__(self, creds):
-        self.service = build("gmail", "v1", credentials=creds)
+        self.service = build_service("gmail", "v1", creds)
 
     @error_logger()
     def get_user_email(self):
@@ -102,9 +109,24 @@ class GmailService:
         return False
         
 
+def parents_queries(folder_ids: List[str], max_length: int = DRIVE_QUERY_MAX_LENGTH) -> List[str]:
+    """Splits `folder_ids` into `'a' in parents or 'b' in parents ...` clauses of at most `max_length` characters."""
+    queries, clauses, length = [], [], 0
+    for folder_id in folder_ids:
+        clause = f"'{folder_id}' in parents"
+        if clauses and length + len(" or ") + len(clause) > max_length:
+            queries.append(" or ".join(clauses))
+            clauses, length = [], 0
+        length += len(clause) + (len(" or ") if clauses else 0)
+        clauses.append(clause)
+    if clauses:
+        queries.append(" or ".join(clauses))
+    return queries
+
+
 class DriveService:
     def __init__(self, creds):
-        self.service = build("drive", "v3", credentials=creds)
+        self.service = build_service("drive", "v3", creds)
         self.mimetypes = {
             'folder': 'application/vnd.google-apps.folder',
             'pdf': 'application/pdf',
@@ -207,7 +229,13 @@ class DriveService:
         return files
 
     @error_logger()
-    def list_files_in_folder(self, parent_id, name_contains: Optional[str] = None, mime_type: Optional[str] = None):
+    def list_files_in_folder(
+            self,
+            parent_id,
+            name_contains: Optional[str] = None,
+            mime_type: Optional[str] = None,
+            fields: str = "files(id,name,webViewLink,mimeType)",
+    ):
         q_parts = [f"'{parent_id}' in parents"]
         if mime_type:
             mime = self.mimetypes.get(mime_type, mime_type)
@@ -216,7 +244,7 @@ class DriveService:
             q_parts.append(f"name contains '{name_contains}'")
 
         query = " and ".join(q_parts)
-        return self.list_files(query=query)
+        return self.list_files(query=query, fields=fields)
 
     @error_logger()
     def get_folders(self, parent_id, name_contains: Optional[str] = None):
@@ -241,14 +269,18 @@ class DriveService:
             parent_id: str,
             folder_suffix: str,
             mime_type: str,
+            fields: str = "files(id,name,webViewLink)",
     ) -> List[Dict]:
+        """Lists the `mime_type` files of every folder under `parent_id` whose name contains `folder_suffix`.
 
-        folders = self.get_folders(parent_id, name_contains=folder_suffix)
+        The folders are listed together, with one `... in parents` query per
+        DRIVE_QUERY_MAX_LENGTH of folder ids rather than one per folder.
+        """
+        folders = self.list_files_in_folder(parent_id, name_contains=folder_suffix, mime_type='folder', fields="files(id)")
+        mime = self.mimetypes.get(mime_type, mime_type)
         files = []
-        for folder in folders:
-            folder_id = folder['id']
-            files_in_folder = self.list_files_in_folder(folder_id, mime_type)
-            files.extend(files_in_folder)
+        for parents in parents_queries([folder['id'] for folder in folders]):
+            files.extend(self.list_files(f"({parents}) and mimeType='{mime}'", fields=fields))
         return files
 
     @error_logger(reraise=True)
@@ -278,13 +310,46 @@ class Statistics:
         self.successful_names = []
         self.failure_names = []
         self.non_invoices = []
+        self.already_processed = []
+        self.pages_total = 0
+        self.pages_read = 0
+        self.extraction_seconds = 0.0
+        # (filename, kind, reason) of PDFs the first-page classifier kept from the parsers
+        self.prefiltered = []
+        self.prefiltered_pages = 0
+        self.needs_ocr = []
+        self.duplicate_invoices = []
+        self.classify_seconds = 0.0
+
+    def record_pages(self, parser: InvoiceParser, seconds: float = 0.0) -> None:
+        """Counts the PDF pages `get_parser` extracted for an invoice, and the ones it could skip."""
+        self.pages_total += parser.pages_total
+        self.pages_read += parser.pages_read
+        self.extraction_seconds += seconds
+
+    def record_prefiltered(self, filename: str, decision: Classification, pages: int) -> None:
+        self.prefiltered.append((filename, decision.kind, decision.reason))
+        self.prefiltered_pages += pages
+        if decision.kind == DocumentKind.NON_INVOICE:
+            self.non_invoices.append(filename)
+        elif decision.kind == DocumentKind.IMAGE_ONLY:
+            self.needs_ocr.append(filename)
+
+    def prefilter_seconds_saved(self) -> float:
+        """Estimated extraction time the prefilter saved: its documents' pages at this run's
+        measured seconds per extracted page, less the time spent classifying.
+        """
+        if not self.pages_read:
+            return 0.0
+        return self.prefiltered_pages * self.extraction_seconds / self.pages_read - self.classify_seconds
 
     def summary(self) -> str:
         s = len(self.successful_names)
         f = len(self.failure_names)
         n = len(self.non_invoices)
+        p = len(self.already_processed)
         s_table, f_table = "", ""
-        non_table = ""
+        non_table, pre_table = "", ""
         if self.successful_names:
             sframe = pd.DataFrame(self.successful_names, columns=["Successes"])
             sframe = sframe.sort_values(by="Successes")
@@ -299,6 +364,9 @@ class Statistics:
             nonframe = pd.DataFrame(self.non_invoices, columns=["Non-Invoices"])
             nonframe = nonframe.sort_values(by="Non-Invoices")
             non_table = nonframe.to_html(index=False)
+        if self.prefiltered:
+            preframe = pd.DataFrame(self.prefiltered, columns=["PDF", "Kind", "Reason"])
+            pre_table = preframe.sort_values(by="PDF").to_html(index=False)
 
         return f"""
         <h1>[Invoice Processor]</h1><br>
@@ -307,6 +375,11 @@ class Statistics:
         <strong>Successes</strong>: {s}<br>
         <strong>Failures</strong>: {f}<br>
         <strong>Non-Invoices</strong>: {n}<br>
+        <strong>Needs OCR (scanned, no text)</strong>: {len(self.needs_ocr)}<br>
+        <strong>Previously Processed (skipped)</strong>: {p}<br>
+        <strong>Duplicate Invoices (skipped)</strong>: {len(self.duplicate_invoices)}<br>
+        <strong>PDF Pages Skipped (after the charges)</strong>: {self.pages_total - self.pages_read} of {self.pages_total}<br>
+        <strong>Prefiltered by First Page</strong>: {len(self.prefiltered)} PDFs, {self.prefiltered_pages} pages, ~{self.prefilter_seconds_saved():.1f}s of extraction saved<br>
         <br>
         <strong>Data Successfully Uploaded to ASM?<strong> {self.upload_success}<br>
         ---
@@ -318,11 +391,22 @@ class Statistics:
 
         <h2> Non-Invoices </h2><br>
             {non_table}
+
+        <h2> Prefiltered </h2><br>
+            {pre_table}
         """
 
     def send_summary(self, gmail) -> bool:
         return gmail.send_email_summary(self.summary(), gmail.get_user_email())
 
+class PendingAttachment(NamedTuple):
+    msg_id: str
+    filename: str
+    data: io.BytesIO
+    mime_type: str
+    digest: str
+
+
 """
 So we need this function to:
     - Loop through emails
@@ -331,9 +415,19 @@ So we need this function to:
     - Process attachment
 """
 class Processor:
-    def __init__(self, creds):
-        self.drive = DriveService(creds)
-        self.gmail = GmailService(creds)
+    def __init__(
+        self,
+        creds,
+        ledger: Optional[RunLedger] = None,
+        extractor: Optional[GeminiExtractor] = None,
+        parse_cache: Optional[ParseCache] = None,
+    ):
+        self.drive = get_service(DriveService, creds)
+        self.gmail = get_service(GmailService, creds)
+        self.ledger = ledger
+        self.extractor = extractor
+        self.parse_cache = parse_cache
+        self.ai_queue: List[Tuple[PendingAttachment, AIParser]] = []
 
 
     @error_logger()
@@ -360,6 +454,13 @@ class Processor:
                 animals=animals,
                 batch_gmail=batch_gmail,
             )
+        self.process_ai_queue(
+            stats=stats,
+            folder_ids=folder_ids,
+            labels=email_labels,
+            animals=animals,
+            batch_gmail=batch_gmail,
+        )
 
         timestamp = dt.now().strftime("%Y-%m-%d-%H:%M:%S")
 
@@ -381,6 +482,8 @@ class Processor:
                 name_contains='failures',
                 timestamp=timestamp,
             )
+        if self.ledger:
+            self.ledger.commit()
         batch_gmail.execute()
 
         return self.gmail.send_email_summary(stats.summary(), self.gmail.get_user_email())
@@ -388,7 +491,6 @@ class Processor:
 
     def process_message(self, message: Dict, stats: Statistics, folder_ids: Folders, labels: EmailLabels, animals: pd.DataFrame,  batch_gmail):
         msg_id = message.get("id")
-        add_to_gmail = False
         try:
             msg = self.gmail.get_message(msg_id)
             headers = msg.get("payload", {}).get("headers", [])
@@ -407,39 +509,141 @@ class Processor:
             ext = '.pdf' if not normalized_name.endswith('.pdf') else ''
             filename = f"{date_str}_{sender_email}_{normalized_name}{ext}"
 
+            if self.ledger and self.ledger.seen_attachment(msg_id, filename):
+                stats.already_processed.append(filename)
+                continue
+
             if re.search(NON_INVOICE_REGEXES, filename.lower()):
                 stats.non_invoices.append(filename)
                 continue
 
             attachment_data = self.gmail.get_attachment(msg_id, attachment["body"]["attachmentId"])
+            if attachment_data is None:
+                continue
+            digest = content_hash(attachment_data.getvalue())
+            if self.ledger:
+                uploaded_id = self.ledger.seen_content(digest)
+                if uploaded_id:
+                    stats.already_processed.append(filename)
+                    self.ledger.record(msg_id, filename, digest, Outcome.DUPLICATE, uploaded_id)
+                    continue
+            pending = PendingAttachment(msg_id, filename, attachment_data, attachment["mimeType"], digest)
             try:
-                drive_folder_name, add_to_gmail = self.process_invoiced_attachment(
-                    filename=filename,
-                    filedata=attachment_data,
-                    stats=stats,
-                    animals=animals
-                )
-                drive_folder_id = self.drive.get_or_create_folder(
-                    name=drive_folder_name,
-                    parent_id=folder_ids.invoice
-                )
-                if add_to_gmail:
-                    batch_gmail.add(self.gmail.move_message(
-                        msg_id = msg_id,
-                        from_label=labels.from_label,
-                        to = labels.to_label
-                    ))
+                started = time.perf_counter()
+                document = PdfText(attachment_data)
+                decision = classify_document(document)
+                classified = time.perf_counter()
+                if decision.kind == DocumentKind.INVOICE:
+                    parser = get_parser(attachment_data, filename, True, text=document)
+            except Exception as e:
+                log.exception(f"{filename} with msg_id={msg_id} could not be read: {e}")
+                self._upload_unprocessed(pending, folder_ids)
+                continue
+            if decision.kind != DocumentKind.INVOICE:
+                log.info(f"{filename}: {decision.kind} | {decision.reason}")
+                stats.classify_seconds += classified - started
+                stats.record_prefiltered(filename, decision, document.page_count)
+                if decision.kind == DocumentKind.IMAGE_ONLY:
+                    self._upload_unprocessed(pending, folder_ids, needs_ocr=True)
+                continue
+            stats.record_pages(parser, time.perf_counter() - started)
+            # Unknown clinics go to Gemini; defer them so the requests run concurrently
+            if self.extractor and isinstance(parser, AIParser):
+                parser.extractor = self.extractor
+                self.ai_queue.append((pending, parser))
+                continue
+            self.file_attachment(pending, parser, stats, folder_ids, labels, animals, batch_gmail)
 
 
+    def process_ai_queue(self, stats: Statistics, folder_ids: Folders, labels: EmailLabels, animals: pd.DataFrame, batch_gmail):
+        """Sends every deferred unknown-clinic invoice to Gemini at once, then files them."""
+        if not self.ai_queue:
+            return
+        parsers = [
+            parser for _, parser in self.ai_queue
+            if not (self.parse_cache and self.parse_cache.load(parser))
+        ]
+        if parsers:
+            records = self.extractor.extract_many([parser.text for parser in parsers])
+            parse_ai_invoices(parsers, records)
+        for pending, parser in self.ai_queue:
+            self.file_attachment(pending, parser, stats, folder_ids, labels, animals, batch_gmail)
+        self.ai_queue = []
 
-                self.drive.upload_file(
-                    name=filename, data=attachment_data,
-                    parents=[drive_folder_id],
-                    mime_type=attachment['mimeType']
-                    )
-            except Exception as e:
-                log.exception(f"{filename} with msg_id={msg_id} could not process: {e}")
-                self.drive.upload_file(name=filename, data=attachment_data, parents=[folder_ids.unprocessed], mime_type=attachment["mimeType"])
+
+    def file_attachment(self, pending: PendingAttachment, parser, stats: Statistics, folder_ids: Folders, labels: EmailLabels, animals: pd.DataFrame, batch_gmail):
+        """Parses and matches one invoice, uploads it to its clinic folder and queues the label move."""
+        try:
+            if self.ledger and self._duplicate_invoice(pending, parser, stats, labels, batch_gmail):
+                return
+            drive_folder_name, add_to_gmail = self.process_invoiced_attachment(
+                filename=pending.filename,
+                filedata=pending.data,
+                stats=stats,
+                animals=animals,
+                parser=parser,
+                parse_cache=self.parse_cache,
+            )
+            drive_folder_id = self.drive.get_or_create_folder(
+                name=drive_folder_name,
+                parent_id=folder_ids.invoice
+            )
+            file_id = self.drive.upload_file(
+                name=pending.filename, data=pending.data,
+                parents=[drive_folder_id],
+                mime_type=pending.mime_type
+                )
+            if file_id is None:
+                # Left unlabelled and out of the ledger, so the next run retries it
+                log.warning(f"{pending.filename} with msg_id={pending.msg_id} failed to upload")
+                return
+            if add_to_gmail:
+                batch_gmail.add(self.gmail.move_message(
+                    msg_id = pending.msg_id,
+                    from_label=labels.from_label,
+                    to = labels.to_label
+                ))
+            outcome = Outcome.COMPLETED if add_to_gmail else Outcome.INCOMPLETE
+            if self.ledger:
+                self.ledger.record(pending.msg_id, pending.filename, pending.digest, outcome, file_id)
+                self.ledger.record_invoice(parser.invoice_key(), pending.digest, pending.msg_id, pending.filename, file_id)
+        except Exception as e:
+            log.exception(f"{pending.filename} with msg_id={pending.msg_id} could not process: {e}")
+            self._upload_unprocessed(pending, folder_ids)
+
+
+    def _duplicate_invoice(
+            self, pending: PendingAttachment, parser: InvoiceParser, stats: Statistics, labels: EmailLabels, batch_gmail,
+    ) -> bool:
+        """Parses just the invoice header and checks the ledger for an invoice already filed with the
+        same clinic, id and date; a duplicate is recorded and skips charge parsing, matching and upload.
+        Its email is moved on like the original's was, i.e. when the original was filed as completed.
+        """
+        key = parser.parse_header()
+        first = self.ledger.seen_invoice(*key) if key else None
+        if first is None:
+            return False
+        log.info(f"{pending.filename}: duplicate of {first} ({' '.join(key)}), skipping")
+        stats.duplicate_invoices.append(pending.filename)
+        self.ledger.record(pending.msg_id, pending.filename, pending.digest, Outcome.DUPLICATE)
+        if self.ledger.invoice_outcome(*key) == Outcome.COMPLETED:
+            batch_gmail.add(self.gmail.move_message(
+                msg_id = pending.msg_id,
+                from_label=labels.from_label,
+                to = labels.to_label
+            ))
+        return True
+
+
+    def _upload_unprocessed(self, pending: PendingAttachment, folder_ids: Folders, needs_ocr: bool = False):
+        folder = folder_ids.needs_ocr if needs_ocr and folder_ids.needs_ocr else folder_ids.unprocessed
+        file_id = self.drive.upload_file(name=pending.filename, data=pending.data, parents=[folder], mime_type=pending.mime_type)
+        if file_id is None:
+            log.warning(f"{pending.filename} with msg_id={pending.msg_id} failed to upload")
+            return
+        if self.ledger:
+            outcome = Outcome.NEEDS_OCR if needs_ocr else Outcome.UNPROCESSED
+            self.ledger.record(pending.msg_id, pending.filename, pending.digest, outcome, file_id)
 
 
     def _update_csv_report(self, df: pd.DataFrame, folder_id:str, name_contains: str, timestamp:str,):
@@ -459,13 +663,21 @@ class Processor:
         filename: str,
         filedata: io.BytesIO,
         stats : Statistics,
-        animals: pd.DataFrame
+        animals: pd.DataFrame,
+        parser: Optional[InvoiceParser] = None,
+        parse_cache: Optional[ParseCache] = None,
     ) -> Tuple[str, bool]:
         ## Return Values ##
         add_to_gmail_batch = False
         output_path = None
-        parser = get_parser(filedata, filename, True)
-        parser.parse_invoice()
+        if parser is None:
+            started = time.perf_counter()
+            parser = get_parser(filedata, filename, True)
+            stats.record_pages(parser, time.perf_counter() - started)
+        if parse_cache:
+            parse_cache.parse(parser)
+        else:
+            parser.parse_invoice()
         parsed_items = match_animals(parser.items, animals)
         success_condition = parsed_items['ANIMALCODE'] != 'ERROR_CODE'
 
@@ -481,6 +693,8 @@ class Processor:
         else:
             stats.failure_names.append(filename)
             output_path = parser.drive_incomplete
+            if parse_cache:
+                parse_cache.record_failures(filename, parser, parsed_items.index[~success_condition])
         return output_path, add_to_gmail_batch
 
 
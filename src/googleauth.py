@@ -1,60 +1,181 @@
+import functools
 import os
 import pickle
 import base64
 import json
+import threading
+import time
+import google.auth.transport
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
-from google.cloud import secretmanager
 from utils import error_logger
-from typing import Optional
+from typing import NamedTuple, Optional
+from constants.project import SECRET_REFRESH_SECONDS
 from pathlib import Path
 
 from google_auth_oauthlib.flow import Flow
 
+class CachedSecret(NamedTuple):
+    version: str
+    value: object
+    checked: float
+
+
 class SecretManager:
-    def __init__(self, project_id: str, secret_names: list[str]) -> None:
+    """Reads pickled secrets from Secret Manager, holding them in memory.
+
+    One client is kept per service account. A secret is re-read only when the
+    version `latest` points at has changed, and that is checked at most every
+    `refresh_seconds`; a pinned version is immutable and read once. `client`
+    replaces the Secret Manager client for every account, e.g. a local stub.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        secret_names: list[str],
+        refresh_seconds: float = SECRET_REFRESH_SECONDS,
+        client=None,
+    ) -> None:
         self.id = project_id
         self.secret_paths = {}
         self.secret_names = secret_names
         for secret in secret_names:
             self.secret_paths[secret] = f'projects/{self.id}/secrets/{secret}/versions'
-        
+        self.refresh_seconds = refresh_seconds
+        self.client = client
+        self.clients = {}
+        self.cache: dict[str, CachedSecret] = {}
+        self.lock = threading.Lock()
 
-    def retrieve_secret_from_info(self, secret_name: str, account: dict, version: str = "latest",) -> Credentials:
-        client = secretmanager.SecretManagerServiceClient.from_service_account_info(
-            account,
-        )
+    def _client_from_info(self, account: dict):
+        if self.client is not None:
+            return self.client
+        key = account.get("client_email") or json.dumps(account, sort_keys=True)
+        if key not in self.clients:
+            from google.cloud import secretmanager
+
+            self.clients[key] = secretmanager.SecretManagerServiceClient.from_service_account_info(
+                account,
+            )
+        return self.clients[key]
+
+    def _client_from_file(self, account_file: str):
+        if self.client is not None:
+            return self.client
+        if account_file not in self.clients:
+            from google.cloud import secretmanager
+
+            self.clients[account_file] = secretmanager.SecretManagerServiceClient.from_service_account_file(
+                account_file,
+            )
+        return self.clients[account_file]
+
+    def _access(self, client, secret_name: str, version: str):
         secret_path = f'{self.secret_paths[secret_name]}/{version}'
+        now = time.monotonic()
+        with self.lock:
+            cached = self.cache.get(secret_path)
+        if cached:
+            if version != "latest" or now - cached.checked < self.refresh_seconds:
+                return cached.value
+            # Metadata only; the payload is fetched again just when the version moved
+            if client.get_secret_version(name=secret_path).name == cached.version:
+                with self.lock:
+                    self.cache[secret_path] = cached._replace(checked=now)
+                return cached.value
         response = client.access_secret_version(name=secret_path)
-        return pickle.loads(response.payload.data)
+        value = pickle.loads(response.payload.data)
+        with self.lock:
+            self.cache[secret_path] = CachedSecret(response.name, value, now)
+        return value
+
+    def retrieve_secret_from_info(self, secret_name: str, account: dict, version: str = "latest",) -> Credentials:
+        return self._access(self._client_from_info(account), secret_name, version)
 
     @error_logger(reraise=True)
     def retrieve_secret_from_file(self, secret_name: str, account_file: str, version: str = "latest",) -> Credentials:
-        client = secretmanager.SecretManagerServiceClient.from_service_account_file(
-            account_file,
-        )
-        secret_path = f'{self.secret_paths[secret_name]}/{version}'
-        response = client.access_secret_version(name=secret_path)
-        return pickle.loads(response.payload.data)
+        return self._access(self._client_from_file(account_file), secret_name, version)
 
     @error_logger()
     def update_secret(self, secret_name: str, account: dict, new_value) -> None:
-        client = secretmanager.SecretManagerServiceClient.from_service_account_info(
-            account,
-        )
+        from google.cloud import secretmanager
+
+        client = self._client_from_info(account)
         payload = secretmanager.SecretPayload(data=pickle.dumps(new_value))
         secret_path = self.secret_paths[secret_name]
         new_version = client.add_secret_version(
             parent=secret_path,
             payload = payload
         )
+        with self.lock:
+            self.cache[f'{secret_path}/latest'] = CachedSecret(new_version.name, new_value, time.monotonic())
         old_versions = client.list_secret_versions(parent=secret_path)
         for v in old_versions:
             if v.name != new_version.name:
                 client.destroy_secret_version(name=v.name)
 
+
+@functools.lru_cache(maxsize=None)
+def service_account_email(account_file: str) -> str:
+    """The `client_email` of a service-account key file, read once per process."""
+    with open(account_file, 'rb') as f:
+        return json.load(f)["client_email"]
+
+
+def cache_max_age(headers) -> int:
+    """Seconds a response may be reused for according to its Cache-Control header."""
+    cache_control = next(
+        (value for key, value in headers.items() if key.lower() == "cache-control"), "",
+    )
+    directives = [d.strip().lower() for d in cache_control.split(",")]
+    if "no-store" in directives or "no-cache" in directives:
+        return 0
+    for directive in directives:
+        if directive.startswith("max-age="):
+            try:
+                return max(int(directive.split("=", 1)[1]), 0)
+            except ValueError:
+                return 0
+    return 0
+
+
+class CachingRequest(google.auth.transport.Request):
+    """google-auth transport that reuses GET responses while their Cache-Control allows.
+
+    `id_token.verify_oauth2_token` fetches Google's OIDC certificates on every
+    call; through this transport they are fetched again only once expired.
+    """
+
+    def __init__(self, request: Optional[google.auth.transport.Request] = None) -> None:
+        self.request = request or Request()
+        self.cache: dict[str, tuple[float, object]] = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if method != "GET" or body is not None:
+            return self.request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        now = time.monotonic()
+        with self.lock:
+            hit = self.cache.get(url)
+        if hit and hit[0] > now:
+            return hit[1]
+        response = self.request(url, method=method, headers=headers, timeout=timeout, **kwargs)
+        max_age = cache_max_age(response.headers)
+        if response.status == 200 and max_age:
+            with self.lock:
+                self.cache[url] = (now + max_age, response)
+        return response
+
+
+@functools.lru_cache(maxsize=None)
+def oidc_request() -> CachingRequest:
+    """Process-wide transport for verifying OIDC tokens."""
+    return CachingRequest()
+
+
 class CredentialManager:
     def __init__(self, scopes: list[str], oauth_client_config_path: str):
         self.scopes = scopes
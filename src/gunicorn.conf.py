@@ -0,0 +1,15 @@
+# Read by gunicorn from the working directory (the Dockerfile copies src/ there).
+# Command line flags, e.g. --workers in the Dockerfile CMD, still take precedence.
+import time
+
+# Import main once in the master; workers fork with the app (and its secret key) already loaded
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Primes the heavy request-path imports and caches once per worker."""
+    from main import warm_up
+
+    start = time.perf_counter()
+    warm_up()
+    server.log.info(f"Worker {worker.pid} warmed up in {time.perf_counter() - start:.2f}s")
@@ -1,20 +1,17 @@
 #!/usr/bin/env python3
 import logging
 import os
-import json
 
-import google.auth.transport.requests
 from flask import Flask, Response, jsonify, redirect, request, session, url_for
-from google.oauth2 import id_token
 from werkzeug.middleware.proxy_fix import ProxyFix
-from googleauth import CredentialManager, SecretManager
-from google_services import DriveService,  Processor
+from googleauth import CredentialManager, SecretManager, oidc_request, service_account_email
 from blueprints.oauth_routes import auth_bp
 from blueprints.name_route import name_bp
 from utils import process_invoices
 
-from animal_db_handler import get_all_animals, prepare_animals_for_failure_matching
-#
+# pandas, pypdf, googleapiclient and the Gemini client are imported inside the
+# routes that use them, so the landing page and OAuth routes start cold fast.
+# gunicorn.conf.py calls warm_up() once per worker.
 from constants.project import (
     PROJECT_ID,
     SECRET_NAME,
@@ -23,6 +20,8 @@ from constants.project import (
     REDIRECT_URI,
     SCOPES,
     DRIVE_INVOICES_FOLDER,
+    LEDGER_DB_FILE,
+    PARSE_CACHE_DIR,
 
 
 
@@ -30,7 +29,6 @@ from constants.project import (
 from constants.database import (
     DB_LOGIN_DATA
 )
-from web_process import process_invoice_corrections, show_failed_invoices
 
 log = logging.getLogger(__name__)
 log_formatter = logging.Formatter("[%(asctime)s] %(message)s")
@@ -77,14 +75,12 @@ def verify_request():
     if not auth_header or not auth_header.startswith("Bearer "):
         return jsonify({"error": "Unauthorized"}), 403
 
+    from google.oauth2 import id_token
+
     token = auth_header.split("Bearer ")[1]
     try:
-        request_adapter = google.auth.transport.requests.Request()
-        decoded_token = id_token.verify_oauth2_token(token, request_adapter)
-        with open(SERVICE_ACCOUNT_CONFIG_FILE, 'rb') as f:
-            cfg_json = json.load(f)
-
-        if decoded_token["email"] != cfg_json["client_email"]:
+        decoded_token = id_token.verify_oauth2_token(token, oidc_request())
+        if decoded_token["email"] != service_account_email(SERVICE_ACCOUNT_CONFIG_FILE):
             return jsonify({"error": "Unauthorized requester"}), 403
     except Exception as e:
         return jsonify({"error": f"Invalid token: {e!s}"}), 403
@@ -104,9 +100,20 @@ def routine_processor():
     auth_error = verify_request()
     if auth_error:
         return auth_error
+    from google_services import Processor
+    from parse_cache import ParseCache
+    from parsers.gemini import get_extractor
+    from run_ledger import RunLedger
+
     creds = app.secret_manager.retrieve_secret_from_file(SECRET_NAME, SERVICE_ACCOUNT_CONFIG_FILE)
-    processor = Processor(creds)
-    success = process_invoices(processor, ROUTINE_DAYS )
+    ledger = RunLedger(LEDGER_DB_FILE)
+    try:
+        processor = Processor(
+            creds, ledger=ledger, extractor=get_extractor(), parse_cache=ParseCache(PARSE_CACHE_DIR),
+        )
+        success = process_invoices(processor, ROUTINE_DAYS )
+    finally:
+        ledger.close()
     if not success:
         return Response("Something went wrong!", 304)
     return Response("Success", 200)
@@ -115,31 +122,93 @@ def routine_processor():
 
 @app.route("/retry_failed", methods=["GET", "POST"])
 def process_failed_invoices():
+    from animal_db_handler import get_failure_matching_roster
+    from google_services import DriveService
+    from parse_cache import ParseCache
+    from service_factory import get_service
+    from web_process import process_invoice_corrections, restore_cached_failures, show_failed_invoices
+
     creds = app.web_creds_manager.load_from_session_data(session)
     if not creds:
         return redirect(url_for("auth.start_oauth_process"))
-    drive = DriveService(creds)
+    drive = get_service(DriveService, creds)
     drive_folder_id = drive.get_or_create_folder(DRIVE_INVOICES_FOLDER)
     failed, pdfs = drive.get_all_failed_invoice_data(drive_folder_id)
-    animals = prepare_animals_for_failure_matching()
+    failed = restore_cached_failures(failed, pdfs, ParseCache(PARSE_CACHE_DIR))
+    roster = get_failure_matching_roster()
 
     if request.method == "GET":
-        return show_failed_invoices(failed, pdfs, animals)
+        return show_failed_invoices(failed, pdfs, roster)
     if request.method == "POST":
         return process_invoice_corrections(
-            drive, request, drive_folder_id, failed, pdfs, animals,
+            drive, request, drive_folder_id, failed, pdfs, roster.animals,
         )
     return Response("Unknown Method", 405)
 
 
+@app.route("/retry_failed/matches", methods=["GET"])
+def failed_invoice_matches():
+    """Probable animals for ?name=...&date=YYYY-MM-DD, as shown on the retry page."""
+    from animal_db_handler import get_failure_matching_roster
+    from web_process import probable_matches
+
+    if not app.web_creds_manager.load_from_session_data(session):
+        return jsonify({"error": "Unauthorized"}), 401
+    name = request.args.get("name", "")
+    try:
+        matches = probable_matches(name, request.args.get("date"), get_failure_matching_roster())
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date: {e!s}"}), 400
+    return jsonify(matches)
+
+
+
+@app.route("/rematch_failed", methods=["POST"])
+def rematch_failed():
+    from animal_db_handler import get_failure_matching_roster
+    from google_services import DriveService
+    from parse_cache import ParseCache
+    from service_factory import get_service
+    from web_process import rematch_failed_invoices, restore_cached_failures
+
+    creds = app.web_creds_manager.load_from_session_data(session)
+    if not creds:
+        return redirect(url_for("auth.start_oauth_process"))
+    drive = get_service(DriveService, creds)
+    drive_folder_id = drive.get_or_create_folder(DRIVE_INVOICES_FOLDER)
+    failed, pdfs = drive.get_all_failed_invoice_data(drive_folder_id)
+    failed = restore_cached_failures(failed, pdfs, ParseCache(PARSE_CACHE_DIR))
+    roster = get_failure_matching_roster()
+    return rematch_failed_invoices(drive, drive_folder_id, failed, pdfs, roster.animals)
+
+
 
 @app.route("/get_animals", methods=["GET"])
 def list_animals():
+    from animal_db_handler import get_all_animals
+
     animals = get_all_animals(login_data=DB_LOGIN_DATA)
     return Response(animals.to_html())
 
 
 
+def warm_up() -> None:
+    """Imports the request-path modules and primes their caches.
+
+    Run once per worker by gunicorn's post_fork hook so the first real request
+    doesn't pay for it.
+    """
+    import google_services  # noqa: F401  pandas, pypdf, googleapiclient
+    import web_process  # noqa: F401
+    from parsers.invoices import compile_patterns
+    from service_factory import discovery_document
+
+    compile_patterns()
+    discovery_document("gmail", "v1")
+    discovery_document("drive", "v3")
+
+
+
 if __name__ == "__main__":
     app.secret_key = os.urandom(24)
     app.run(
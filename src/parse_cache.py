@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from constants.regex import PROCEDURE_MAP
+from parsers.invoices import PARSER_VERSION, InvoiceParser
+
+log = logging.getLogger(__name__)
+
+METADATA_KEY = b"invoice"
+INVOICE_FIELDS = ["clinic", "clinic_abrv", "id", "name"]
+
+
+def parser_fingerprint(parser_cls: type) -> str:
+    """Hash of everything that decides what a parser class produces.
+
+    Covers `PARSER_VERSION`, the class's regex patterns and date formats and
+    the PROCEDURE_MAP, so editing any of them invalidates cached results
+    without a manual bump.
+    """
+    settings = {
+        attr: getattr(parser_cls, attr)
+        for attr in dir(parser_cls)
+        if attr.endswith(("_pattern", "_format")) and isinstance(getattr(parser_cls, attr), str)
+    }
+    payload = json.dumps(
+        [PARSER_VERSION, parser_cls.__name__, settings, [[k, v] for k, v in PROCEDURE_MAP.items()]],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ParseCache:
+    """On-disk cache of parsed charge tables, before animal matching.
+
+    Entries are Parquet files keyed by a hash of the invoice text and the
+    parser's fingerprint, with the invoice header (clinic, id, name, date)
+    stored in the file metadata. A cache hit restores the parser as if
+    `parse_invoice` had run, so re-processing an invoice against an updated
+    roster only repeats `match_animals`.
+    """
+
+    def __init__(self, cache_dir: str | Path) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.fingerprints: dict[type, str] = {}
+
+    def key(self, parser: InvoiceParser) -> str:
+        cls = type(parser)
+        if cls not in self.fingerprints:
+            self.fingerprints[cls] = parser_fingerprint(cls)
+        return hashlib.sha256(f"{self.fingerprints[cls]}\0{parser.text}".encode()).hexdigest()
+
+    def _path(self, parser: InvoiceParser) -> Path:
+        return self.cache_dir / f"{self.key(parser)}.parquet"
+
+    def load(self, parser: InvoiceParser) -> bool:
+        """Restores a cached parse onto `parser`; returns False on a miss."""
+        path = self._path(parser)
+        if not path.exists():
+            return False
+        try:
+            table = pq.read_table(path)
+            header = json.loads(table.schema.metadata[METADATA_KEY])
+        except Exception as e:
+            log.warning(f"Ignoring unreadable parse cache entry {path.name}: {e}")
+            return False
+        for field in INVOICE_FIELDS:
+            setattr(parser, field, header[field])
+        parser.invoiced_date = pd.Timestamp(header["invoiced_date"])
+        parser.items = table.to_pandas()
+        parser.parsed = True
+        return True
+
+    def store(self, parser: InvoiceParser) -> None:
+        header = {field: getattr(parser, field) for field in INVOICE_FIELDS}
+        header["invoiced_date"] = pd.Timestamp(parser.invoiced_date).isoformat()
+        table = pa.Table.from_pandas(parser.items, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            METADATA_KEY: json.dumps(header, default=str),
+        })
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(parser)
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(table, tmp)
+        tmp.replace(path)
+
+    def parse(self, parser: InvoiceParser) -> bool:
+        """Loads `parser` from the cache, or parses and caches it. Returns True on a hit."""
+        if self.load(parser):
+            return True
+        parser.parse_invoice()
+        try:
+            self.store(parser)
+        except Exception as e:
+            log.warning(f"Could not cache parse of {parser.name}: {e}")
+        return False
+
+    def _filed_path(self, filename: str) -> Path:
+        return self.cache_dir / "filed" / f"{hashlib.sha256(filename.encode()).hexdigest()}.json"
+
+    def record_failures(self, filename: str, parser: InvoiceParser, failed: pd.Index) -> None:
+        """Indexes the invoice filed on Drive as `filename` and the labels of its charges that didn't match."""
+        path = self._filed_path(filename)
+        rows = parser.items.index.get_indexer(failed).tolist()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"key": self.key(parser), "rows": rows}))
+            tmp.replace(path)
+        except Exception as e:
+            log.warning(f"Could not index the failures of {filename}: {e}")
+
+    def load_failures(self, filename: str) -> Optional[pd.DataFrame]:
+        """The unmatched charges of the invoice filed as `filename`, as parsed; None if it isn't indexed."""
+        path = self._filed_path(filename)
+        if not path.exists():
+            return None
+        try:
+            entry = json.loads(path.read_text())
+            items = pq.read_table(self.cache_dir / f"{entry['key']}.parquet").to_pandas()
+        except Exception as e:
+            log.warning(f"Ignoring parse cache entry of {filename}: {e}")
+            return None
+        return items.iloc[entry["rows"]]
@@ -0,0 +1,53 @@
+import re
+from typing import NamedTuple
+
+from constants.regex import INVOICE_HEADER_REGEX, NON_INVOICE_HEADER_REGEX
+from parsers.pdf_text import PdfText
+
+# A first page with fewer non-space characters than this is a scan with no text layer
+MIN_TEXT_CHARS = 40
+# Lines at the top of the first page searched for the document's title
+HEADER_LINES = 12
+# Documents this long with no invoice keyword on the first page are record bundles
+RECORD_PAGE_COUNT = 10
+
+
+class DocumentKind:
+    INVOICE = "invoice"
+    NON_INVOICE = "non_invoice"
+    IMAGE_ONLY = "image_only"
+
+
+class Classification(NamedTuple):
+    kind: str
+    reason: str
+
+
+def classify_document(document: PdfText) -> Classification:
+    """Sorts a PDF into invoice, non-invoice or image-only from its first page and page count.
+
+    Scans are recognised from their content streams before any text is
+    extracted; otherwise only the first page is extracted, and `document`
+    keeps its text for `get_parser`. A title such as "Estimate" or "Medical
+    Record" marks a non-invoice unless the header says invoice or receipt
+    before it (a statement lists invoices below its title); anything
+    uncertain is left an invoice, so the parsers still get to reject it.
+    """
+    if not document.page_count:
+        return Classification(DocumentKind.IMAGE_ONLY, "no pages")
+    if document.backend.image_only():
+        return Classification(DocumentKind.IMAGE_ONLY, "scanned: images and no text operators")
+    first = next(iter(document))
+    chars = len("".join(first.split()))
+    if chars < MIN_TEXT_CHARS:
+        return Classification(DocumentKind.IMAGE_ONLY, f"{chars} characters of text on the first page")
+    header = "\n".join([line for line in first.splitlines() if line.strip()][:HEADER_LINES])
+    title = re.search(NON_INVOICE_HEADER_REGEX, header)
+    invoice = re.search(INVOICE_HEADER_REGEX, header)
+    if title and (not invoice or title.start() < invoice.start()):
+        return Classification(DocumentKind.NON_INVOICE, f"'{title.group()}' in the header")
+    if re.search(INVOICE_HEADER_REGEX, first):
+        return Classification(DocumentKind.INVOICE, "invoice keyword on the first page")
+    if document.page_count >= RECORD_PAGE_COUNT:
+        return Classification(DocumentKind.NON_INVOICE, f"{document.page_count} pages and no invoice keyword")
+    return Classification(DocumentKind.INVOICE, "no non-invoice signal")
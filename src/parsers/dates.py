@@ -0,0 +1,66 @@
+from datetime import datetime as dt
+from typing import Iterable
+
+from constants.dates import DATE_M_D_Y, DATE_MDY
+
+
+def parse_mm_dd_yy(text: str) -> dt | None:
+    """`dt.strptime(text, "%m-%d-%y")` for the zero-padded `MM-DD-YY` shape; None for anything else."""
+    if len(text) != 8 or text[2] != "-" or text[5] != "-":
+        return None
+    month, day, year = text[:2], text[3:5], text[6:]
+    if not (month + day + year).isascii() or not (month + day + year).isdigit():
+        return None
+    year = int(year)
+    # %y's pivot: 69-99 are 1969-1999, 00-68 are 2000-2068
+    return dt(year + (1900 if year >= 69 else 2000), int(month), int(day))
+
+
+def parse_m_d_yyyy(text: str) -> dt | None:
+    """`dt.strptime(text, "%m/%d/%Y")` for the `M/D/YYYY` shape; None for anything else."""
+    parts = text.split("/")
+    if len(parts) != 3:
+        return None
+    month, day, year = parts
+    if not (1 <= len(month) <= 2 and 1 <= len(day) <= 2 and len(year) == 4):
+        return None
+    if not text.isascii() or not (month + day + year).isdigit():
+        return None
+    return dt(int(year), int(month), int(day))
+
+
+FAST_PARSERS = {DATE_MDY: parse_mm_dd_yy, DATE_M_D_Y: parse_m_d_yyyy}
+
+
+class DateParser:
+    """Parses an invoice's date strings, trying `formats` like a `dt.strptime` loop would.
+
+    Each distinct string is parsed once. The format that last succeeded is
+    tried first, and the fixed `MM-DD-YY` and `M/D/YYYY` shapes skip
+    `strptime` entirely. Reordering is safe because the formats in use are
+    mutually exclusive (different separators and year widths), so at most one
+    of them accepts a given string.
+    """
+
+    def __init__(self, formats: Iterable[str]) -> None:
+        self.formats = list(formats)
+        self._parsed: dict[str, dt] = {}
+
+    def parse(self, text: str) -> dt | None:
+        """Returns the parsed date, or None if no format accepts `text`."""
+        parsed = self._parsed.get(text)
+        if parsed is not None:
+            return parsed
+        for i, format in enumerate(self.formats):
+            try:
+                fast = FAST_PARSERS.get(format)
+                parsed = fast(text) if fast else None
+                if parsed is None:
+                    parsed = dt.strptime(text, format)
+            except ValueError:
+                continue
+            if i:
+                self.formats.insert(0, self.formats.pop(i))
+            self._parsed[text] = parsed
+            return parsed
+        return None
@@ -0,0 +1,261 @@
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from constants.dates import DATE_M_D_Y
+from constants.project import (
+    AI_CACHE_DIR,
+    GEMINI_API_KEY,
+    GEMINI_BATCH_SIZE,
+    GEMINI_MAX_WORKERS,
+    GEMINI_MODEL,
+    GEMINI_REQUESTS_PER_MINUTE,
+)
+
+log = logging.getLogger(__name__)
+
+BATCH_PROMPT = """
+    Each invoice below is introduced by a line of the form `### Invoice <number>`.
+    For every invoice extract one record per charge line with the fields:
+    clinic, invoiceNumber, date (MM/DD/YYYY), dogName, description, quantity, totalPrice.
+    Return one entry per invoice using its number; if an invoice or its clinic name
+    cannot be parsed, return it with an empty list of items.
+
+    {invoices}
+    """
+
+INVOICE_RECORD_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "clinic": {"type": "STRING"},
+        "invoiceNumber": {"type": "STRING"},
+        "date": {"type": "STRING"},
+        "dogName": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "quantity": {"type": "NUMBER"},
+        "totalPrice": {"type": "NUMBER"},
+    },
+    "required": ["clinic", "invoiceNumber", "date", "dogName", "description", "totalPrice"],
+}
+RECORD_FIELDS = list(INVOICE_RECORD_SCHEMA["properties"])
+
+BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "invoice": {"type": "INTEGER"},
+            "items": {"type": "ARRAY", "items": INVOICE_RECORD_SCHEMA},
+        },
+        "required": ["invoice", "items"],
+    },
+}
+
+
+class RateLimiter:
+    """Allows at most `requests_per_minute` calls in any sliding 60 second window."""
+
+    def __init__(self, requests_per_minute: int, period: float = 60.0) -> None:
+        self.limit = requests_per_minute
+        self.period = period
+        self.calls: deque[float] = deque()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self.limit <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= self.period:
+                    self.calls.popleft()
+                if len(self.calls) < self.limit:
+                    self.calls.append(now)
+                    return
+                delay = self.period - (now - self.calls[0])
+            time.sleep(delay)
+
+
+class GeminiExtractor:
+    """Shared Gemini client for the AI parsing path.
+
+    One client is reused for every request, requests are throttled by a
+    `RateLimiter` and responses are cached by a hash of the prompt input, in
+    memory and (when `cache_dir` is set) on disk, so re-running an invoice never
+    pays for a second remote call. `client` can be any object exposing
+    `models.generate_content(model=..., contents=..., config=...)`, which is how
+    the tests substitute a local stub model.
+    """
+
+    def __init__(
+        self,
+        api_key: str = GEMINI_API_KEY,
+        client=None,
+        model: str = GEMINI_MODEL,
+        cache_dir: Optional[str | Path] = AI_CACHE_DIR,
+        max_workers: int = GEMINI_MAX_WORKERS,
+        requests_per_minute: int = GEMINI_REQUESTS_PER_MINUTE,
+    ) -> None:
+        self.api_key = api_key
+        self._client = client
+        self.model = model
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_minute)
+        self.memory_cache: dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{kind}\0{text}".encode()).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        with self.lock:
+            if key in self.memory_cache:
+                return self.memory_cache[key]
+        if self.cache_dir:
+            path = self.cache_dir / f"{key}.json"
+            if path.exists():
+                value = json.loads(path.read_text())["response"]
+                with self.lock:
+                    self.memory_cache[key] = value
+                return value
+        return None
+
+    def _cache_put(self, key: str, value: str) -> None:
+        with self.lock:
+            self.memory_cache[key] = value
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_dir / f"{key}.tmp"
+            tmp.write_text(json.dumps({"model": self.model, "response": value}))
+            tmp.replace(self.cache_dir / f"{key}.json")
+
+    def _generate(self, prompt: str, config: Optional[dict] = None) -> str:
+        self.limiter.wait()
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=config,
+        )
+        return response.text or ""
+
+    def extract_batch(self, texts: list[str]) -> list[Optional[list[dict]]]:
+        """Extracts typed charge records for several invoices in one structured request.
+
+        Invoices already in the cache are not resent. Returns one list of
+        records per input text, in input order, or None for an invoice the
+        response left out or returned without charges; only found records are
+        cached.
+        """
+        keys = [self._key("records", text) for text in texts]
+        results: list[Optional[list[dict]]] = []
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self._cache_get(key)
+            results.append(json.loads(cached) if cached is not None else None)
+            if cached is None:
+                missing.append(i)
+        if not missing:
+            return results
+
+        invoices = "\n\n".join(f"### Invoice {n}\n{texts[i]}" for n, i in enumerate(missing))
+        response = self._generate(
+            BATCH_PROMPT.format(invoices=invoices),
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": BATCH_RESPONSE_SCHEMA,
+            },
+        )
+        entries = json.loads(response) if response else []
+        by_number = {
+            entry.get("invoice"): entry.get("items", [])
+            for entry in entries
+            if isinstance(entry, dict)
+        }
+        for n, i in enumerate(missing):
+            records = by_number.get(n)
+            if not records:
+                # Left out of a truncated or partial response; uncached so it is resent next time
+                log.warning(f"Gemini returned no charges for invoice {n} of {len(missing)}")
+                continue
+            self._cache_put(keys[i], json.dumps(records))
+            results[i] = records
+        return results
+
+    def extract_records(self, text: str) -> Optional[list[dict]]:
+        return self.extract_batch([text])[0]
+
+    def extract_many(
+        self, texts: list[str], batch_size: int = GEMINI_BATCH_SIZE,
+    ) -> list[Optional[list[dict]]]:
+        """Runs `extract_batch` over chunks of `texts` concurrently.
+
+        A chunk whose request fails is logged and returned as None for each of
+        its invoices.
+        """
+        chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        def _safe_batch(chunk: list[str]) -> list[Optional[list[dict]]]:
+            try:
+                return self.extract_batch(chunk)
+            except Exception as e:
+                log.exception(f"Gemini extraction failed for {len(chunk)} invoices: {e}")
+                return [None] * len(chunk)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return [records for batch in pool.map(_safe_batch, chunks) for records in batch]
+
+
+def validate_records(records: list[dict], extra_columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """Checks Gemini's records against `INVOICE_RECORD_SCHEMA` and returns them typed.
+
+    Records missing a required field, or whose date or price cannot be parsed,
+    are logged and dropped; a record with no description and no price is not a
+    charge and is dropped silently.
+    """
+    required = INVOICE_RECORD_SCHEMA["required"]
+    valid = []
+    for record in records:
+        if not isinstance(record, dict) or any(record.get(f) is None for f in required if f != "description"):
+            log.warning(f"Dropping malformed Gemini record: {record}")
+            continue
+        valid.append(record)
+    df = pd.DataFrame(valid, columns=RECORD_FIELDS + (extra_columns or []))
+    dates = pd.to_datetime(df["date"], format=DATE_M_D_Y, errors="coerce")
+    other_format = dates.isna() & df["date"].notna()
+    if other_format.any():
+        dates[other_format] = pd.to_datetime(df.loc[other_format, "date"], format="mixed", errors="coerce")
+    df["date"] = dates
+    df["totalPrice"] = pd.to_numeric(df["totalPrice"], errors="coerce")
+    df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce")
+    df["description"] = df["description"].fillna("").astype(str)
+    df["invoiceNumber"] = df["invoiceNumber"].astype(str)
+    bad = df["date"].isna() | df["totalPrice"].isna()
+    if bad.any():
+        log.warning(f"Dropping {int(bad.sum())} Gemini records with unparseable date or price")
+    df = df[~bad]
+    df = df[(df["description"] != "") | (df["totalPrice"] > 0)]
+    return df.reset_index(drop=True)
+
+
+@functools.lru_cache(maxsize=None)
+def get_extractor(api_key: str = GEMINI_API_KEY) -> GeminiExtractor:
+    """Returns the process-wide extractor for `api_key`."""
+    return GeminiExtractor(api_key=api_key)
@@ -1,3 +1,4 @@
+import functools
 import io
 import logging
 import re
@@ -5,9 +6,8 @@ from datetime import datetime as dt
 from pathlib import Path
 from typing import Protocol
 
+import numpy as np
 import pandas as pd
-from google import genai
-from pypdf import PdfReader
 
 
 from constants.dates import (
@@ -16,11 +16,16 @@ from constants.dates import (
     DATE_M_D_Y
 )
 
-from constants.project import GEMINI_API_KEY
+from constants.project import PARALLEL_PAGE_THRESHOLD, PDF_BACKEND
 from constants.regex import PROCEDURE_MAP
+from parsers.dates import DateParser
+from parsers.gemini import GeminiExtractor, get_extractor, validate_records
 from parsers.items import Cost, Medication, Test, Vaccine
+from parsers.pdf_text import PdfText
 
 DATE_FORMATS = [DATE_MDY, DATE_M_D_Y, DATE_MDYYYY]
+# Bump when parsing code changes in a way the patterns don't capture; invalidates ParseCache
+PARSER_VERSION = 2
 log = logging.getLogger(__name__)
 current_invoice = ""
 
@@ -49,63 +54,160 @@ CLINICS = {
 }
 
 
-def have_gemini_do_it(pdf_text: str, key=GEMINI_API_KEY) -> str:
-    client = genai.Client(api_key=key)
+@functools.lru_cache(maxsize=4096)
+def describe_option(option: str) -> tuple[str, bool, tuple[tuple[str, str | None], ...], tuple[str, ...]]:
+    """Classifies one charge description against PROCEDURE_MAP.
 
-    prompt = f"""
-    Extract the following information from the text:
-    clinic, invoiceNumber, date, dogName,  description, quantity, totalPrice
-    and return the data as a comma separated table.
-    If you cannot parse the content OR the clinic name only return an empty string.
-
-    Text:
-            {pdf_text}
+    Returns (cost type, matched, field values, date fields). Date fields are
+    listed separately because they take the charge's date, which is the only
+    part of the result that isn't a function of the description; that lets
+    the decision be memoized across lines and invoices.
     """
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt,
-    )
-
-    return response.text or ""
-
-
-def get_description(option: str, cost_dict: dict, date: dt) -> dict:
-    # option = match.group(1)
-    medication = Medication()
-    medical_test = Test()
-    vaccination = Vaccine()
-    date_string = date.strftime(DATE_M_D_Y)
     for pattern, (cost_type, fields) in PROCEDURE_MAP.items():
         matched = re.search(pattern, option)
         if matched:
-            cost_dict["COSTTYPE"] = cost_type
-            if cost_dict.get("COSTDESCRIPTION"):
-                cost_dict["COSTDESCRIPTION"] += option
-            else:
-                cost_dict["COSTDESCRIPTION"] = option
-            if not fields:
-                return cost_dict
-            for field in fields:
+            values = []
+            date_fields = []
+            for field in fields or []:
                 if "DATE" in field:
-                    cost_dict[field] = date_string
+                    date_fields.append(field)
                 if "COMMENT" in field:
-                    cost_dict[field] = option
+                    values.append((field, option))
                 if "TYPE" in field:
-                    cost_dict[field] = (
-                        medical_test.parse(option)
-                        if "TEST" in field
-                        else vaccination.parse(option)
-                    )
+                    values.append((
+                        field,
+                        Test().parse(option) if "TEST" in field else Vaccine().parse(option),
+                    ))
                 if "NAME" in field:
-                    cost_dict[field] = medication.parse(option)
+                    values.append((field, Medication().parse(option)))
                 if "DOSAGE" in field:
-                    cost_dict[field] = matched.group(1)
-            return cost_dict
-    cost_dict["COSTTYPE"] = Cost.OTHER
-    cost_dict["COSTDESCRIPTION"] += f"{option}"
+                    values.append((field, matched.group(1)))
+            return cost_type, True, tuple(values), tuple(date_fields)
+    return Cost.OTHER, False, (), ()
+
+
+def get_description(option: str, cost_dict: dict, date: dt) -> dict:
+    cost_type, matched, values, date_fields = describe_option(option)
+    cost_dict["COSTTYPE"] = cost_type
+    if matched and not cost_dict.get("COSTDESCRIPTION"):
+        cost_dict["COSTDESCRIPTION"] = option
+    else:
+        cost_dict["COSTDESCRIPTION"] += option
+    if date_fields:
+        date_string = date.strftime(DATE_M_D_Y)
+        for field in date_fields:
+            cost_dict[field] = date_string
+    cost_dict.update(values)
     return cost_dict
 
 
+def classify_charges(
+    charges: pd.DataFrame, option_col: str = "description", date_col: str = "date",
+) -> pd.DataFrame:
+    """Vectorized `get_description` over a frame of charges.
+
+    Each distinct description is classified once (and memoized across
+    invoices by `describe_option`); the decisions are then broadcast back onto
+    the charge rows by their factorized codes instead of a per-row apply.
+    """
+    options = charges[option_col].fillna("").astype(str)
+    codes, uniques = pd.factorize(options)
+    decisions = [describe_option(option) for option in uniques]
+
+    columns = {
+        col: charges[col].to_numpy()
+        for col in charges.columns
+        if col not in (option_col, date_col)
+    }
+    columns["COSTDESCRIPTION"] = columns["COSTDESCRIPTION"] + options.to_numpy(dtype=object)
+    columns["COSTTYPE"] = np.array([d[0] for d in decisions], dtype=object)[codes]
+
+    fields: dict[str, list] = {}
+    date_fields: dict[str, list] = {}
+    for i, (_, _, values, dates) in enumerate(decisions):
+        for field, value in values:
+            fields.setdefault(field, [None] * len(uniques))[i] = value
+        for field in dates:
+            date_fields.setdefault(field, [False] * len(uniques))[i] = True
+    if date_fields:
+        date_strings = charges[date_col].dt.strftime(DATE_M_D_Y).to_numpy(dtype=object)
+        for field, has_date in date_fields.items():
+            columns[field] = np.where(np.array(has_date)[codes], date_strings, None)
+    for field, values in fields.items():
+        columns[field] = np.array(values, dtype=object)[codes]
+    return pd.DataFrame(columns, index=charges.index)
+
+
+# Line fields of the fused grammar and the parser pattern each one comes from
+LINE_FIELDS = {
+    "date": "charges_date_pattern",
+    "dog": "charges_dog_pattern",
+    "price": "price_pattern",
+    "description": "charges_pattern",
+}
+
+
+def name_first_group(pattern: str, name: str) -> str:
+    """Rewrites the first capturing group of `pattern` as `(?P<name>...)`.
+    A leading global flag group like `(?i)` becomes a scoped one, so the
+    pattern can be embedded in a larger one.
+    """
+    flags = re.match(r"\(\?([aiLmsux]+)\)", pattern)
+    if flags:
+        pattern = f"(?{flags.group(1)}:{pattern[flags.end():]})"
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            # "]" straight after "[" or "[^" is a literal
+            i += 1 if pattern.startswith("^", i + 1) else 0
+            i += 1 if pattern.startswith("]", i + 1) else 0
+        elif c == "(" and not pattern.startswith("(?", i):
+            return f"{pattern[:i]}(?P<{name}>{pattern[i + 1:]}"
+        i += 1
+    msg = f"No capturing group in {pattern!r}"
+    raise ValueError(msg)
+
+
+@functools.lru_cache(maxsize=None)
+def line_grammar(parser: type) -> re.Pattern | None:
+    """The parser's fused line grammar: its `line_pattern`, or one built from its
+    charge patterns that matches once per line and captures the date, dog, price
+    and description groups exactly as the separate `get_*` methods find them.
+
+    Each field is a lookahead from the start of the line, so `.*?` reaches the
+    same leftmost match `re.search` would; the price repeats its lookahead to
+    land on the last non-overlapping match, like `re.findall(...)[-1]`.
+    Returns None (use the `get_*` methods) when the patterns can't be fused.
+    """
+    if parser.line_pattern:
+        return re.compile(parser.line_pattern)
+    parts = []
+    try:
+        for field, attr in LINE_FIELDS.items():
+            pattern = getattr(parser, attr)
+            if not pattern:
+                continue
+            if re.search(r"\\\d|\(\?P=", pattern):
+                # Backreferences would point at the wrong group once fused
+                return None
+            body = name_first_group(pattern, field)
+            # A pattern anchored with ^ can only match at the start; skip the .*? scan
+            skip = "" if re.match(r"(\(\?[aiLmsux]+\))?\^", pattern) else ".*?"
+            parts.append(f"(?=(?:{skip}(?:{body}))*)" if field == "price" else f"(?:(?={skip}(?:{body})))?")
+        return re.compile("".join(parts))
+    except (ValueError, re.error) as e:
+        log.warning(f"{parser.__name__}: line patterns can't be fused, parsing lines field by field | {e}")
+        return None
+
+
 class InvoiceParser(Protocol):
     """Creates an InvoiceParser that accepts the text from an invoice."""
 
@@ -121,9 +223,18 @@ class InvoiceParser(Protocol):
     itemized_begin_pattern = r"^\s+(Description.*)"
     itemized_end_pattern = "Patient Subtotal:"
     section_reduce_pattern = ""
+    # Optional hand-written grammar with named groups date, dog, price and description;
+    # by default one is fused from the charge patterns above (see `line_grammar`)
+    line_pattern = ""
     invoice_date_format = DATE_MDY
     charge_date_format = DATE_MDY
     text = ""
+    # How `get_parser` extracts this clinic's PDFs (see parsers.pdf_text)
+    extraction_mode = "plain"
+    pdf_backend = PDF_BACKEND
+    # Pages of the PDF, and how many of them were extracted into `text` (see `get_parser`)
+    pages_total = 0
+    pages_read = 0
     invoice = ""
     name = ""
     success_dir = ""
@@ -145,11 +256,28 @@ class InvoiceParser(Protocol):
         self.fail_dir = default_dir / Path(f"{self.clinic_abrv}_incomplete")
         self.drive_completed = f"{self.clinic_abrv}_completed"
         self.drive_incomplete = f"{self.clinic_abrv}_incomplete"
+        self.date_parsers: dict[tuple[str, ...], DateParser] = {}
 
         if not is_drive:
             self.success_dir.mkdir(exist_ok=True, parents=True)
             self.fail_dir.mkdir(exist_ok=True, parents=True)
 
+    @classmethod
+    def extraction_complete(cls, pages: list[str]) -> bool:
+        """Whether the pages after `pages` can be left unread: every itemized section that
+        `get_itemized_section` finds before the last page has reached `itemized_end_pattern`,
+        and the last page starts no new one. The one page of lookahead keeps a section that
+        starts right after a page break; anything after it is trailing material such as
+        attached medical records.
+        """
+        if len(pages) < 2:
+            return False
+        text = "\n".join(pages[:-1])
+        begins = list(re.finditer(cls.itemized_begin_pattern, text, re.MULTILINE))
+        if not begins or text.find(cls.itemized_end_pattern, begins[-1].start()) == -1:
+            return False
+        return not re.search(cls.itemized_begin_pattern, pages[-1], re.MULTILINE)
+
     def get_itemized_section(self) -> list[str]:
         sections = []
         for match in re.finditer(self.itemized_begin_pattern, self.text, re.MULTILINE):
@@ -191,11 +319,9 @@ class InvoiceParser(Protocol):
             raise ValueError(
                 msg,
             )
-        for format in date_formats:
-            try:
-                return dt.strptime(match.group(1), format)
-            except Exception:
-                continue
+        parsed = self.date_parser(date_formats).parse(match.group(1))
+        if parsed:
+            return parsed
         msg = f"{self.name}: Found {match.group(1)}: Couldn't parse with {date_formats}"
         raise ValueError(
             msg,
@@ -205,21 +331,28 @@ class InvoiceParser(Protocol):
         match = re.search(self.charges_date_pattern, txt)
         if not match:
             return None
-        for format in date_formats:
-            try:
-                return dt.strptime(match.group(1), format)
-            except Exception:
-                continue
+        return self.parse_charge_date(match.group(1), date_formats)
+
+    def date_parser(self, date_formats: list[str] = DATE_FORMATS) -> DateParser:
+        """The invoice's memoizing parser for `date_formats`; it learns which format the invoice uses."""
+        key = tuple(date_formats)
+        parser = self.date_parsers.get(key)
+        if parser is None:
+            parser = self.date_parsers[key] = DateParser(date_formats)
+        return parser
+
+    def parse_charge_date(self, date_string: str, date_formats: list[str] = DATE_FORMATS) -> dt:
+        parsed = self.date_parser(date_formats).parse(date_string)
+        if parsed:
+            return parsed
         msg = (
-            f"{self.name}: [get_date()] Found: {match.group(1)} Couldn't parse with {
+            f"{self.name}: [get_date()] Found: {date_string} Couldn't parse with {
                 date_formats
             }"
         )
         raise ValueError(
             msg,
         )
-        ...
-        return None
 
     def get_price(self, txt: str) -> float:
         match = re.findall(self.price_pattern, txt)
@@ -247,16 +380,28 @@ class InvoiceParser(Protocol):
             return
         return
 
+    def tokenize_line(self, item: str) -> tuple[dt | None, float, str]:
+        """Returns the (date, price, description) of a lowercased charge line and picks up
+        the dog named on it, in one match of the fused line grammar.
+        """
+        grammar = line_grammar(type(self))
+        if grammar is None:
+            date = self.get_date(item)
+            self.get_animal_name_charge(item)
+            return date, self.get_price(item), self.get_charge(item)
+        fields = grammar.match(item).groupdict()
+        if fields.get("dog"):
+            self.curr_dog = fields["dog"]
+        date = self.parse_charge_date(fields["date"]) if fields.get("date") else None
+        price = float(fields["price"]) if fields.get("price") else 0.00
+        return date, price, fields.get("description") or ""
+
     def parse_item(self, item: str) -> dict:
         item = item.lower()
         charges = {}
-        self.charge_date = (
-            self.get_date(item) if self.get_date(item) else self.charge_date
-        )
-        self.get_animal_name_charge(item)
+        line_date, price, charge = self.tokenize_line(item)
+        self.charge_date = line_date if line_date else self.charge_date
         date = self.charge_date
-        price = self.get_price(item)
-        charge = self.get_charge(item)
         if not charge and price <= 0:
             return None
         charges["COSTDATE"] = date.strftime(DATE_M_D_Y)
@@ -269,10 +414,22 @@ class InvoiceParser(Protocol):
 
     def parse_invoice(self) -> None:
         """Parse the self.text of the InvoiceParser. Sets the self.name, self.good, self.bad and self.local_dir."""
-        items = []
-        dog_names = self.get_dog_names()
+        self.parse_header()
+        self.parse_charges()
+
+    def parse_header(self) -> tuple[str, str, str] | None:
+        """Parses the invoice id and date; returns the invoice's (clinic abbreviation, id, ISO date) key."""
         self.id = self.get_invoice_id()
         self.invoiced_date = self.get_invoiced_date()
+        return self.invoice_key()
+
+    def invoice_key(self) -> tuple[str, str, str]:
+        return (self.clinic_abrv, str(self.id), self.invoiced_date.date().isoformat())
+
+    def parse_charges(self) -> None:
+        """Parses the itemized charges into self.items and renames the invoice; needs `parse_header` first."""
+        items = []
+        dog_names = self.get_dog_names()
         sections = self.get_itemized_section()
         new_name = f"{self.clinic_abrv}_{self.id}_{self.invoiced_date.date()}.pdf"
         self.charge_date = self.invoiced_date
@@ -300,6 +457,7 @@ class WaipioParser(InvoiceParser):
     dog_name_pattern = r"(?i)\d{2}-\d{2}-\d{2}\s+?((?!DIAGNOSIS)[A-Z].*?)\s{2,}\d"
     itemized_begin_pattern = r"^\s+(Date.*)"
     itemized_end_pattern = r"payment"
+    extraction_mode = "layout"
 
 
 class VCAParser(InvoiceParser):
@@ -329,6 +487,7 @@ class AnimalHouseVetParser(InvoiceParser):
     charges_pattern = r" \s+(\S.+?  )\s+\S{1,2}"
     itemized_begin_pattern = r"^\s+(Description.*)"
     itemized_end_pattern = "Patient Subtotal:"
+    extraction_mode = "layout"
 
 
 class WahiawaParser(InvoiceParser):
@@ -340,6 +499,7 @@ class WahiawaParser(InvoiceParser):
     dog_name_pattern = r"\d{2}-\d{2}-\d{2}\s+?([A-Z].*?)\s{2,}\d"
     itemized_begin_pattern = r"^\s+(Date.*)"
     itemized_end_pattern = r"payment"
+    extraction_mode = "layout"
 
 
 class MMVCParser(InvoiceParser):
@@ -353,6 +513,7 @@ class MMVCParser(InvoiceParser):
     charges_pattern = r" \s+(\S.+?  )\s+\S{1,2}"
     itemized_begin_pattern = r"\s+(Qty.*)"
     itemized_end_pattern = "Subtotal:"
+    extraction_mode = "layout"
 
 
 # class AlohaAffordableParser(InvoiceParser):
@@ -385,74 +546,139 @@ class MMVCParser(InvoiceParser):
 
 
 class AIParser(InvoiceParser):
-    def parse_invoice(self, df: pd.DataFrame = pd.DataFrame()) -> None:
-        if df.empty:
-            csv_string = have_gemini_do_it(self.text)
-            if not csv_string:
-                msg = "Gemini failed to find the desired information"
-                raise Exception(msg)
-            df = pd.read_csv(io.StringIO(csv_string))
-        df["date"] = pd.to_datetime(df["date"])
-        self.clinic = df["clinic"].values[0]
-        self.clinic_abrv = make_clinic_abbreviation(self.clinic)
-        self.invoiced_date = df["date"].max()
-        self.id = df["invoiceNumber"].min()
-        invoice_items = []
-
-        def _inner_parse(x) -> None:
-            charge = self.parse_item(x)
-            invoice_items.append(charge)
-
-        df.apply(lambda x: _inner_parse(x), axis=1)
-        new_name = f"{self.clinic_abrv}_{self.id}_{self.invoiced_date.date()}.pdf"
-        self.items = pd.DataFrame(invoice_items)
-        self.name = new_name
+    extractor: GeminiExtractor | None = None
+    parsed = False
 
-    def parse_item(self, df_row: pd.Series) -> dict:
-        charges = {}
-        self.curr_dog = df_row["dogName"]
-        self.charge_date = df_row["date"]
-        date = df_row["date"]
-        price = df_row["totalPrice"]
-        description = df_row["description"]
-        if not description and price <= 0:
-            return {}
-        charges["COSTDATE"] = date.strftime(DATE_M_D_Y)
-        charges["COSTDESCRIPTION"] = (
-            f"[{df_row['clinic']} - {df_row['invoiceNumber']} - {date.date()}] "
-        )
-        charges["COSTAMOUNT"] = price
-        charges["ANIMALNAME"] = self.curr_dog
-        return get_description(description, charges, date)
+    def parse_invoice(self, records: list[dict] | None = None) -> None:
+        if self.parsed and records is None:
+            return
+        if records is None:
+            if not self.text.strip():
+                msg = f"{self.name}: no text to send to Gemini, the PDF needs OCR"
+                raise ValueError(msg)
+            extractor = self.extractor or get_extractor()
+            records = extractor.extract_records(self.text)
+        parse_ai_invoices([self], [records])
+        if not self.parsed:
+            msg = "Gemini failed to find the desired information"
+            raise Exception(msg)
+
+    def parse_header(self) -> tuple[str, str, str] | None:
+        """Gemini returns the header with the charges, so the key is only known once parsed."""
+        return self.invoice_key() if self.parsed else None
+
+
+def parse_ai_invoices(parsers: list[AIParser], records: list[list[dict] | None]) -> None:
+    """Validates and classifies the Gemini records of several invoices in one pass.
+
+    Every parser whose records validate gets its items, clinic, id and name
+    set and is marked `parsed`; the rest are left untouched so their own
+    `parse_invoice` reports the failure.
+    """
+    rows = [
+        {**record, "batch": i}
+        for i, invoice_records in enumerate(records)
+        for record in invoice_records or []
+        if isinstance(record, dict)
+    ]
+    df = validate_records(rows, extra_columns=["batch"])
+    if df.empty:
+        return
+    dates = df["date"]
+    charges = pd.DataFrame({
+        "COSTDATE": dates.dt.strftime(DATE_M_D_Y),
+        "COSTDESCRIPTION": (
+            "[" + df["clinic"] + " - " + df["invoiceNumber"] + " - "
+            + dates.dt.strftime("%Y-%m-%d") + "] "
+        ),
+        "COSTAMOUNT": df["totalPrice"],
+        "ANIMALNAME": df["dogName"],
+        "description": df["description"],
+        "date": dates,
+    })
+    items = classify_charges(charges)
+    for i, rows_index in df.groupby("batch").indices.items():
+        parser = parsers[i]
+        invoice = df.iloc[rows_index]
+        parser.clinic = invoice["clinic"].values[0]
+        parser.clinic_abrv = make_clinic_abbreviation(parser.clinic)
+        parser.invoiced_date = invoice["date"].max()
+        parser.id = invoice["invoiceNumber"].min()
+        parser.curr_dog = invoice["dogName"].iloc[-1]
+        parser.charge_date = invoice["date"].iloc[-1]
+        parser.items = items.iloc[rows_index].dropna(axis=1, how="all").reset_index(drop=True)
+        parser.name = f"{parser.clinic_abrv}_{parser.id}_{parser.invoiced_date.date()}.pdf"
+        parser.parsed = True
 
 
 def extract_text(pdf_path: Path | io.BytesIO, mode=None):
-    reader = PdfReader(pdf_path)
-    if not mode:
-        mode = "plain"
-    return "\n".join([p.extract_text(extraction_mode=mode) for p in reader.pages])
+    return PdfText(pdf_path, mode or "plain").read_until()
+
+
+PARSER_MAP = {
+    r"Waipio Pet Clinic": WaipioParser,
+    r"Wahiawa Pet Hospital": WahiawaParser,
+    r"VCA ": VCAParser,
+    r"Animal House Veterinary Center": AnimalHouseVetParser,
+    r"Mililani Mauka Veterinary Clinic": MMVCParser,
+    # r"E Vet": EVetParser,
+    # r"EzyVet Clinic": EzyVetParser,
+}
+
+
+def compile_patterns() -> int:
+    """Compiles every clinic, parser and PROCEDURE_MAP pattern into `re`'s cache.
+
+    Parser patterns are used both with and without re.MULTILINE, so both are
+    compiled. Returns the number of patterns compiled.
+    """
+    patterns = set(PARSER_MAP)
+    for parser in [*PARSER_MAP.values(), AIParser]:
+        line_grammar(parser)
+        for attr in dir(parser):
+            value = getattr(parser, attr)
+            if attr.endswith("_pattern") and isinstance(value, str) and value:
+                patterns.add(value)
+    compiled = 0
+    for pattern in patterns:
+        for flags in (0, re.MULTILINE):
+            re.compile(pattern, flags)
+            compiled += 1
+    for pattern in PROCEDURE_MAP:
+        re.compile(pattern)
+        compiled += 1
+    return compiled
 
 
 def get_parser(
-    invoice_path: Path | io.BytesIO, filename: str = "", is_drive: bool = False,
+    invoice_path: Path | io.BytesIO, filename: str = "", is_drive: bool = False, backend: str | None = None,
+    text: PdfText | None = None, parallel_threshold: int = PARALLEL_PAGE_THRESHOLD,
 ) -> InvoiceParser:
-    txt = extract_text(invoice_path)
-    parser_map = {
-        r"Waipio Pet Clinic": WaipioParser,
-        r"Wahiawa Pet Hospital": WahiawaParser,
-        r"VCA ": VCAParser,
-        r"Animal House Veterinary Center": AnimalHouseVetParser,
-        r"Mililani Mauka Veterinary Clinic": MMVCParser,
-        # r"E Vet": EVetParser,
-        # r"EzyVet Clinic": EzyVetParser,
-    }
-    for clinic_regex, parser in parser_map.items():
-        if re.search(clinic_regex, txt):
-            if re.search(r"Animal|Waipio|Wahiawa|Mililani", clinic_regex):
-                txt = extract_text(invoice_path, mode="layout")
-            if filename:
-                invoice_path = Path(filename)
-            return parser(txt, invoice_path, is_drive)
+    """Picks the parser of the first clinic named in the PDF and extracts its text.
+
+    Pages are read lazily: the clinic comes from the first page that names
+    one, and a clinic parser's text stops once `extraction_complete` says the
+    itemized sections are over, so trailing pages are never decoded. Unknown
+    clinics get every page, for Gemini. The text comes from the clinic's
+    `pdf_backend` and `extraction_mode`, or from `backend` for every clinic if given.
+    `text` is the PDF's plain text if it has already been opened, e.g. by `classify_document`.
+    `parallel_threshold` is passed on to `PdfText`; 0 extracts every page in this process.
+    """
+    plain = text or PdfText(invoice_path, backend=backend or PDF_BACKEND, parallel_threshold=parallel_threshold)
+    parser_cls = None
+    for page in plain:
+        parser_cls = next((cls for regex, cls in PARSER_MAP.items() if re.search(regex, page)), None)
+        if parser_cls:
+            break
+    if parser_cls is None:
+        source, parser_cls, txt = plain, AIParser, plain.read_until()
+    else:
+        mode, backend = parser_cls.extraction_mode, backend or parser_cls.pdf_backend
+        source = plain if (mode, backend) == (plain.mode, plain.backend.name) else PdfText(invoice_path, mode, backend, parallel_threshold)
+        txt = source.read_until(parser_cls.extraction_complete)
     if filename:
         invoice_path = Path(filename)
-    return AIParser(txt, invoice_path, is_drive)
+    parser = parser_cls(txt, invoice_path, is_drive)
+    parser.pages_total = source.page_count
+    parser.pages_read = len(source.pages)
+    return parser
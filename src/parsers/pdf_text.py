@@ -0,0 +1,268 @@
+import io
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Protocol
+
+from pypdf import PdfReader
+
+from constants.project import EXTRACTION_WORKERS, PARALLEL_PAGE_THRESHOLD, PDF_BACKEND
+
+# Pages handed to each worker per batch when a large PDF is extracted in parallel
+PAGES_PER_WORKER = 2
+# Content-stream operators: BT begins a text object, BI an inline image
+TEXT_OPERATOR = re.compile(rb"(?<![^\s\]>)])BT(?![^\s/\[<(])")
+INLINE_IMAGE = re.compile(rb"(?<!\S)BI(?![^\s/])")
+# How deep form XObjects nested inside each other are searched for text
+FORM_DEPTH = 3
+log = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# The PDF a pool worker last opened: (path, backend name, memory map, backend)
+_worker_pdf: Optional[tuple[str, str, mmap.mmap, "PdfBackend"]] = None
+
+
+class PdfBackend(Protocol):
+    """Reads the text of a PDF's pages."""
+
+    name: str
+
+    @property
+    def page_count(self) -> int: ...
+
+    def page_text(self, number: int, mode: str) -> str:
+        """The text of page `number`, in pypdf's "plain" or "layout" extraction mode where supported."""
+        ...
+
+    def image_only(self) -> bool:
+        """Whether the PDF draws images and has no text at all, i.e. is a scan without a text layer.
+        Decides without extracting any text.
+        """
+        ...
+
+
+class PypdfBackend:
+    """pypdf, the default; the only backend with a layout mode that keeps column spacing."""
+
+    name = "pypdf"
+
+    def __init__(self, pdf: Path | io.BytesIO | mmap.mmap) -> None:
+        self.reader = PdfReader(pdf)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+
+    def page_text(self, number: int, mode: str) -> str:
+        return self.reader.pages[number].extract_text(extraction_mode=mode)
+
+    def image_only(self) -> bool:
+        images = False
+        try:
+            for page in self.reader.pages:
+                text, page_images = content_draws(page.get_contents(), page.get("/Resources"))
+                if text:
+                    return False
+                images = images or page_images
+        except Exception as e:
+            log.warning(f"Couldn't inspect the PDF's content streams, treating it as text | {e}")
+            return False
+        return images
+
+
+class PdfiumBackend:
+    """PDFium through the optional pypdfium2 package, several times faster than pypdf.
+
+    PDFium has no layout mode: `mode` is ignored and columns come out
+    separated by single spaces, so it only suits parsers whose patterns don't
+    depend on layout text. Check a clinic with benchmarks/bench_pdf_backends.py
+    before switching it over.
+    """
+
+    name = "pdfium"
+
+    def __init__(self, pdf: Path | io.BytesIO | mmap.mmap) -> None:
+        try:
+            import pypdfium2
+        except ImportError as e:
+            msg = "The pdfium PDF backend needs pypdfium2 (pip install pypdfium2)"
+            raise ImportError(msg) from e
+        if isinstance(pdf, io.BytesIO):
+            pdf = pdf.getvalue()
+        elif isinstance(pdf, mmap.mmap):
+            pdf = pdf[:]
+        self.document = pypdfium2.PdfDocument(pdf if isinstance(pdf, bytes) else str(pdf))
+
+    @property
+    def page_count(self) -> int:
+        return len(self.document)
+
+    def page_text(self, number: int, mode: str) -> str:
+        page = self.document[number]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_bounded().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+            page.close()
+
+    def image_only(self) -> bool:
+        import pypdfium2.raw as pdfium_c
+
+        images = False
+        for number in range(self.page_count):
+            page = self.document[number]
+            textpage = page.get_textpage()
+            try:
+                if textpage.count_chars():
+                    return False
+                images = images or next(page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]), None) is not None
+            finally:
+                textpage.close()
+                page.close()
+        return images
+
+
+def content_draws(contents, resources, depth: int = 0) -> tuple[bool, bool]:
+    """(draws text, draws images) for a pypdf content stream and the form XObjects it uses."""
+    data = contents.get_data() if contents is not None else b""
+    if TEXT_OPERATOR.search(data):
+        return True, False
+    images = bool(INLINE_IMAGE.search(data))
+    resources = resources.get_object() if resources is not None else {}
+    xobjects = resources.get("/XObject")
+    for ref in (xobjects.get_object().values() if xobjects is not None else []):
+        xobject = ref.get_object()
+        if xobject.get("/Subtype") == "/Image":
+            images = True
+        elif xobject.get("/Subtype") == "/Form" and depth < FORM_DEPTH:
+            text, form_images = content_draws(xobject, xobject.get("/Resources"), depth + 1)
+            if text:
+                return True, images
+            images = images or form_images
+    return False, images
+
+
+BACKENDS: dict[str, type[PdfBackend]] = {backend.name: backend for backend in (PypdfBackend, PdfiumBackend)}
+
+
+def open_backend(pdf: Path | io.BytesIO | mmap.mmap, name: str = PDF_BACKEND) -> PdfBackend:
+    if name not in BACKENDS:
+        msg = f"Unknown PDF backend {name!r}, expected one of {sorted(BACKENDS)}"
+        raise ValueError(msg)
+    return BACKENDS[name](pdf)
+
+
+def page_pool() -> ProcessPoolExecutor:
+    """The shared extraction pool, started on first use. Workers are spawned rather than forked,
+    since the web app and the Gmail processor run other threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def extract_page(path: str, backend: str, mode: str, number: int) -> str:
+    """Runs in a pool worker: the text of page `number` of the PDF at `path`, read through a memory map.
+    The opened PDF is kept for the next page of the same file.
+    """
+    global _worker_pdf
+    if _worker_pdf is None or _worker_pdf[:2] != (path, backend):
+        with open(path, "rb") as f:
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _worker_pdf = (path, backend, view, open_backend(view, backend))
+    return _worker_pdf[3].page_text(number, mode)
+
+
+class PdfText:
+    """The text of a PDF, extracted one page at a time and only as far as it is read.
+
+    Opening the reader only parses the cross-reference table; a page's
+    content stream is decoded when its text is first asked for, so pages past
+    the point where a parser stops reading are never decoded. PDFs of at least
+    `parallel_threshold` pages are instead extracted a batch of pages at a
+    time across `page_pool`, each worker reading the same file through a
+    memory map; the text is the same as extracting the pages in order.
+    """
+
+    def __init__(
+        self, pdf: Path | io.BytesIO, mode: str = "plain", backend: str = PDF_BACKEND,
+        parallel_threshold: int = PARALLEL_PAGE_THRESHOLD,
+    ) -> None:
+        self.pdf = pdf
+        self.backend = open_backend(pdf, backend)
+        self.mode = mode
+        self.parallel = EXTRACTION_WORKERS > 1 and 0 < parallel_threshold <= self.page_count
+        self.pages: list[str] = []
+        self._path: Optional[str] = None
+
+    @property
+    def page_count(self) -> int:
+        return self.backend.page_count
+
+    @property
+    def pages_skipped(self) -> int:
+        return self.page_count - len(self.pages)
+
+    def __iter__(self) -> Iterator[str]:
+        """Yields the text of each page in order, extracting the ones not read yet."""
+        for number in range(self.page_count):
+            if number == len(self.pages):
+                self.pages.extend(self._extract(number))
+            yield self.pages[number]
+
+    def read_until(self, done: Optional[Callable[[list[str]], bool]] = None) -> str:
+        """Reads pages until `done(pages read so far)` is true or the PDF ends, and returns their text
+        joined the way `extract_text` joins every page.
+        """
+        for _ in self:
+            if done and done(self.pages):
+                break
+        return "\n".join(self.pages)
+
+    def _extract(self, start: int) -> list[str]:
+        """The text of page `start`, or of the batch of pages from `start` on when extracting in parallel."""
+        if self.parallel:
+            numbers = range(start, min(start + EXTRACTION_WORKERS * PAGES_PER_WORKER, self.page_count))
+            try:
+                return list(page_pool().map(
+                    extract_page, repeat(self._shared_path()), repeat(self.backend.name), repeat(self.mode), numbers,
+                ))
+            except BrokenProcessPool as e:
+                log.warning(f"Extraction pool failed, extracting pages in this process | {e}")
+                _reset_pool()
+                self.parallel = False
+        return [self.backend.page_text(start, self.mode)]
+
+    def _shared_path(self) -> str:
+        """A file the workers can map: the PDF's own path, or a temporary copy of in-memory bytes
+        that is removed along with this object.
+        """
+        if self._path is None:
+            if isinstance(self.pdf, io.BytesIO):
+                fd, path = tempfile.mkstemp(suffix=".pdf")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(self.pdf.getbuffer())
+                weakref.finalize(self, os.unlink, path)
+                self._path = path
+            else:
+                self._path = str(Path(self.pdf).resolve())
+        return self._path
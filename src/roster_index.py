@@ -0,0 +1,188 @@
+import functools
+import re
+import threading
+import weakref
+from collections import defaultdict
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+WORD = re.compile(r"\w+")
+# Fuzzy matches score the names with separators removed, so "bella-rose" and "bellarose" are equal
+FUZZY_CUTOFF = 85
+# A fuzzy match is only taken when it beats the runner-up by this much
+FUZZY_MARGIN = 5
+SOUNDEX = {
+    **dict.fromkeys("BFPV", "1"),
+    **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"),
+    "L": "4",
+    **dict.fromkeys("MN", "5"),
+    "R": "6",
+}
+
+_indexes: dict[tuple[int, type], tuple[weakref.ref, object]] = {}
+_lock = threading.Lock()
+
+
+class StayIndex:
+    """Answers "who was on shelter on date D" over a roster's stays.
+
+    Stays are sorted by start date, with a running maximum of their end dates
+    alongside. The stays that started by D form a prefix of the sorted starts,
+    and the running maximum rules out the part of that prefix where no stay
+    reaches D, so each query is two binary searches plus a scan of the window
+    between them. Rows with a missing start or end never match, as with the
+    boolean mask this replaces.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray) -> None:
+        starts = np.asarray(starts, dtype="datetime64[ns]")
+        ends = np.asarray(ends, dtype="datetime64[ns]")
+        valid = ~(np.isnat(starts) | np.isnat(ends))
+        rows = np.flatnonzero(valid)
+        order = np.argsort(starts[rows], kind="stable")
+        self._rows = rows[order]
+        self._starts = starts[self._rows].view("i8")
+        self._ends = ends[self._rows].view("i8")
+        self._max_end = np.maximum.accumulate(self._ends) if len(self._ends) else self._ends
+        self.size = len(starts)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, start_col: str = "DATEBROUGHTIN", end_col: str = "end_date") -> "StayIndex":
+        return cls(df[start_col].to_numpy(), df[end_col].to_numpy())
+
+    def on_shelter(self, date) -> np.ndarray:
+        """Positions (in the indexed frame's row order) of the stays with start <= date <= end."""
+        when = np.datetime64(pd.Timestamp(date), "ns").view("i8")
+        hi = np.searchsorted(self._starts, when, side="right")
+        lo = np.searchsorted(self._max_end[:hi], when, side="left")
+        window = slice(lo, hi)
+        return np.sort(self._rows[window][self._ends[window] >= when])
+
+
+def cached_index(df: pd.DataFrame, index_cls: type, build: Callable[[pd.DataFrame], object]):
+    """Returns the `index_cls` index of `df`, built on first use and kept while the frame is alive.
+    The roster frames are shared and read-only; don't use this on a frame that is modified afterwards.
+    """
+    key = (id(df), index_cls)
+    with _lock:
+        entry = _indexes.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    index = build(df)
+    ref = weakref.ref(df, lambda _, key=key: _indexes.pop(key, None))
+    with _lock:
+        _indexes[key] = (ref, index)
+    return index
+
+
+def stay_index(df: pd.DataFrame) -> StayIndex:
+    return cached_index(df, StayIndex, StayIndex.from_frame)
+
+
+def name_index(df: pd.DataFrame) -> "NameIndex":
+    return cached_index(df, NameIndex, lambda frame: NameIndex(frame["name"]))
+
+
+def on_shelter(df: pd.DataFrame, date) -> pd.DataFrame:
+    """The rows of `df` whose stay covers `date`, equivalent to
+    `df[(df["DATEBROUGHTIN"] <= date) & (df["end_date"] >= date)]`.
+    """
+    return df.iloc[stay_index(df).on_shelter(date)]
+
+
+@functools.lru_cache(maxsize=65536)
+def soundex(word: str) -> str:
+    """American Soundex code of the ASCII letters in `word`, e.g. "robert" -> "R163"."""
+    letters = [c for c in word.upper() if "A" <= c <= "Z"]
+    if not letters:
+        return ""
+    codes = [letters[0]]
+    last = SOUNDEX.get(letters[0], "")
+    for c in letters[1:]:
+        code = SOUNDEX.get(c, "")
+        if code and code != last:
+            codes.append(code)
+        # H and W don't separate equal codes; vowels do
+        if c not in "HW":
+            last = code
+    return "".join(codes)[:4].ljust(4, "0")
+
+
+def name_keys(name: str) -> set[str]:
+    """Blocking keys of a cleaned name: its words, the words run together with each single letter
+    deleted (so any one-letter typo shares a key with the name), and their Soundex codes.
+    """
+    words = WORD.findall(name)
+    joined = "".join(words)
+    keys = {f"w:{word}" for word in words}
+    keys.update(f"p:{soundex(part)}" for part in (*words, joined) if soundex(part))
+    if joined:
+        keys.add(f"j:{joined}")
+        keys.update(f"j:{joined[:i]}{joined[i + 1:]}" for i in range(len(joined)))
+    return keys
+
+
+class NameIndex:
+    """Blocking index over the roster's cleaned names.
+
+    Each name is filed under its words, its words run together ("bella rose"
+    -> "bellarose") with and without each single letter, and the Soundex
+    codes of both, so a lookup only touches
+    the handful of rows sharing a key with the query instead of matching a
+    regex against every name. Row positions are in the indexed frame's order.
+    """
+
+    def __init__(self, names: Iterable) -> None:
+        self.names = [name if isinstance(name, str) else "" for name in names]
+        self.joined = ["".join(WORD.findall(name)) for name in self.names]
+        keys = defaultdict(list)
+        for row, name in enumerate(self.names):
+            for key in name_keys(name):
+                keys[key].append(row)
+        self._keys = {key: np.array(rows, dtype=np.intp) for key, rows in keys.items()}
+        self._empty = np.array([], dtype=np.intp)
+
+    def _lookup(self, keys: Iterable[str]) -> np.ndarray:
+        found = [self._keys[key] for key in keys if key in self._keys]
+        if not found:
+            return self._empty
+        return found[0] if len(found) == 1 else np.unique(np.concatenate(found))
+
+    def rows_with_words(self, words: Iterable[str], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows whose name contains any of `words` as a whole word, i.e. matches `\\bw1\\b|\\bw2\\b...`,
+        limited to `rows` if given.
+        """
+        words = list(words)
+        plain = [word for word in words if WORD.fullmatch(word)]
+        found = self._lookup(f"w:{word}" for word in plain)
+        # Words with punctuation can't be looked up by \w+ word; search for them directly
+        others = [re.compile(rf"\b{re.escape(word)}\b") for word in words if word not in plain]
+        if others:
+            extra = [row for row, name in enumerate(self.names) if any(p.search(name) for p in others)]
+            found = np.union1d(found, np.array(extra, dtype=np.intp))
+        return restrict(found, rows)
+
+    def closest(self, name: str, rows: Optional[np.ndarray] = None, limit: int = 5, cutoff: float = FUZZY_CUTOFF) -> list[tuple[int, float]]:
+        """Rows sharing a blocking key with `name`, scored by fuzzy similarity, best first."""
+        candidates = restrict(self._lookup(name_keys(name)), rows)
+        if not len(candidates):
+            return []
+        choices = {row: self.joined[row] for row in candidates.tolist()}
+        matches = process.extract("".join(WORD.findall(name)), choices, scorer=fuzz.ratio, limit=limit, score_cutoff=cutoff)
+        return [(row, score) for _, score, row in matches]
+
+
+def restrict(found: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+    return found if rows is None else found[np.isin(found, rows)]
+
+
+def unique_closest(index: NameIndex, name: str, rows: Optional[np.ndarray] = None) -> Optional[int]:
+    """The row of the single clear fuzzy match for `name`, if there is one."""
+    best = index.closest(name, rows, limit=2)
+    if len(best) == 1 or (len(best) == 2 and best[0][1] - best[1][1] >= FUZZY_MARGIN):
+        return best[0][0]
+    return None
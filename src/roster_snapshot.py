@@ -0,0 +1,102 @@
+import contextlib
+import fcntl
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+log = logging.getLogger(__name__)
+
+VERSION_KEY = b"roster_version"
+WRITTEN_AT_KEY = b"written_at"
+FULL_SYNC_AT_KEY = b"full_sync_at"
+# Strings stay in the mapped Arrow buffers instead of becoming Python objects
+STRING_TYPES = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow"),
+}
+
+
+class Roster(NamedTuple):
+    animals: pd.DataFrame
+    version: str
+
+
+class RosterSnapshot:
+    """The prepared roster as an uncompressed Arrow (Feather v2) file on local disk.
+
+    One worker writes it; every worker memory-maps it read-only, so the string
+    data is shared through the page cache rather than held once per process.
+    Writes go to a temporary file that is renamed over the snapshot, so a
+    reader sees either the old or the new file, never a partial one. Each
+    `read` stats the file and re-maps it only when it has been replaced; the
+    roster version, write time and time of the last full download travel in
+    the file's schema metadata.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._roster: Optional[Roster] = None
+        self.written_at = 0.0
+        self.full_sync_at = 0.0
+        self._stamp: Optional[tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def write(self, animals: pd.DataFrame, version: str, full_sync_at: Optional[float] = None) -> None:
+        """Replaces the snapshot. `full_sync_at` defaults to now, i.e. `animals` is a complete download."""
+        now = time.time()
+        table = pa.Table.from_pandas(animals, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            VERSION_KEY: version.encode(),
+            WRITTEN_AT_KEY: str(now).encode(),
+            FULL_SYNC_AT_KEY: str(now if full_sync_at is None else full_sync_at).encode(),
+        })
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        # One uncompressed chunk per column keeps every column mappable as a single buffer
+        feather.write_feather(table, tmp, compression="uncompressed", chunksize=max(table.num_rows, 1))
+        os.replace(tmp, self.path)
+
+    def read(self, max_age: Optional[float] = None) -> Optional[Roster]:
+        """Returns the mapped roster, or None if there is no snapshot or it is older than `max_age` seconds."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    table = pa.ipc.open_file(pa.memory_map(str(self.path), "r")).read_all()
+                except (pa.ArrowInvalid, OSError) as e:
+                    log.warning(f"Ignoring unreadable roster snapshot {self.path}: {e}")
+                    return None
+                metadata = table.schema.metadata or {}
+                self._roster = Roster(
+                    table.to_pandas(types_mapper=STRING_TYPES.get),
+                    metadata.get(VERSION_KEY, b"").decode(),
+                )
+                self.written_at = float(metadata.get(WRITTEN_AT_KEY, b"0"))
+                self.full_sync_at = float(metadata.get(FULL_SYNC_AT_KEY, b"0"))
+                self._stamp = stamp
+            if max_age is not None and time.time() - self.written_at > max_age:
+                return None
+            return self._roster
+
+    @contextlib.contextmanager
+    def refresh_lock(self) -> Iterator[None]:
+        """Serializes refreshes across worker processes, so only one downloads the roster."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(f".{self.path.name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
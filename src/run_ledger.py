@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import sqlite3
+from datetime import datetime as dt
+from pathlib import Path
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+
+class Outcome:
+    COMPLETED = "completed"
+    INCOMPLETE = "incomplete"
+    UNPROCESSED = "unprocessed"
+    NEEDS_OCR = "needs_ocr"
+    DUPLICATE = "duplicate"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class RunLedger:
+    """Persistent record of every attachment the processor has already handled.
+
+    Attachments are looked up by (message id, filename) before their bodies are
+    fetched, and by content hash afterwards so the same PDF arriving in another
+    message is never uploaded twice. Filed invoices are also indexed by
+    (clinic abbreviation, invoice id, invoice date), which catches reprints
+    and forwarded copies whose bytes differ. Writes are only committed by `commit()`,
+    which the processor calls once the CSV reports for the run are written.
+    """
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = Path(db_path)
+        if str(db_path) != ":memory:":
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS attachments (
+                message_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                drive_file_id TEXT,
+                processed_at TEXT NOT NULL,
+                PRIMARY KEY (message_id, filename)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS attachments_hash ON attachments (content_hash)"
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS invoices (
+                clinic TEXT NOT NULL,
+                invoice_id TEXT NOT NULL,
+                invoice_date TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                drive_file_id TEXT,
+                recorded_at TEXT NOT NULL,
+                PRIMARY KEY (clinic, invoice_id, invoice_date)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def seen_attachment(self, message_id: str, filename: str) -> Optional[str]:
+        """Returns the recorded outcome for the attachment, or None if it is new."""
+        row = self.conn.execute(
+            "SELECT outcome FROM attachments WHERE message_id = ? AND filename = ?",
+            (message_id, filename),
+        ).fetchone()
+        return row[0] if row else None
+
+    def seen_content(self, digest: str) -> Optional[str]:
+        """Returns the Drive file id of an already uploaded copy of this content."""
+        row = self.conn.execute(
+            "SELECT drive_file_id FROM attachments WHERE content_hash = ? AND drive_file_id IS NOT NULL",
+            (digest,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def seen_invoice(self, clinic: str, invoice_id: str, invoice_date: str) -> Optional[str]:
+        """Returns the filename of the attachment this invoice was first filed from, or None if it is new."""
+        row = self.conn.execute(
+            "SELECT filename FROM invoices WHERE clinic = ? AND invoice_id = ? AND invoice_date = ?",
+            (clinic, invoice_id, invoice_date),
+        ).fetchone()
+        return row[0] if row else None
+
+    def invoice_outcome(self, clinic: str, invoice_id: str, invoice_date: str) -> Optional[str]:
+        """Returns the outcome of the attachment this invoice was first filed from, or None if it is new."""
+        row = self.conn.execute(
+            "SELECT a.outcome FROM invoices i JOIN attachments a"
+            " ON a.message_id = i.message_id AND a.filename = i.filename"
+            " WHERE i.clinic = ? AND i.invoice_id = ? AND i.invoice_date = ?",
+            (clinic, invoice_id, invoice_date),
+        ).fetchone()
+        return row[0] if row else None
+
+    def record_invoice(
+        self,
+        key: tuple[str, str, str],
+        digest: str,
+        message_id: str,
+        filename: str,
+        drive_file_id: Optional[str] = None,
+    ) -> None:
+        """Indexes a filed invoice by its (clinic, id, date) `key`; the first copy filed is kept."""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO invoices VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (*key, digest, message_id, filename, drive_file_id, dt.now().isoformat()),
+        )
+
+    def record(
+        self,
+        message_id: str,
+        filename: str,
+        digest: str,
+        outcome: str,
+        drive_file_id: Optional[str] = None,
+    ) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO attachments VALUES (?, ?, ?, ?, ?, ?)",
+            (message_id, filename, digest, outcome, drive_file_id, dt.now().isoformat()),
+        )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def rollback(self) -> None:
+        self.conn.rollback()
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,79 @@
+import functools
+import logging
+import threading
+
+import google_auth_httplib2
+import httplib2
+from cachetools import LRUCache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from constants.project import GOOGLE_HTTP_TIMEOUT, SERVICE_CACHE_SIZE
+
+log = logging.getLogger(__name__)
+
+_transports: LRUCache = LRUCache(maxsize=SERVICE_CACHE_SIZE)
+_services: LRUCache = LRUCache(maxsize=SERVICE_CACHE_SIZE)
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def discovery_document(api: str, version: str) -> str:
+    """Returns the discovery document bundled with google-api-python-client.
+
+    Read from disk once per process; nothing is fetched over the network.
+    """
+    doc = get_static_doc(api, version)
+    if doc is None:
+        msg = f"No bundled discovery document for {api} {version}"
+        raise ValueError(msg)
+    return doc
+
+
+def credential_key(creds) -> tuple:
+    """Identifies the account behind `creds`, so equal credentials rebuilt from
+    a session share one transport. Falls back to object identity.
+    """
+    account = (
+        getattr(creds, "refresh_token", None)
+        or getattr(creds, "service_account_email", None)
+        or id(creds)
+    )
+    # httplib2.Http is not thread-safe, so each thread gets its own transport
+    return (type(creds).__name__, getattr(creds, "client_id", None), account, threading.get_ident())
+
+
+def authorized_http(creds) -> google_auth_httplib2.AuthorizedHttp:
+    """Returns the cached authorized transport for `creds`, creating it on first use."""
+    key = credential_key(creds)
+    with _lock:
+        http = _transports.get(key)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+            _transports[key] = http
+    return http
+
+
+def build_service(api: str, version: str, creds):
+    """Offline equivalent of `googleapiclient.discovery.build` over a reused transport."""
+    return build_from_document(discovery_document(api, version), http=authorized_http(creds))
+
+
+def get_service(service_cls, creds):
+    """Returns a ready `service_cls` (e.g. GmailService, DriveService) for `creds`,
+    reusing the instance built for the same account earlier in this process.
+    """
+    key = (service_cls, credential_key(creds))
+    with _lock:
+        service = _services.get(key)
+    if service is None:
+        service = service_cls(creds)
+        with _lock:
+            _services[key] = service
+    return service
+
+
+def clear_caches() -> None:
+    with _lock:
+        _transports.clear()
+        _services.clear()
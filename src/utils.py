@@ -10,7 +10,6 @@ from constants.project import (
     DRIVE_INVOICES_FOLDER,
 )
 from constants.database import DB_LOGIN_DATA
-from animal_db_handler import get_all_animals
 
 log = logging.getLogger(__name__)
 
@@ -68,6 +67,8 @@ def get_email_dates_sender(headers, date_formats: list[str]) -> tuple[str, str]:
 class Folders(NamedTuple):
     invoice: str
     unprocessed: str
+    # Scanned PDFs with no text layer; falls back to `unprocessed` when unset
+    needs_ocr: str = ""
 
 class EmailLabels(NamedTuple):
     from_label: str
@@ -76,14 +77,18 @@ class EmailLabels(NamedTuple):
 
 
 def process_invoices(processor, days_ago: Optional[int] = None) -> bool:
+    from animal_db_handler import get_roster
+
     messages = prune_by_threadId(processor.gmail.get_messages(GMAIL_INVOICE_LABEL, days_ago))
     invoice_folder_id = processor.drive.get_or_create_folder(DRIVE_INVOICES_FOLDER)
     unproccessed_folder_id = processor.drive.get_or_create_folder(
             'unprocessed_invoices', invoice_folder_id
         )
-    folder_ids = Folders(invoice_folder_id, unproccessed_folder_id)
+    needs_ocr_folder_id = processor.drive.get_or_create_folder('needs_ocr_invoices', invoice_folder_id)
+    folder_ids = Folders(invoice_folder_id, unproccessed_folder_id, needs_ocr_folder_id)
     email_labels = EmailLabels(GMAIL_FROM_LABEL, GMAIL_TO_LABEL)
-    animals = get_all_animals(DB_LOGIN_DATA)
+    # The shared snapshot, kept current by delta syncs rather than a full download per run
+    animals = get_roster(DB_LOGIN_DATA).animals
     if not messages:
         log.info(f"No messages in folder! {GMAIL_INVOICE_LABEL} ")
         return "No messages in specified folder!", 404
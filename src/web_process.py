@@ -1,16 +1,67 @@
 import re
+import threading
 import pandas as pd
 from datetime import datetime as dt
 
+from cachetools import LRUCache
 from flask import Request, Response, render_template
 
-from animal_db_handler import get_probable_matches, upload_dataframe_to_database
+from animal_db_handler import Roster, add_invoices_col, get_probable_matches, match_animals_bulk, upload_dataframe_to_database
+from constants.project import MATCH_CACHE_SIZE
 from google_services import DriveService
+from parse_cache import ParseCache
 from utils import error_logger
 
+# What the retry page shows for a suggested animal
+MATCH_COLUMNS = ["SHELTERCODE", "ANIMALNAME", "date_in", "last_day_on_shelter"]
+
+_match_cache: LRUCache = LRUCache(maxsize=MATCH_CACHE_SIZE)
+_match_lock = threading.Lock()
+_match_version = ""
+
+
+def probable_matches(name: str, date, roster: Roster) -> list[dict]:
+    """`get_probable_matches` as JSON-ready records, memoized across requests.
+    Keyed by (cleaned name, date, roster version); a new roster version empties the cache.
+    The records are shared between requests; don't modify them.
+    """
+    global _match_version
+    date = None if date is None or pd.isna(date) else pd.Timestamp(date)
+    key = (re.sub(r"[?'\"]", "", name.lower()), date, roster.version)
+    with _match_lock:
+        if roster.version != _match_version:
+            _match_cache.clear()
+            _match_version = roster.version
+        cached = _match_cache.get(key)
+    if cached is not None:
+        return cached
+    matches = get_probable_matches(name, roster.animals, date)[MATCH_COLUMNS].astype(object)
+    records = matches.where(matches.notna(), None).to_dict(orient="records")
+    if roster.version:
+        with _match_lock:
+            if roster.version == _match_version:
+                _match_cache[key] = records
+    return records
+
+
+def restore_cached_failures(failed: pd.DataFrame, pdfs: pd.DataFrame, parse_cache: ParseCache) -> pd.DataFrame:
+    """Adds the unmatched charges of incomplete invoices that have no rows in the failures CSV.
+
+    They come from the parse cache, as parsed when the invoice was filed, so
+    they are rematched without downloading or reparsing the PDF.
+    """
+    restored = [parse_cache.load_failures(name) for name in pdfs["name"]] if not pdfs.empty else []
+    restored = [rows for rows in restored if rows is not None and not rows.empty]
+    if not restored:
+        return failed
+    rows = pd.concat(restored, ignore_index=True).assign(ANIMALCODE="ERROR_CODE")
+    rows, _ = add_invoices_col(rows, pdfs[["name"]].copy())
+    rows = rows[~rows["cmp"].isin(failed["cmp"])]
+    return pd.concat([failed, rows[failed.columns.intersection(rows.columns)]], ignore_index=True)
+
 
 def show_failed_invoices(
-    bad_invoice: pd.DataFrame, pdfs: pd.DataFrame, animals: pd.DataFrame,
+    bad_invoice: pd.DataFrame, pdfs: pd.DataFrame, roster: Roster,
 ) -> Response:
     # bad_invoice, pdfs = add_invoices_col(bad_invoice, pdfs)
     bad_invoice["date"] = pd.to_datetime(bad_invoice["COSTDATE"])
@@ -24,11 +75,10 @@ def show_failed_invoices(
 
     data = []
     for row in fails.itertuples():
-        likely_animals = get_probable_matches(row.name, animals, row.date)
-        data.append((row, likely_animals.to_dict(orient="records")))
+        data.append((row, probable_matches(row.name, row.date, roster)))
     return Response(
         render_template(
-            "get.html", data_to_show=data, animal_df=animals.to_json(orient="records"),
+            "get.html", data_to_show=data, animal_df=roster.animals.to_json(orient="records"),
         ),
         200,
     )
@@ -223,3 +273,29 @@ def process_invoice_corrections(
     return Response(render_template(
         "post.html", invoices=post_df.shape[0], rows=to_upload.shape[0],
     ))
+
+
+def rematch_failed_invoices(
+    drive: DriveService, parent_folder: str, failed, pdfs, animals,
+) -> Response:
+    """Re-matches every failed charge against the current roster in one pass.
+
+    Charges that now match a single animal are uploaded as corrections and the
+    rest are written back as the new failures CSV, the same way the manual
+    `/retry_failed` form does.
+    """
+    updated = match_animals_bulk(failed, animals)
+
+    good_condition = updated["ANIMALCODE"] != "ERROR_CODE"
+    to_upload = updated[good_condition]
+    to_fails = updated[~good_condition]
+    if to_upload.empty:
+        return Response(render_template("post.html", invoices=0, rows=0))
+
+    error, success = upload_corrected_files(drive, parent_folder, to_fails, to_upload)
+    if success:
+        cleanup_old_failed_invoice(drive, parent_folder, pdfs, to_upload, to_fails)
+
+    return Response(render_template(
+        "post.html", invoices=to_upload["cmp"].nunique(), rows=to_upload.shape[0],
+    ))
@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+
+def pdf_bytes(pages: list[str], image_pages: tuple[int, ...] = ()) -> bytes:
+    """A minimal PDF with one page of Courier text per item of `pages`; the pages numbered in
+    `image_pages` instead draw a (one pixel) scanned image and no text.
+    """
+    image = "<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray /BitsPerComponent 8 /Length 1 >>\nstream\n\x80\nendstream"
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", "", "<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>", image]
+    kids = []
+    for number, text in enumerate(pages):
+        lines = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in text.splitlines()]
+        stream = "BT /F1 9 Tf 11 TL 20 770 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        if number in image_pages:
+            stream = "q 612 0 0 792 0 0 cm /Im1 Do Q"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+            "/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 4 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+@pytest.fixture
+def make_pdf():
+    """Builds an in-memory PDF from the text of each page."""
+    return lambda pages, image_pages=(): io.BytesIO(pdf_bytes(pages, image_pages))
@@ -7,8 +7,10 @@ import json
 from google.oauth2.credentials import Credentials
 from unittest.mock import patch, MagicMock, mock_open
 from pathlib import Path
+from types import SimpleNamespace
 
 from googleauth import CredentialManager  # Replace with your actual module name
+from googleauth import CachingRequest, SecretManager, cache_max_age, service_account_email
 
 # Sample values
 SCOPES = ["https://www.googleapis.com/auth/drive"]
@@ -154,3 +156,111 @@ def test_create_web_flow(mock_flow, temp_oauth_config):
     flow = cm.create_web_flow(redirect_url=redirect, state="xyz")
     assert flow.redirect_uri == redirect
     mock_flow.assert_called_once()
+
+
+# --- SecretManager / verification caches ---
+
+
+class StubSecretStore:
+    """Local stand-in for SecretManagerServiceClient holding versioned pickled payloads."""
+
+    def __init__(self):
+        self.versions = {}
+        self.accesses = 0
+        self.metadata_reads = 0
+
+    def put(self, secret_path, value):
+        number = len(self.versions.get(secret_path, [])) + 1
+        self.versions.setdefault(secret_path, []).append(pickle.dumps(value))
+        return SimpleNamespace(name=f"{secret_path}/{number}")
+
+    def _resolve(self, name):
+        secret_path, version = name.rsplit("/", 1)
+        payloads = self.versions[secret_path]
+        number = len(payloads) if version == "latest" else int(version)
+        return secret_path, number, payloads[number - 1]
+
+    def get_secret_version(self, name):
+        self.metadata_reads += 1
+        secret_path, number, _ = self._resolve(name)
+        return SimpleNamespace(name=f"{secret_path}/{number}")
+
+    def access_secret_version(self, name):
+        self.accesses += 1
+        secret_path, number, payload = self._resolve(name)
+        return SimpleNamespace(name=f"{secret_path}/{number}", payload=SimpleNamespace(data=payload))
+
+
+SECRET_PATH = "projects/proj/secrets/creds/versions"
+
+
+@pytest.fixture
+def secret_store():
+    store = StubSecretStore()
+    store.put(SECRET_PATH, {"token": "first"})
+    return store
+
+
+def test_secret_is_served_from_memory_within_refresh_window(secret_store):
+    manager = SecretManager("proj", ["creds"], refresh_seconds=300, client=secret_store)
+    assert manager.retrieve_secret_from_file("creds", "sa.json") == {"token": "first"}
+    assert manager.retrieve_secret_from_file("creds", "sa.json") == {"token": "first"}
+    assert secret_store.accesses == 1
+    assert secret_store.metadata_reads == 0
+
+
+def test_secret_refreshes_only_when_latest_version_moves(secret_store):
+    manager = SecretManager("proj", ["creds"], refresh_seconds=0, client=secret_store)
+    manager.retrieve_secret_from_file("creds", "sa.json")
+    manager.retrieve_secret_from_file("creds", "sa.json")
+    assert secret_store.accesses == 1
+    assert secret_store.metadata_reads == 1
+
+    secret_store.put(SECRET_PATH, {"token": "second"})
+    assert manager.retrieve_secret_from_file("creds", "sa.json") == {"token": "second"}
+    assert secret_store.accesses == 2
+
+
+def test_pinned_secret_version_is_read_once(secret_store):
+    secret_store.put(SECRET_PATH, {"token": "second"})
+    manager = SecretManager("proj", ["creds"], refresh_seconds=0, client=secret_store)
+    assert manager.retrieve_secret_from_file("creds", "sa.json", version="1") == {"token": "first"}
+    assert manager.retrieve_secret_from_file("creds", "sa.json", version="1") == {"token": "first"}
+    assert secret_store.accesses == 1
+    assert secret_store.metadata_reads == 0
+
+
+def test_service_account_email_is_read_once(tmp_path):
+    key_file = tmp_path / "sa.json"
+    key_file.write_text(json.dumps({"client_email": "scheduler@proj.iam.gserviceaccount.com"}))
+    assert service_account_email(str(key_file)) == "scheduler@proj.iam.gserviceaccount.com"
+    key_file.unlink()
+    assert service_account_email(str(key_file)) == "scheduler@proj.iam.gserviceaccount.com"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("public, max-age=19845, must-revalidate, no-transform", 19845),
+    ("no-cache, max-age=60", 0),
+    ("private", 0),
+    ("max-age=bogus", 0),
+])
+def test_cache_max_age(header, expected):
+    assert cache_max_age({"Cache-Control": header}) == expected
+
+
+def test_caching_request_honours_max_age():
+    responses = [
+        SimpleNamespace(status=200, headers={"cache-control": "public, max-age=3600"}, data=b"certs-1"),
+        SimpleNamespace(status=200, headers={"cache-control": "no-store"}, data=b"other"),
+    ]
+    inner = MagicMock(side_effect=responses)
+    request = CachingRequest(inner)
+    certs_url = "https://www.googleapis.com/oauth2/v1/certs"
+    assert request(certs_url).data == b"certs-1"
+    assert request(certs_url).data == b"certs-1"
+    assert request("https://example.com/uncacheable").data == b"other"
+    assert inner.call_count == 2
+
+    request.cache[certs_url] = (0, request.cache[certs_url][1])
+    inner.side_effect = [SimpleNamespace(status=200, headers={}, data=b"certs-2")]
+    assert request(certs_url).data == b"certs-2"
@@ -0,0 +1,110 @@
+import io
+import tarfile
+from concurrent.futures import Future
+
+import pandas as pd
+import pytest
+
+from animal_db_handler import read_roster_csv
+import batch
+from batch import CHARGES_FILE, NEEDS_OCR, UNPROCESSED, BatchResult, collect, main, run_batch
+from conftest import pdf_bytes
+from parsers.classify import DocumentKind
+from parsers import pdf_text
+from parsers.invoices import VCAParser, WaipioParser
+from roster_snapshot import RosterSnapshot
+from test_line_grammar import FIXTURES
+
+ROSTER = (
+    "ID,ANIMALNAME,SHELTERCODE,DATEBROUGHTIN,TOTALDAYSONSHELTER\n"
+    "1,Mochi,D2024001,01/02/2024,120\n"
+    "2,Koa Bear,D2024002,02/03/2024,90\n"
+)
+RECORDS = "MEDICAL RECORD - Patient history\nWeight 24.3 kg, temperature normal, vaccination status reviewed.\n"
+ARCHIVE = {
+    "2024/waipio.pdf": pdf_bytes([FIXTURES[WaipioParser], RECORDS]),
+    # Nalu isn't on the roster
+    "2024/vca.pdf": pdf_bytes([FIXTURES[VCAParser]]),
+    "scans/invoice.pdf": pdf_bytes([""], image_pages=(0,)),
+    "estimate.pdf": pdf_bytes(["Kaneohe Animal Hospital\nEstimate for Nalu\n" + RECORDS]),
+    "other.pdf": pdf_bytes(["Kailua Animal Clinic   Invoice 5521\n" + RECORDS]),
+    "broken.pdf": b"%PDF-1.4 not really",
+    "notes.txt": b"not a pdf",
+}
+OUTCOMES = {
+    "WPC_completed": 1,
+    "VCA_incomplete": 1,
+    NEEDS_OCR: 1,
+    DocumentKind.NON_INVOICE: 1,
+    UNPROCESSED: 2,
+}
+
+
+@pytest.fixture
+def roster_file(tmp_path):
+    path = tmp_path / "roster.arrow"
+    RosterSnapshot(path).write(read_roster_csv(ROSTER), "v1")
+    return path
+
+
+def check_output(out):
+    assert sorted(p.relative_to(out).as_posix() for p in out.rglob("*.pdf")) == [
+        "VCA_incomplete/VCA_99120_2024-01-09.pdf",
+        "WPC_completed/WPC_48213_2024-03-05.pdf",
+        "needs_ocr/scans_invoice.pdf",
+        "unprocessed/broken.pdf",
+        "unprocessed/other.pdf",
+    ]
+    charges = pd.read_csv(out / CHARGES_FILE)
+    codes = charges.groupby("ANIMALNAME")["ANIMALCODE"].first()
+    assert codes.to_dict() == {"Koa Bear": "D2024002", "Mochi": "D2024001", "Nalu": "ERROR_CODE"}
+
+
+def test_directory_batch_files_every_pdf(tmp_path, roster_file):
+    archive = tmp_path / "archive"
+    for name, data in ARCHIVE.items():
+        (archive / name).parent.mkdir(parents=True, exist_ok=True)
+        (archive / name).write_bytes(data)
+
+    workers = pdf_text.EXTRACTION_WORKERS
+    outcomes = run_batch(archive, tmp_path / "out", roster_file)
+    assert outcomes == OUTCOMES
+    check_output(tmp_path / "out")
+    assert pdf_text.EXTRACTION_WORKERS == workers
+
+
+def test_tarball_batch_across_workers(tmp_path, roster_file):
+    archive = tmp_path / "archive.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        for name, data in ARCHIVE.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    assert main([str(archive), "--out", str(tmp_path / "out"), "--roster", str(roster_file), "--workers", "2"]) == 0
+    check_output(tmp_path / "out")
+
+
+def test_missing_roster_snapshot_is_an_error(tmp_path):
+    assert main([str(tmp_path), "--roster", str(tmp_path / "missing.arrow")]) == 2
+
+
+def test_charges_parsed_before_a_crash_are_kept(tmp_path, roster_file, monkeypatch):
+    charges = pd.DataFrame({"ANIMALNAME": ["Mochi"], "ANIMALCODE": ["D2024001"], "COSTAMOUNT": [65.0]})
+
+    def crashing(archive, settings, workers):
+        yield BatchResult("first.pdf", "WPC_completed", "WPC_1_2024-01-01.pdf", charges)
+        raise RuntimeError("pool died")
+
+    monkeypatch.setattr(batch, "parse_all", crashing)
+    with pytest.raises(RuntimeError):
+        run_batch(tmp_path, tmp_path / "out", roster_file)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "out" / CHARGES_FILE), charges)
+
+
+def test_failed_worker_is_filed_unprocessed(tmp_path):
+    future = Future()
+    future.set_exception(MemoryError("worker killed"))
+    result = collect(future, "2024/big.pdf", b"%PDF-1.4", tmp_path)
+    assert (result.outcome, result.reason) == (UNPROCESSED, "worker killed")
+    assert (tmp_path / UNPROCESSED / "2024_big.pdf").read_bytes() == b"%PDF-1.4"
@@ -0,0 +1,76 @@
+import pytest
+
+from parsers.classify import RECORD_PAGE_COUNT, DocumentKind, classify_document
+from parsers.pdf_text import PdfText
+from test_line_grammar import FIXTURES
+
+RECORDS = """Kaneohe Animal Hospital
+Patient: Nalu    Owner: Furangel Rescue
+Weight 24.3 kg, temperature normal. Vaccination status reviewed.
+"""
+STATEMENT = """Waipio Pet Clinic
+Account Statement                       Period: 03-01-24 to 03-31-24
+03-02-24   Invoice 48213                                        171.25
+03-20-24   Payment received                                    -171.25
+"""
+ESTIMATE = """VCA Kaneohe Animal Hospital
+ESTIMATE for Nalu (#40021)
+    Dental cleaning with extractions, anesthesia and monitoring   $950.00
+"""
+
+
+def classify(make_pdf, pages, image_pages=()):
+    document = PdfText(make_pdf(pages, image_pages))
+    return classify_document(document), document
+
+
+@pytest.mark.parametrize("cls", list(FIXTURES))
+def test_clinic_invoices_are_invoices(make_pdf, cls):
+    decision, document = classify(make_pdf, [FIXTURES[cls], RECORDS, RECORDS])
+    assert decision.kind == DocumentKind.INVOICE
+    # Only the first page is read, and kept for get_parser
+    assert len(document.pages) == 1
+
+
+@pytest.mark.parametrize("pages", [[STATEMENT], [ESTIMATE, FIXTURES[next(iter(FIXTURES))]]])
+def test_non_invoice_titles_are_rejected(make_pdf, pages):
+    decision, _ = classify(make_pdf, pages)
+    assert decision.kind == DocumentKind.NON_INVOICE
+    assert "in the header" in decision.reason
+
+
+def test_invoice_keyword_in_header_wins_over_title(make_pdf):
+    decision, _ = classify(make_pdf, ["Invoice: 123 (replaces estimate 99)\n" + RECORDS])
+    assert decision.kind == DocumentKind.INVOICE
+
+
+def test_long_documents_without_invoice_keyword_are_records(make_pdf):
+    assert classify(make_pdf, [RECORDS] * 2)[0].kind == DocumentKind.INVOICE
+    decision, document = classify(make_pdf, [RECORDS] * RECORD_PAGE_COUNT)
+    assert decision.kind == DocumentKind.NON_INVOICE
+    assert len(document.pages) == 1
+
+
+def test_pages_without_text_are_image_only(make_pdf):
+    decision, _ = classify(make_pdf, ["", "scan"])
+    assert decision == (DocumentKind.IMAGE_ONLY, "0 characters of text on the first page")
+
+
+def test_scans_are_detected_without_extracting_text(make_pdf):
+    decision, document = classify(make_pdf, ["", "", ""], image_pages=(0, 1, 2))
+    assert decision == (DocumentKind.IMAGE_ONLY, "scanned: images and no text operators")
+    assert document.pages == []
+
+
+@pytest.mark.parametrize("backend", ["pypdf", "pdfium"])
+def test_image_only_needs_images_and_no_text_anywhere(make_pdf, backend):
+    if backend == "pdfium":
+        pytest.importorskip("pypdfium2")
+
+    def image_only(pages, image_pages):
+        return PdfText(make_pdf(pages, image_pages), backend=backend).backend.image_only()
+
+    assert image_only(["", ""], (0, 1))
+    # A scanned cover on a text invoice still has text to extract
+    assert not image_only(["", FIXTURES[next(iter(FIXTURES))]], (0,))
+    assert not image_only([RECORDS], ())
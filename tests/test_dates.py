@@ -0,0 +1,67 @@
+import random
+from datetime import datetime as dt
+from pathlib import Path
+
+import pytest
+
+from parsers.dates import DateParser, parse_m_d_yyyy, parse_mm_dd_yy
+from parsers.invoices import DATE_FORMATS, WaipioParser
+
+
+def strptime_loop(text, formats=DATE_FORMATS):
+    for format in formats:
+        try:
+            return dt.strptime(text, format)
+        except ValueError:
+            continue
+    return None
+
+
+def random_date_strings(count, seed=1):
+    rng = random.Random(seed)
+    pieces = ["0", "1", "2", "3", "9", "12", "13", "31", "00", "02", "29", "68", "69", "99", "2024", "1999", "024", "٣"]
+    for _ in range(count):
+        sep = rng.choice(["-", "/", "-", ".", " "])
+        yield sep.join(rng.choice(pieces) for _ in range(rng.choice([2, 3, 3, 3, 4])))
+
+
+def test_matches_strptime_loop():
+    parser = DateParser(DATE_FORMATS)
+    strings = [*random_date_strings(20_000), "02-29-24", "02-29-23", "1/9/2024", "01/09/2024", "03-02-2024", ""]
+    for text in strings:
+        assert parser.parse(text) == strptime_loop(text), text
+    assert any(strptime_loop(text) for text in strings)
+
+
+@pytest.mark.parametrize(("text", "expected"), [
+    ("03-02-24", dt(2024, 3, 2)),
+    ("12-31-69", dt(1969, 12, 31)),
+    ("01-01-68", dt(2068, 1, 1)),
+    ("3-02-24", None),
+    ("03/02/24", None),
+])
+def test_mm_dd_yy(text, expected):
+    assert parse_mm_dd_yy(text) == expected
+
+
+def test_m_d_yyyy_rejects_other_shapes_and_bad_dates():
+    assert parse_m_d_yyyy("1/9/2024") == dt(2024, 1, 9)
+    assert parse_m_d_yyyy("1/9/24") is None
+    with pytest.raises(ValueError):
+        parse_m_d_yyyy("2/30/2024")
+
+
+def test_learns_format_and_memoizes(monkeypatch):
+    parser = DateParser(DATE_FORMATS)
+    assert parser.parse("03-02-2024") == dt(2024, 3, 2)
+    assert parser.formats[0] == "%m-%d-%Y"
+    monkeypatch.setattr(parser, "formats", [])
+    assert parser.parse("03-02-2024") == dt(2024, 3, 2)
+
+
+def test_invoice_parser_reports_unparseable_dates():
+    parser = WaipioParser("", Path("invoice.pdf"), is_drive=True)
+    assert parser.parse_charge_date("1/9/2024") == dt(2024, 1, 9)
+    assert parser.date_parser() is parser.date_parser(list(DATE_FORMATS))
+    with pytest.raises(ValueError, match="Couldn't parse"):
+        parser.parse_charge_date("12/31/23")
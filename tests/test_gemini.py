@@ -0,0 +1,209 @@
+import json
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from constants.dates import DATE_M_D_Y
+from parsers.gemini import GeminiExtractor, RateLimiter, validate_records
+from parsers.invoices import AIParser, classify_charges, get_description, parse_ai_invoices
+
+CANNED_RECORDS = [
+    {"clinic": "Kailua Animal Clinic", "invoiceNumber": "5521", "date": "03/02/2024", "dogName": "Mochi",
+     "description": "office exam", "quantity": 1, "totalPrice": 65.00},
+    {"clinic": "Kailua Animal Clinic", "invoiceNumber": "5521", "date": "03/02/2024", "dogName": "Mochi",
+     "description": "dhpp vaccine", "quantity": 1, "totalPrice": 32.50},
+    {"clinic": "Kailua Animal Clinic", "invoiceNumber": "5521", "date": "03/02/2024", "dogName": "Mochi",
+     "description": "apoquel 16mg", "quantity": 30, "totalPrice": 48.10},
+]
+
+
+class StubModels:
+    """Local stand-in for `genai.Client().models` returning canned responses."""
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.calls = []
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        return SimpleNamespace(text=self.responder(contents, config))
+
+
+def stub_client(responder):
+    return SimpleNamespace(models=StubModels(responder))
+
+
+def batch_responder(contents, config):
+    numbers = [int(line.split()[-1]) for line in contents.splitlines() if line.strip().startswith("### Invoice")]
+    return json.dumps([
+        {"invoice": n, "items": [{"clinic": "Stub Clinic", "invoiceNumber": str(n), "date": "01/05/2024",
+                                  "dogName": f"Dog {n}", "description": "Office Exam", "quantity": 1, "totalPrice": 50.0}]}
+        for n in numbers
+    ])
+
+
+@pytest.fixture
+def records_client():
+    return stub_client(lambda contents, config: json.dumps([{"invoice": 0, "items": CANNED_RECORDS}]))
+
+
+def test_extract_records_caches_responses(records_client, tmp_path):
+    extractor = GeminiExtractor(client=records_client, cache_dir=tmp_path, requests_per_minute=0)
+    assert extractor.extract_records("invoice text") == CANNED_RECORDS
+    assert extractor.extract_records("invoice text") == CANNED_RECORDS
+    assert len(records_client.models.calls) == 1
+
+    # A fresh extractor (new process) reads the on-disk cache
+    other = GeminiExtractor(client=records_client, cache_dir=tmp_path, requests_per_minute=0)
+    assert other.extract_records("invoice text") == CANNED_RECORDS
+    assert len(records_client.models.calls) == 1
+
+
+def test_extract_many_chunks_and_preserves_order():
+    client = stub_client(batch_responder)
+    extractor = GeminiExtractor(client=client, cache_dir=None, requests_per_minute=0, max_workers=4)
+    texts = [f"text {i}" for i in range(7)]
+    results = extractor.extract_many(texts, batch_size=3)
+    assert len(client.models.calls) == 3
+    assert len(results) == 7
+    # Each chunk numbers its invoices from zero
+    assert [r[0]["dogName"] for r in results] == ["Dog 0", "Dog 1", "Dog 2", "Dog 0", "Dog 1", "Dog 2", "Dog 0"]
+
+
+def test_extract_many_reports_failures_as_none():
+    def responder(contents, config):
+        if "bad" in contents:
+            raise RuntimeError("quota")
+        return batch_responder(contents, config)
+
+    extractor = GeminiExtractor(client=stub_client(responder), cache_dir=None, requests_per_minute=0)
+    results = extractor.extract_many(["good", "bad"], batch_size=1)
+    assert results[0][0]["dogName"] == "Dog 0"
+    assert results[1] is None
+
+
+def test_extract_batch_uses_one_structured_request(tmp_path):
+    client = stub_client(batch_responder)
+    extractor = GeminiExtractor(client=client, cache_dir=tmp_path, requests_per_minute=0)
+    records = extractor.extract_batch(["first", "second", "third"])
+    assert len(client.models.calls) == 1
+    assert client.models.calls[0]["config"]["response_mime_type"] == "application/json"
+    assert [r[0]["dogName"] for r in records] == ["Dog 0", "Dog 1", "Dog 2"]
+
+    # Cached invoices are not resent; only the new one goes out
+    records = extractor.extract_batch(["second", "fourth"])
+    assert len(client.models.calls) == 2
+    assert "second" not in client.models.calls[1]["contents"]
+    assert records[0][0]["dogName"] == "Dog 1"
+    assert records[1][0]["dogName"] == "Dog 0"
+
+
+def test_extract_batch_leaves_omitted_invoices_uncached(tmp_path):
+    def drop_second(contents, config):
+        entries = json.loads(batch_responder(contents, config))
+        return json.dumps([entry for entry in entries if entry["invoice"] != 1])
+
+    client = stub_client(drop_second)
+    extractor = GeminiExtractor(client=client, cache_dir=tmp_path, requests_per_minute=0)
+    records = extractor.extract_batch(["first", "second", "third"])
+    assert records[1] is None
+    assert [r[0]["dogName"] for r in (records[0], records[2])] == ["Dog 0", "Dog 2"]
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+    # Only the omitted invoice is resent, and an empty response caches nothing
+    client.models.responder = lambda contents, config: ""
+    assert extractor.extract_batch(["first", "second", "third"])[1] is None
+    assert "second" in client.models.calls[1]["contents"]
+    assert "first" not in client.models.calls[1]["contents"]
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_rate_limiter_blocks_over_limit():
+    limiter = RateLimiter(requests_per_minute=2, period=0.2)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.wait()
+    assert time.monotonic() - start >= 0.19
+
+
+def test_validate_records_drops_bad_rows():
+    records = CANNED_RECORDS + [
+        {"clinic": "Kailua Animal Clinic", "invoiceNumber": "5521", "date": "not a date", "dogName": "Mochi",
+         "description": "Nail trim", "totalPrice": 10},
+        {"clinic": "Kailua Animal Clinic", "invoiceNumber": "5521", "date": "03/02/2024", "dogName": "Mochi",
+         "description": "", "totalPrice": 0},
+        {"clinic": "Kailua Animal Clinic", "dogName": "Mochi", "description": "missing fields"},
+        "not a record",
+    ]
+    df = validate_records(records)
+    assert df.shape[0] == 3
+    assert df["totalPrice"].dtype == float
+    assert df["date"].dtype.kind == "M"
+
+
+def test_classify_charges_matches_get_description():
+    df = validate_records(CANNED_RECORDS * 3)
+    expected = []
+    for row in df.itertuples():
+        charges = {
+            "COSTDATE": row.date.strftime(DATE_M_D_Y),
+            "COSTDESCRIPTION": f"[{row.clinic} - {row.invoiceNumber} - {row.date.date()}] ",
+            "COSTAMOUNT": row.totalPrice,
+            "ANIMALNAME": row.dogName,
+        }
+        expected.append(get_description(row.description, charges, row.date))
+    expected = pd.DataFrame(expected)
+
+    charges = pd.DataFrame({
+        "COSTDATE": expected["COSTDATE"],
+        "COSTDESCRIPTION": [d[:d.index("] ") + 2] for d in expected["COSTDESCRIPTION"]],
+        "COSTAMOUNT": df["totalPrice"],
+        "ANIMALNAME": df["dogName"],
+        "description": df["description"],
+        "date": df["date"],
+    })
+    result = classify_charges(charges)
+    pd.testing.assert_frame_equal(
+        result[expected.columns].fillna(""), expected.fillna(""), check_dtype=False,
+    )
+
+
+def test_ai_parser_uses_shared_extractor(records_client):
+    parser = AIParser("Kailua Animal Clinic invoice", Path("unknown.pdf"), is_drive=True)
+    parser.extractor = GeminiExtractor(client=records_client, cache_dir=None, requests_per_minute=0)
+    parser.parse_invoice()
+    assert parser.clinic_abrv == "KAC"
+    assert parser.items.shape[0] == 3
+    assert parser.items["COSTTYPE"].tolist() == ["Examination", "Vaccination", "Medication"]
+    assert parser.items["VACCINATIONTYPE"].iloc[1] == "DHPP"
+    assert parser.items["MEDICALDOSAGE"].iloc[2] == "16mg"
+    assert parser.name == "KAC_5521_2024-03-02.pdf"
+
+
+def test_ai_parser_raises_when_nothing_extracted():
+    parser = AIParser("unreadable", Path("unknown.pdf"), is_drive=True)
+    with pytest.raises(Exception, match="Gemini failed"):
+        parser.parse_invoice(records=[])
+
+
+def test_ai_parser_never_sends_empty_text(records_client):
+    parser = AIParser(" \n ", Path("scan.pdf"), is_drive=True)
+    parser.extractor = GeminiExtractor(client=records_client, cache_dir=None, requests_per_minute=0)
+    with pytest.raises(ValueError, match="needs OCR"):
+        parser.parse_invoice()
+    assert not records_client.models.calls
+
+
+def test_parse_ai_invoices_classifies_a_whole_queue():
+    second = [dict(r, invoiceNumber="5600", dogName="Koa", date="04/11/2024") for r in CANNED_RECORDS[:2]]
+    parsers = [AIParser(f"text {n}", Path("unknown.pdf"), is_drive=True) for n in range(3)]
+    parse_ai_invoices(parsers, [CANNED_RECORDS, second, None])
+    assert parsers[0].items.shape[0] == 3
+    assert parsers[1].items["ANIMALNAME"].tolist() == ["Koa", "Koa"]
+    assert parsers[1].name == "KAC_5600_2024-04-11.pdf"
+    assert parsers[0].parsed and parsers[1].parsed
+    # A failed extraction leaves its parser to raise on parse_invoice
+    assert not parsers[2].parsed
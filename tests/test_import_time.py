@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+# Generous enough for a slow CI runner; a regression to eager imports is ~3x this
+IMPORT_BUDGET_US = 1_200_000
+DEFERRED = [
+    "pandas",
+    "numpy",
+    "pypdf",
+    "pyarrow",
+    "google.genai",
+    "fuzzywuzzy",
+    "googleapiclient",
+    "google.cloud.secretmanager",
+]
+
+
+def import_main(tmp_path) -> dict[str, int]:
+    """Imports main in a fresh interpreter and returns cumulative import times in microseconds."""
+    auth_file = tmp_path / "auth.json"
+    auth_file.write_text(json.dumps({"web": {}}))
+    env = {**os.environ, "AUTH_FILE": str(auth_file)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_main_defers_heavy_imports(tmp_path):
+    times = import_main(tmp_path)
+    assert "main" in times
+    eager = [module for module in DEFERRED if module in times]
+    assert not eager, f"Imported at startup: {eager}"
+
+
+def test_main_import_time_budget(tmp_path):
+    times = import_main(tmp_path)
+    assert times["main"] < IMPORT_BUDGET_US, f"import main took {times['main'] / 1e6:.2f}s"
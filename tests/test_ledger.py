@@ -0,0 +1,61 @@
+import pytest
+
+from run_ledger import RunLedger, Outcome, content_hash
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    yield ledger
+    ledger.close()
+
+
+def test_new_attachment_is_unseen(ledger):
+    assert ledger.seen_attachment("msg1", "invoice.pdf") is None
+    assert ledger.seen_content(content_hash(b"data")) is None
+
+
+def test_record_and_lookup(ledger):
+    digest = content_hash(b"pdf bytes")
+    ledger.record("msg1", "invoice.pdf", digest, Outcome.INCOMPLETE, "drive_1")
+    assert ledger.seen_attachment("msg1", "invoice.pdf") == Outcome.INCOMPLETE
+    assert ledger.seen_content(digest) == "drive_1"
+    assert ledger.seen_attachment("msg2", "invoice.pdf") is None
+
+
+def test_uncommitted_records_are_discarded(tmp_path):
+    path = tmp_path / "ledger.sqlite3"
+    ledger = RunLedger(path)
+    ledger.record("msg1", "invoice.pdf", content_hash(b"a"), Outcome.COMPLETED, "drive_1")
+    ledger.rollback()
+    ledger.close()
+
+    reopened = RunLedger(path)
+    assert reopened.seen_attachment("msg1", "invoice.pdf") is None
+    reopened.close()
+
+
+def test_committed_records_persist(tmp_path):
+    path = tmp_path / "ledger.sqlite3"
+    ledger = RunLedger(path)
+    ledger.record("msg1", "invoice.pdf", content_hash(b"a"), Outcome.COMPLETED, "drive_1")
+    ledger.commit()
+    ledger.close()
+
+    reopened = RunLedger(path)
+    assert reopened.seen_attachment("msg1", "invoice.pdf") == Outcome.COMPLETED
+    reopened.close()
+
+
+def test_invoices_are_indexed_by_clinic_id_and_date(ledger):
+    key = ("VCA", "99120", "2024-01-09")
+    assert ledger.seen_invoice(*key) is None
+    ledger.record_invoice(key, content_hash(b"original"), "msg1", "invoice.pdf", "drive_1")
+    # A reprint filed later doesn't replace the first copy
+    ledger.record_invoice(key, content_hash(b"reprint"), "msg2", "reprint.pdf", "drive_2")
+    assert ledger.seen_invoice(*key) == "invoice.pdf"
+    assert ledger.seen_invoice("VCA", "99120", "2024-01-10") is None
+    assert ledger.seen_invoice("WPC", "99120", "2024-01-09") is None
+    assert ledger.invoice_outcome(*key) is None
+    ledger.record("msg1", "invoice.pdf", content_hash(b"original"), Outcome.COMPLETED, "drive_1")
+    assert ledger.invoice_outcome(*key) == Outcome.COMPLETED
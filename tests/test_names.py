@@ -0,0 +1,90 @@
+import re
+
+import pandas as pd
+import pytest
+
+import animal_db_handler
+from animal_db_handler import Roster, get_roster
+from features import name_generator
+from roster_snapshot import RosterSnapshot
+from features.name_generator import clean_and_split_names, extract_extra_names, get_unique_animal_names
+
+ROSTER_CSV = (
+    '"ANIMALNAME","SHELTERCODE","DATEBROUGHTIN","TOTALDAYSONSHELTER"\n'
+    '"Mochi-Bear","S1","01/02/2024","10"\n'
+    '"Koa ""K’s"" Jr.","S2","02/03/2024","5"\n'
+)
+
+
+def legacy_clean_and_split_names(series: pd.Series) -> pd.Series:
+    cleaned_series = series.astype(str).str.lower()
+    cleaned_series = cleaned_series.apply(lambda x: re.sub(r"[^\w\s-]", " ", x))
+    cleaned_series = cleaned_series.apply(lambda x: re.sub(r"[‘’“”]", " ", x))
+    cleaned_series = cleaned_series.str.replace(r"[',\"]", " ", regex=True)
+    cleaned_series = cleaned_series.str.replace("-", " ", regex=False)
+    cleaned_series = cleaned_series.str.strip().str.replace(r"\s+", " ", regex=True)
+    return cleaned_series.str.split()
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(monkeypatch, tmp_path):
+    monkeypatch.setattr(animal_db_handler, "_snapshot", RosterSnapshot(tmp_path / "roster.arrow"))
+    name_generator._disjoint_cache.clear()
+    yield
+    name_generator._disjoint_cache.clear()
+
+
+def test_single_pass_cleaning_matches_legacy():
+    series = pd.Series([
+        "Mochi-Bear", "  Koa  \"K’s\" Jr. ", "Bella, Rose", "Lani (2)", "R2_D2", "“Luna”",
+        "Nala—Kai", "", "Éclair",
+    ])
+    assert clean_and_split_names(series).tolist() == legacy_clean_and_split_names(series).tolist()
+
+
+def test_extract_extra_names_does_not_mutate_input():
+    df = pd.DataFrame({"name": ["mochi bear", "koa"]})
+    words = extract_extra_names(df, "name")
+    assert words["name"].tolist() == ["mochi", "bear", "koa"]
+    assert df["name"].tolist() == ["mochi bear", "koa"]
+
+
+def test_get_roster_downloads_once_and_versions_by_content(monkeypatch):
+    downloads = []
+
+    def fake_download(login_data, *args):
+        downloads.append(login_data)
+        return ROSTER_CSV
+
+    monkeypatch.setattr(animal_db_handler, "download_roster_csv", fake_download)
+    login = {"database": "db", "username": "u", "password": "p"}
+    first = get_roster(login)
+    second = get_roster(login)
+    assert second is first
+    assert len(downloads) == 1
+    assert sorted(first.animals["SHELTERCODE"]) == ["S1", "S2"]
+
+    monkeypatch.setattr(animal_db_handler, "ROSTER_TTL_SECONDS", -1)
+    assert get_roster(login).version == first.version
+    assert len(downloads) == 2
+
+
+def test_unique_names_memoized_per_roster_version(monkeypatch, tmp_path):
+    names_file = tmp_path / "names.txt"
+    names_file.write_text("Mochi Female\nBear\nLuna Female\nKoa Male\nZiggy Male\n")
+    monkeypatch.setattr(name_generator, "ANIMALS_NAME_FILE", str(names_file))
+    roster = Roster(pd.DataFrame({"name": ["mochi-bear", "koa"]}), "v1")
+    monkeypatch.setattr(name_generator, "get_roster", lambda: roster)
+
+    calls = []
+    original = name_generator.animal_name_words
+    monkeypatch.setattr(name_generator, "animal_name_words", lambda df: calls.append(1) or original(df))
+
+    first = get_unique_animal_names()
+    assert first["name"].tolist() == ["Luna", "Ziggy"]
+    assert get_unique_animal_names() is first
+    assert len(calls) == 1
+
+    roster = Roster(pd.DataFrame({"name": ["luna"]}), "v2")
+    assert get_unique_animal_names()["name"].tolist() == ["Mochi", "Bear", "Koa", "Ziggy"]
+    assert len(calls) == 2
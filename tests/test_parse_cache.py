@@ -0,0 +1,106 @@
+from datetime import datetime as dt
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from parse_cache import ParseCache, parser_fingerprint
+from parsers.invoices import InvoiceParser
+
+
+class CountingParser(InvoiceParser):
+    clinic = "Test Clinic"
+    clinic_abrv = "TC"
+    calls = 0
+
+    def parse_invoice(self) -> None:
+        type(self).calls += 1
+        self.id = "1001"
+        self.invoiced_date = dt(2024, 3, 2)
+        self.items = pd.DataFrame([
+            {"COSTDATE": "03/02/2024", "COSTDESCRIPTION": "[Test Clinic - 1001 - 2024-03-02] exam",
+             "COSTAMOUNT": 65.0, "ANIMALNAME": "Mochi", "COSTTYPE": "Examination", "VACCINATIONTYPE": None},
+            {"COSTDATE": "03/02/2024", "COSTDESCRIPTION": "[Test Clinic - 1001 - 2024-03-02] dhpp",
+             "COSTAMOUNT": 32.5, "ANIMALNAME": "Mochi", "COSTTYPE": "Vaccination", "VACCINATIONTYPE": "DHPP"},
+        ])
+        self.name = f"{self.clinic_abrv}_{self.id}_{self.invoiced_date.date()}.pdf"
+
+
+class OtherPatternParser(CountingParser):
+    invoice_pattern = r"Inv #\s*(\d+)"
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    CountingParser.calls = 0
+
+
+def make_parser(text="invoice text", cls=CountingParser):
+    return cls(text, Path("2024-03-02_sender_invoice.pdf"), is_drive=True)
+
+
+def test_second_parse_is_a_cache_hit(tmp_path):
+    cache = ParseCache(tmp_path)
+    first = make_parser()
+    assert cache.parse(first) is False
+
+    second = make_parser()
+    assert cache.parse(second) is True
+    assert CountingParser.calls == 1
+    assert second.name == "TC_1001_2024-03-02.pdf"
+    assert second.id == "1001"
+    assert second.invoiced_date.date() == dt(2024, 3, 2).date()
+    pd.testing.assert_frame_equal(second.items, first.items)
+
+
+def test_key_depends_on_text_and_parser_fingerprint(tmp_path):
+    cache = ParseCache(tmp_path)
+    cache.parse(make_parser())
+    assert cache.load(make_parser("different text")) is False
+    assert cache.load(make_parser(cls=OtherPatternParser)) is False
+    assert parser_fingerprint(CountingParser) != parser_fingerprint(OtherPatternParser)
+
+
+def test_failed_parse_is_not_cached(tmp_path):
+    class BrokenParser(CountingParser):
+        def parse_invoice(self) -> None:
+            raise ValueError("No Dog Names!")
+
+    cache = ParseCache(tmp_path)
+    with pytest.raises(ValueError):
+        cache.parse(make_parser(cls=BrokenParser))
+    assert not list(tmp_path.iterdir())
+
+
+def test_corrupt_entry_is_treated_as_a_miss(tmp_path):
+    cache = ParseCache(tmp_path)
+    parser = make_parser()
+    cache.parse(parser)
+    next(tmp_path.glob("*.parquet")).write_bytes(b"not parquet")
+    assert cache.parse(make_parser()) is False
+    assert CountingParser.calls == 2
+
+
+def test_failures_of_filed_invoices_are_restored_without_the_pdf(tmp_path):
+    from web_process import restore_cached_failures
+
+    cache = ParseCache(tmp_path)
+    parser = make_parser()
+    cache.parse(parser)
+    # Only the vaccine failed to match when the invoice was filed
+    cache.record_failures("TC_1001_2024-03-02.pdf", parser, pd.Index([1]))
+    assert cache.load_failures("missing.pdf") is None
+    assert cache.load_failures("TC_1001_2024-03-02.pdf")["COSTTYPE"].tolist() == ["Vaccination"]
+
+    csv_row = {"COSTDATE": "01/05/2024", "COSTDESCRIPTION": "[Other - 77 - 2024-01-05] exam", "COSTAMOUNT": 50.0,
+               "ANIMALNAME": "Koa", "COSTTYPE": "Examination", "VACCINATIONTYPE": None, "ANIMALCODE": "ERROR_CODE",
+               "invoice": "77", "invoice_date": "2024-01-05", "cmp": "77_2024-01-05"}
+    failed = pd.DataFrame([csv_row])
+    pdfs = pd.DataFrame({"name": ["OT_77_2024-01-05.pdf", "TC_1001_2024-03-02.pdf"]})
+    restored = restore_cached_failures(failed, pdfs, cache)
+    assert restored["cmp"].tolist() == ["77_2024-01-05", "1001_2024-03-02"]
+    assert restored.iloc[1]["COSTTYPE"] == "Vaccination"
+    assert restored.iloc[1]["ANIMALCODE"] == "ERROR_CODE"
+
+    # Invoices that still have rows in the failures CSV aren't duplicated
+    assert len(restore_cached_failures(restored, pdfs, cache)) == 2
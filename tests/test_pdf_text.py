@@ -0,0 +1,133 @@
+import gc
+import os
+
+import pandas as pd
+import pytest
+
+from google_services import Statistics
+from parsers import pdf_text
+from parsers.invoices import AIParser, VCAParser, WaipioParser, get_parser
+from parsers.pdf_text import PdfText, PypdfBackend, open_backend
+from test_line_grammar import FIXTURES
+
+RECORDS = """MEDICAL RECORD - Patient history
+Vaccination status reviewed, owner counselled.
+Weight 24.3 kg, temperature normal.
+"""
+VCA_SECOND_PATIENT = """VCA Kaneohe Animal Hospital    Invoice: 99120 | Date: 1/9/2024
+ Koa (#40022)
+    Date         Description                                    Qty      Total
+    1/9/2024     Comprehensive Physical Exam                    1.00     $78.50
+  Subtotal:                                                              $78.50
+"""
+
+
+def parsed(parser):
+    parser.parse_invoice()
+    return parser.items
+
+
+def test_pages_are_extracted_only_as_far_as_read(make_pdf):
+    text = PdfText(make_pdf(["one", "two", "three"]))
+    assert next(iter(text)).strip() == "one"
+    assert (len(text.pages), text.pages_skipped) == (1, 2)
+    assert text.read_until().split() == ["one", "two", "three"]
+    assert text.pages_skipped == 0
+
+
+def test_trailing_record_pages_are_never_decoded(make_pdf):
+    pdf = make_pdf([FIXTURES[WaipioParser], RECORDS, RECORDS, RECORDS])
+    parser = get_parser(pdf, "invoice.pdf", is_drive=True)
+
+    assert isinstance(parser, WaipioParser)
+    # The invoice page plus one page of lookahead
+    assert (parser.pages_total, parser.pages_read) == (4, 2)
+    alone = get_parser(make_pdf([FIXTURES[WaipioParser]]), "invoice.pdf", is_drive=True)
+    pd.testing.assert_frame_equal(parsed(parser), parsed(alone))
+
+
+def test_section_after_a_page_break_is_kept(make_pdf):
+    pdf = make_pdf([FIXTURES[VCAParser], VCA_SECOND_PATIENT, RECORDS, RECORDS])
+    parser = get_parser(pdf, "invoice.pdf", is_drive=True)
+
+    assert isinstance(parser, VCAParser)
+    assert (parser.pages_total, parser.pages_read) == (4, 3)
+    assert parsed(parser)["ANIMALNAME"].drop_duplicates().tolist() == ["Nalu", "Koa"]
+
+
+def test_unclosed_section_and_unknown_clinic_read_every_page(make_pdf):
+    unclosed = FIXTURES[VCAParser].replace("Subtotal:", "Balance:")
+    parser = get_parser(make_pdf([unclosed, RECORDS, RECORDS]), "invoice.pdf", is_drive=True)
+    assert (parser.pages_total, parser.pages_read) == (3, 3)
+
+    parser = get_parser(make_pdf([RECORDS, "Some Other Clinic", RECORDS]), "invoice.pdf", is_drive=True)
+    assert isinstance(parser, AIParser)
+    assert parser.pages_read == 3
+    assert "Some Other Clinic" in parser.text
+
+
+def test_statistics_report_skipped_pages(make_pdf):
+    stats = Statistics(1)
+    stats.record_pages(get_parser(make_pdf([FIXTURES[WaipioParser], *[RECORDS] * 4]), "a.pdf", is_drive=True))
+    stats.record_pages(get_parser(make_pdf([FIXTURES[VCAParser]]), "b.pdf", is_drive=True))
+
+    assert (stats.pages_total, stats.pages_read) == (6, 3)
+    assert "PDF Pages Skipped (after the charges)</strong>: 3 of 6" in stats.summary()
+
+
+def test_clinic_text_comes_from_its_backend_and_mode(make_pdf, monkeypatch):
+    reads = []
+
+    class RecordingBackend(PypdfBackend):
+        name = "recording"
+
+        def page_text(self, number, mode):
+            reads.append((number, mode))
+            return super().page_text(number, mode)
+
+    monkeypatch.setitem(pdf_text.BACKENDS, "recording", RecordingBackend)
+    monkeypatch.setattr(WaipioParser, "pdf_backend", "recording")
+    parser = get_parser(make_pdf([FIXTURES[WaipioParser], RECORDS, RECORDS]), "invoice.pdf", is_drive=True)
+
+    assert reads == [(0, "layout"), (1, "layout")]
+    assert not parsed(parser).empty
+    reads.clear()
+    get_parser(make_pdf([FIXTURES[VCAParser]]), "invoice.pdf", is_drive=True, backend="recording")
+    assert reads == [(0, "plain")]
+
+
+def test_unknown_backend_is_rejected(make_pdf):
+    with pytest.raises(ValueError, match="Unknown PDF backend"):
+        open_backend(make_pdf(["one"]), "ghostscript")
+
+
+def test_pdfium_backend_reads_the_same_words(make_pdf):
+    pytest.importorskip("pypdfium2")
+    pages = [FIXTURES[VCAParser], RECORDS]
+    pdfium = PdfText(make_pdf(pages), backend="pdfium").read_until()
+    assert pdfium.split() == PdfText(make_pdf(pages)).read_until().split()
+
+
+@pytest.mark.parametrize("mode", ["plain", "layout"])
+def test_parallel_extraction_matches_sequential(make_pdf, monkeypatch, mode):
+    monkeypatch.setattr(pdf_text, "EXTRACTION_WORKERS", 2)
+    pages = [*FIXTURES.values(), RECORDS] * 3
+
+    sequential = PdfText(make_pdf(pages), mode, parallel_threshold=0)
+    parallel = PdfText(make_pdf(pages), mode, parallel_threshold=len(pages))
+    assert parallel.parallel and not sequential.parallel
+    assert parallel.read_until() == sequential.read_until()
+    assert parallel.pages == sequential.pages
+
+
+def test_parallel_extraction_reads_one_batch_at_a_time(make_pdf, monkeypatch):
+    monkeypatch.setattr(pdf_text, "EXTRACTION_WORKERS", 2)
+    text = PdfText(make_pdf([RECORDS] * 10), parallel_threshold=10)
+
+    text.read_until(lambda pages: True)
+    assert len(text.pages) == 2 * pdf_text.PAGES_PER_WORKER
+    path = text._shared_path()
+    assert os.path.exists(path)
+    del text
+    gc.collect()
+    assert not os.path.exists(path)
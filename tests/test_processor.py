@@ -4,6 +4,7 @@ import pandas as pd
 from datetime import datetime as dt, timedelta as td
 from unittest.mock import patch, Mock, ANY
 from google_services import Processor
+from parsers.classify import Classification, DocumentKind
 from utils import Folders, EmailLabels
 
 
@@ -26,6 +27,7 @@ def mock_folders():
     mock_f = Mock()
     mock_f.invoice = 'invoice_folder_id'
     mock_f.unprocessed = 'unprocessed_folder_id'
+    mock_f.needs_ocr = 'needs_ocr_folder_id'
     return mock_f # Return a mock object if it's typically accessed by attribute
 
 @pytest.fixture
@@ -46,6 +48,8 @@ def mock_animals_df():
 @patch('google_services.GMAIL_DATE_ZONE', new='%Y/%m/%d %Z')
 @patch('google_services.upload_dataframe_to_database', return_value=True)
 @patch('google_services.match_animals')
+@patch('google_services.PdfText', new=Mock())
+@patch('google_services.classify_document', new=Mock(return_value=Classification(DocumentKind.INVOICE, "test")))
 @patch('google_services.get_parser') # This is the mock for the get_parser *function*
 @patch('google_services.get_email_dates_sender', return_value=('sender@example.com', '2023-01-01'))
 @patch('google_services.DriveService')
@@ -124,6 +128,8 @@ def test_processor_process_invoices_mocks(
     })
     mock_parser_instance_return.drive_completed = 'CompletedFolder'
     mock_parser_instance_return.drive_incomplete = 'IncompleteFolder'
+    mock_parser_instance_return.pages_total = 3
+    mock_parser_instance_return.pages_read = 2
 
     mock_get_parser.return_value = mock_parser_instance_return
 
@@ -209,3 +215,284 @@ def test_processor_process_invoices_mocks(
     mock_upload_dataframe_to_database.assert_called_once_with(ANY)
     mock_gmail_instance.send_email_summary.assert_called_once_with(ANY, 'user@example.com')
     assert result is True
+
+
+@patch('google_services.NON_INVOICE_REGEXES', new=r'ignore_this')
+@patch('google_services.get_email_dates_sender', return_value=('sender@example.com', '2023-01-01'))
+@patch('google_services.match_animals')
+@patch('google_services.get_parser')
+@patch('google_services.DriveService')
+@patch('google_services.GmailService')
+def test_processor_skips_ledger_entries(
+    mock_gmail_service_class,
+    mock_drive_service_class,
+    mock_get_parser,
+    mock_match_animals,
+    mock_get_email_dates_sender,
+    mock_creds,
+    mock_animals_df,
+    mock_folders,
+    mock_email_labels,
+    tmp_path,
+):
+    from run_ledger import RunLedger, Outcome, content_hash
+    from google_services import Statistics
+
+    mock_gmail_instance = mock_gmail_service_class.return_value
+    mock_gmail_instance.get_message.return_value = {
+        "payload": {
+            "headers": [],
+            "parts": [
+                {"filename": "seen.pdf", "body": {"attachmentId": "att_1"}, "mimeType": "application/pdf"},
+                {"filename": "copy.pdf", "body": {"attachmentId": "att_2"}, "mimeType": "application/pdf"},
+            ],
+        }
+    }
+    mock_gmail_instance.get_attachment.return_value = io.BytesIO(b"already uploaded")
+
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    ledger.record("msg_id", "2023-01-01_sender@example.com_seen.pdf", "x", Outcome.INCOMPLETE, "drive_a")
+    ledger.record("other_msg", "other.pdf", content_hash(b"already uploaded"), Outcome.COMPLETED, "drive_b")
+
+    processor = Processor(mock_creds, ledger=ledger)
+    stats = Statistics(emails_count=1)
+    processor.process_message(
+        message={"id": "msg_id"},
+        stats=stats,
+        folder_ids=mock_folders,
+        labels=mock_email_labels,
+        animals=mock_animals_df,
+        batch_gmail=Mock(),
+    )
+
+    # The known attachment is never fetched; the identical copy is fetched but not re-uploaded
+    mock_gmail_instance.get_attachment.assert_called_once_with("msg_id", "att_2")
+    mock_get_parser.assert_not_called()
+    mock_drive_service_class.return_value.upload_file.assert_not_called()
+    assert len(stats.already_processed) == 2
+    assert ledger.seen_attachment("msg_id", "2023-01-01_sender@example.com_copy.pdf") == Outcome.DUPLICATE
+    ledger.close()
+
+
+@patch('google_services.NON_INVOICE_REGEXES', new=r'ignore_this')
+@patch('google_services.get_email_dates_sender', return_value=('sender@example.com', '2023-01-01'))
+@patch('google_services.get_parser')
+@patch('google_services.DriveService')
+@patch('google_services.GmailService')
+def test_processor_prefilters_by_first_page(
+    mock_gmail_service_class,
+    mock_drive_service_class,
+    mock_get_parser,
+    mock_get_email_dates_sender,
+    mock_creds,
+    mock_animals_df,
+    mock_folders,
+    mock_email_labels,
+    make_pdf,
+):
+    from google_services import Statistics
+
+    mock_gmail_instance = mock_gmail_service_class.return_value
+    mock_gmail_instance.get_message.return_value = {
+        "payload": {
+            "headers": [],
+            "parts": [
+                {"filename": "scan.pdf", "body": {"attachmentId": "scan"}, "mimeType": "application/pdf"},
+                {"filename": "invoice.pdf", "body": {"attachmentId": "estimate"}, "mimeType": "application/pdf"},
+            ],
+        }
+    }
+    pdfs = {
+        "scan": make_pdf(["", ""], image_pages=(0, 1)),
+        "estimate": make_pdf(["VCA Kaneohe Animal Hospital\nTreatment Plan for Nalu\n" + "Dental cleaning $950.00\n" * 3]),
+    }
+    mock_gmail_instance.get_attachment.side_effect = lambda msg_id, att_id: pdfs[att_id]
+
+    processor = Processor(mock_creds)
+    stats = Statistics(emails_count=1)
+    processor.process_message(
+        message={"id": "msg_id"},
+        stats=stats,
+        folder_ids=mock_folders,
+        labels=mock_email_labels,
+        animals=mock_animals_df,
+        batch_gmail=Mock(),
+    )
+
+    mock_get_parser.assert_not_called()
+    # The scan goes to the needs-OCR folder for a person; the treatment plan is dropped as a non-invoice
+    mock_drive_service_class.return_value.upload_file.assert_called_once_with(
+        name='2023-01-01_sender@example.com_scan.pdf', data=ANY, parents=['needs_ocr_folder_id'], mime_type='application/pdf'
+    )
+    assert stats.needs_ocr == ['2023-01-01_sender@example.com_scan.pdf']
+    assert stats.non_invoices == ['2023-01-01_sender@example.com_invoice.pdf']
+    assert [kind for _, kind, _ in stats.prefiltered] == [DocumentKind.IMAGE_ONLY, DocumentKind.NON_INVOICE]
+    assert stats.prefiltered_pages == 3
+    assert "Prefiltered by First Page</strong>: 2 PDFs, 3 pages" in stats.summary()
+    assert "Needs OCR (scanned, no text)</strong>: 1" in stats.summary()
+
+
+@patch('google_services.NON_INVOICE_REGEXES', new=r'ignore_this')
+@patch('google_services.get_email_dates_sender', return_value=('sender@example.com', '2023-01-01'))
+@patch('google_services.match_animals')
+@patch('google_services.DriveService')
+@patch('google_services.GmailService')
+def test_processor_skips_reprinted_invoices(
+    mock_gmail_service_class,
+    mock_drive_service_class,
+    mock_match_animals,
+    mock_get_email_dates_sender,
+    mock_creds,
+    mock_animals_df,
+    mock_folders,
+    mock_email_labels,
+    make_pdf,
+    tmp_path,
+):
+    from google_services import Statistics
+    from parsers.invoices import WaipioParser
+    from run_ledger import RunLedger, Outcome
+    from test_line_grammar import FIXTURES
+
+    mock_gmail_instance = mock_gmail_service_class.return_value
+    # The same invoice mailed twice: the reprint has the records page attached, so its bytes differ
+    pdfs = {
+        "original": make_pdf([FIXTURES[WaipioParser]]),
+        "reprint": make_pdf([FIXTURES[WaipioParser], "MEDICAL RECORD - Patient history\n"]),
+    }
+    mock_gmail_instance.get_attachment.side_effect = lambda msg_id, att_id: pdfs[att_id]
+    mock_match_animals.side_effect = lambda items, animals: items.assign(ANIMALCODE="A1")
+    mock_drive_service_class.return_value.upload_file.return_value = "drive_1"
+
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    processor = Processor(mock_creds, ledger=ledger)
+    stats = Statistics(emails_count=2)
+    batch_gmail = Mock()
+    for msg_id in pdfs:
+        mock_gmail_instance.get_message.return_value = {
+            "payload": {
+                "headers": [],
+                "parts": [{"filename": f"{msg_id}.pdf", "body": {"attachmentId": msg_id}, "mimeType": "application/pdf"}],
+            }
+        }
+        processor.process_message(
+            message={"id": msg_id},
+            stats=stats,
+            folder_ids=mock_folders,
+            labels=mock_email_labels,
+            animals=mock_animals_df,
+            batch_gmail=batch_gmail,
+        )
+
+    # Only the first copy is matched and uploaded
+    assert mock_match_animals.call_count == 1
+    mock_drive_service_class.return_value.upload_file.assert_called_once()
+    assert stats.duplicate_invoices == ['2023-01-01_sender@example.com_reprint.pdf']
+    assert ledger.seen_attachment("reprint", '2023-01-01_sender@example.com_reprint.pdf') == Outcome.DUPLICATE
+    assert ledger.seen_invoice("WPC", "48213", "2024-03-05") == '2023-01-01_sender@example.com_original.pdf'
+    # The original was complete, so the reprint's email leaves the inbox label with it
+    moved = [call.kwargs["msg_id"] for call in mock_gmail_instance.move_message.call_args_list]
+    assert moved == ["original", "reprint"]
+    assert batch_gmail.add.call_count == 2
+    ledger.close()
+
+
+@patch('google_services.NON_INVOICE_REGEXES', new=r'ignore_this')
+@patch('google_services.get_email_dates_sender', return_value=('sender@example.com', '2023-01-01'))
+@patch('google_services.match_animals')
+@patch('google_services.DriveService')
+@patch('google_services.GmailService')
+def test_processor_retries_failed_uploads(
+    mock_gmail_service_class,
+    mock_drive_service_class,
+    mock_match_animals,
+    mock_get_email_dates_sender,
+    mock_creds,
+    mock_animals_df,
+    mock_folders,
+    mock_email_labels,
+    make_pdf,
+    tmp_path,
+):
+    from google_services import Statistics
+    from parsers.invoices import WaipioParser
+    from run_ledger import RunLedger, Outcome
+    from test_line_grammar import FIXTURES
+
+    mock_gmail_instance = mock_gmail_service_class.return_value
+    mock_gmail_instance.get_message.return_value = {
+        "payload": {
+            "headers": [],
+            "parts": [{"filename": "invoice.pdf", "body": {"attachmentId": "att"}, "mimeType": "application/pdf"}],
+        }
+    }
+    mock_gmail_instance.get_attachment.side_effect = lambda msg_id, att_id: make_pdf([FIXTURES[WaipioParser]])
+    mock_match_animals.side_effect = lambda items, animals: items.assign(ANIMALCODE="A1")
+    upload = mock_drive_service_class.return_value.upload_file
+    filename = '2023-01-01_sender@example.com_invoice.pdf'
+
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    processor = Processor(mock_creds, ledger=ledger)
+    # upload_file logs Drive errors and returns None
+    upload.return_value = None
+    batch_gmail = Mock()
+    processor.process_message({"id": "msg"}, Statistics(1), mock_folders, mock_email_labels, mock_animals_df, batch_gmail)
+    assert ledger.seen_attachment("msg", filename) is None
+    assert ledger.seen_invoice("WPC", "48213", "2024-03-05") is None
+    batch_gmail.add.assert_not_called()
+
+    upload.return_value = "drive_1"
+    processor.process_message({"id": "msg"}, Statistics(1), mock_folders, mock_email_labels, mock_animals_df, batch_gmail)
+    assert ledger.seen_attachment("msg", filename) == Outcome.COMPLETED
+    batch_gmail.add.assert_called_once()
+    ledger.close()
+
+
+@patch('google_services.NON_INVOICE_REGEXES', new=r'ignore_this')
+@patch('google_services.get_email_dates_sender', return_value=('sender@example.com', '2023-01-01'))
+@patch('google_services.match_animals')
+@patch('google_services.DriveService')
+@patch('google_services.GmailService')
+def test_processor_duplicates_follow_the_filed_copy(
+    mock_gmail_service_class,
+    mock_drive_service_class,
+    mock_match_animals,
+    mock_get_email_dates_sender,
+    mock_creds,
+    mock_animals_df,
+    mock_folders,
+    mock_email_labels,
+    make_pdf,
+    tmp_path,
+):
+    from google_services import Statistics
+    from parsers.invoices import WaipioParser
+    from run_ledger import RunLedger, Outcome
+    from test_line_grammar import FIXTURES
+
+    mock_gmail_instance = mock_gmail_service_class.return_value
+    mock_gmail_instance.get_attachment.side_effect = lambda msg_id, att_id: make_pdf([FIXTURES[WaipioParser], att_id])
+    # Nothing matches, so the filed copy is incomplete
+    mock_match_animals.side_effect = lambda items, animals: items.assign(ANIMALCODE="ERROR_CODE")
+    # The first upload fails
+    mock_drive_service_class.return_value.upload_file.side_effect = [None, "drive_2"]
+
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    processor = Processor(mock_creds, ledger=ledger)
+    stats = Statistics(emails_count=3)
+    for msg_id in ["failed", "filed", "forward"]:
+        mock_gmail_instance.get_message.return_value = {
+            "payload": {
+                "headers": [],
+                "parts": [{"filename": f"{msg_id}.pdf", "body": {"attachmentId": msg_id}, "mimeType": "application/pdf"}],
+            }
+        }
+        processor.process_message({"id": msg_id}, stats, mock_folders, mock_email_labels, mock_animals_df, Mock())
+
+    # The failed upload isn't indexed, so the next copy is filed rather than skipped
+    assert ledger.seen_invoice("WPC", "48213", "2024-03-05") == '2023-01-01_sender@example.com_filed.pdf'
+    assert ledger.invoice_outcome("WPC", "48213", "2024-03-05") == Outcome.INCOMPLETE
+    assert stats.duplicate_invoices == ['2023-01-01_sender@example.com_forward.pdf']
+    # An incomplete original stays in the inbox label, and so does its duplicate
+    mock_gmail_instance.move_message.assert_not_called()
+    ledger.close()
@@ -0,0 +1,119 @@
+import random
+import time
+from datetime import datetime as dt, timedelta as td
+
+import pandas as pd
+
+import web_process
+from animal_db_handler import Roster, add_failure_matching_columns, get_likely_animal, get_probable_matches, match_animals_bulk
+
+NAMES = ["mochi", "koa", "lani", "bella rose", "rose", "max", "luna", "kai", "nala", "mochi bear"]
+
+
+def make_roster(size: int, seed: int = 3) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(size):
+        start = dt(2023, 1, 1) + td(days=rng.randint(0, 500))
+        name = rng.choice(NAMES)
+        rows.append({
+            "ANIMALNAME": name.title(),
+            "SHELTERCODE": f"S{i:05d}",
+            "name": name,
+            "DATEBROUGHTIN": start,
+            "end_date": start + td(days=rng.randint(5, 120)),
+        })
+    return pd.DataFrame(rows)
+
+
+def make_failures(roster: pd.DataFrame, size: int, seed: int = 5) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(size):
+        animal = roster.iloc[rng.randrange(len(roster))]
+        date = animal["DATEBROUGHTIN"] + td(days=rng.randint(0, 4))
+        name = rng.choice([animal["ANIMALNAME"], animal["name"].split()[0].upper(), "Mochi?", "Unknown Dog"])
+        rows.append({
+            "COSTDATE": date.strftime("%m/%d/%Y"),
+            "ANIMALNAME": name,
+            "ANIMALCODE": "ERROR_CODE",
+            "COSTAMOUNT": 10.0 + i,
+            "cmp": f"{1000 + i}_{date.date()}",
+        })
+    return pd.DataFrame(rows)
+
+
+def test_bulk_rematch_agrees_with_get_likely_animal():
+    roster = make_roster(60)
+    failures = make_failures(roster, 300)
+    result = match_animals_bulk(failures, roster)
+
+    for row, matched in zip(failures.itertuples(), result.itertuples()):
+        expected = get_likely_animal(row.ANIMALNAME, pd.Timestamp(row.COSTDATE), roster)
+        assert (matched.ANIMALNAME, matched.ANIMALCODE) == (expected["ANIMALNAME"], expected["SHELTERCODE"])
+    assert (result["ANIMALCODE"] != "ERROR_CODE").any()
+    assert (result["ANIMALCODE"] == "ERROR_CODE").any()
+    # Untouched columns and row order are preserved
+    assert result["COSTAMOUNT"].tolist() == failures["COSTAMOUNT"].tolist()
+
+
+def test_bulk_rematch_handles_thousands_of_rows_quickly():
+    roster = make_roster(5000)
+    failures = make_failures(roster, 5000)
+    start = time.perf_counter()
+    result = match_animals_bulk(failures, roster)
+    assert time.perf_counter() - start < 5
+    assert result.shape[0] == failures.shape[0]
+
+
+def test_bulk_rematch_with_empty_roster_keeps_failures():
+    failures = make_failures(make_roster(5), 3)
+    result = match_animals_bulk(failures, pd.DataFrame())
+    assert (result["ANIMALCODE"] == "ERROR_CODE").all()
+
+
+def test_probable_matches_memoized_per_roster_version(monkeypatch):
+    roster = Roster(add_failure_matching_columns(make_roster(200)), "v1")
+    calls = []
+
+    def counting_matches(*args):
+        calls.append(args)
+        return get_probable_matches(*args)
+
+    monkeypatch.setattr(web_process, "get_probable_matches", counting_matches)
+    date = roster.animals["DATEBROUGHTIN"].iloc[0]
+    first = web_process.probable_matches("Mochi?", date, roster)
+    assert web_process.probable_matches("mochi", date, roster) is first
+    assert len(calls) == 1
+    assert set(first[0]) == set(web_process.MATCH_COLUMNS)
+    assert first == get_probable_matches("mochi", roster.animals, date)[web_process.MATCH_COLUMNS].to_dict(orient="records")
+
+    # The JSON endpoint passes the date as a string
+    assert web_process.probable_matches("mochi", date.strftime("%Y-%m-%d"), roster) is first
+    web_process.probable_matches("mochi", None, roster)
+    assert len(calls) == 2
+
+    web_process.probable_matches("mochi", date, Roster(roster.animals, "v2"))
+    assert len(calls) == 3
+    assert len(web_process._match_cache) == 1
+
+
+def test_bulk_rematch_takes_clear_fuzzy_matches_like_get_likely_animal():
+    roster = make_roster(60)
+    failures = make_failures(roster, 40)
+    failures["ANIMALNAME"] = ["Bellarose", "Mochie", "Lanni", "Nalla"] * 10
+    result = match_animals_bulk(failures, roster)
+    for row, matched in zip(failures.itertuples(), result.itertuples()):
+        expected = get_likely_animal(row.ANIMALNAME, pd.Timestamp(row.COSTDATE), roster)
+        assert (matched.ANIMALNAME, matched.ANIMALCODE) == (expected["ANIMALNAME"], expected["SHELTERCODE"])
+    assert (result["ANIMALCODE"] != "ERROR_CODE").any()
+
+
+def test_names_with_regex_characters_are_matched_literally():
+    roster = Roster(add_failure_matching_columns(make_roster(50)), "v1")
+    date = roster.animals["DATEBROUGHTIN"].iloc[0]
+    # Typed into the retry page's ?name=; a regex search raised re.error ("missing ), unterminated subpattern")
+    for name in ["max (dog", "koa[", "mochi+*"]:
+        web_process.probable_matches(name, date, roster)
+        get_likely_animal(name, date, roster.animals)
+    assert [m["ANIMALNAME"] for m in web_process.probable_matches("bella rose (", None, roster)]
@@ -0,0 +1,124 @@
+import pandas as pd
+import pyarrow as pa
+
+import animal_db_handler
+from animal_db_handler import add_failure_matching_columns, get_likely_animal, match_animals_bulk, read_roster_csv
+from animal_db_handler import get_roster
+from roster_snapshot import Roster, RosterSnapshot
+
+REPORT = (
+    "ID,ANIMALNAME,SHELTERCODE,DATEBROUGHTIN,TOTALDAYSONSHELTER,BREEDNAME,ANIMALCOMMENTS\n"
+    "1,Mochi,D2024001,01/02/2024,30,Poi Dog,friendly\n"
+    "2,Koa Bear,D2024002,2024-02-03,12,Chihuahua,\n"
+    "3,Lani,D2024003,03/04/2024 10:15,,Mix,shy\n"
+)
+
+
+def test_typed_read_keeps_only_used_columns():
+    roster = read_roster_csv(REPORT)
+    assert set(roster.columns) == {"ANIMALNAME", "SHELTERCODE", "DATEBROUGHTIN", "TOTALDAYSONSHELTER", "name", "end_date"}
+    assert roster["ANIMALNAME"].dtype == "string[pyarrow]"
+    assert roster["SHELTERCODE"].dtype == "string[pyarrow]"
+    assert roster["DATEBROUGHTIN"].dtype.kind == "M"
+    assert roster["end_date"].dtype.kind == "M"
+    # Mixed date formats still parse, normalized to midnight
+    assert roster.set_index("SHELTERCODE").loc["D2024003", "DATEBROUGHTIN"] == pd.Timestamp("2024-03-04")
+
+
+def test_failure_matching_columns_render_as_dates():
+    animals = add_failure_matching_columns(read_roster_csv(REPORT))
+    row = animals.set_index("SHELTERCODE").loc["D2024001"]
+    assert row["date_in"] == "2024-01-02"
+    assert row["last_day_on_shelter"] == "2024-02-02"
+
+
+def test_matching_works_on_typed_roster():
+    roster = read_roster_csv(REPORT)
+    match = get_likely_animal("KOA", pd.Timestamp("2024-02-05"), roster)
+    assert match.tolist() == ["Koa Bear", "D2024002"]
+
+    charges = pd.DataFrame({"ANIMALNAME": ["Mochi", "koa"], "COSTDATE": ["01/10/2024", "02/05/2024"]})
+    result = match_animals_bulk(charges, roster)
+    assert result["ANIMALCODE"].tolist() == ["D2024001", "D2024002"]
+
+
+def test_snapshot_maps_strings_without_copying(tmp_path):
+    animals = pd.DataFrame({
+        "ANIMALNAME": pd.array([f"Animal {i}" for i in range(20_000)], dtype="string[pyarrow]"),
+        "DATEBROUGHTIN": pd.Timestamp("2024-01-01") + pd.to_timedelta(range(20_000), unit="D"),
+    })
+    snapshot = RosterSnapshot(tmp_path / "roster.arrow")
+    snapshot.write(animals, "v1")
+
+    before = pa.total_allocated_bytes()
+    roster = RosterSnapshot(tmp_path / "roster.arrow").read()
+    # Only the datetime column is converted; the string data stays in the mapped file
+    string_bytes = pa.array(animals["ANIMALNAME"]).nbytes
+    assert pa.total_allocated_bytes() - before <= animals["DATEBROUGHTIN"].nbytes < string_bytes
+    assert roster.version == "v1"
+    assert roster.animals["ANIMALNAME"].dtype == "string[pyarrow]"
+    pd.testing.assert_frame_equal(roster.animals, animals)
+
+
+def test_snapshot_swap_is_picked_up_and_old_roster_stays_valid(tmp_path):
+    path = tmp_path / "roster.arrow"
+    writer, reader = RosterSnapshot(path), RosterSnapshot(path)
+    writer.write(read_roster_csv(REPORT), "v1")
+    old = reader.read()
+    assert reader.read() is old
+
+    writer.write(read_roster_csv(REPORT).head(1), "v2")
+    new = reader.read()
+    assert new.version == "v2"
+    assert len(new.animals) == 1
+    assert len(old.animals) == 3
+    assert reader.read(max_age=-1) is None
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_get_roster_shares_one_download_between_workers(monkeypatch, tmp_path):
+    downloads = []
+
+    def fake_download(login_data, *args):
+        downloads.append(login_data)
+        if len(downloads) > 1:
+            raise ConnectionError("database unavailable")
+        return REPORT
+
+    monkeypatch.setattr(animal_db_handler, "download_roster_csv", fake_download)
+    first = get_roster({}, RosterSnapshot(tmp_path / "roster.arrow"))
+    second = get_roster({}, RosterSnapshot(tmp_path / "roster.arrow"))
+    assert len(downloads) == 1
+    assert second.version == first.version
+    assert sorted(second.animals["SHELTERCODE"]) == ["D2024001", "D2024002", "D2024003"]
+
+    # A failed refresh keeps serving the stale snapshot
+    monkeypatch.setattr(animal_db_handler, "ROSTER_TTL_SECONDS", -1)
+    stale = get_roster({}, RosterSnapshot(tmp_path / "roster.arrow"))
+    assert len(downloads) == 2
+    assert stale.version == first.version
+
+
+def test_get_roster_downloads_directly_without_a_snapshot(monkeypatch, tmp_path):
+    def unwritable(*args, **kwargs):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(animal_db_handler, "download_roster_csv", lambda *args: REPORT)
+    monkeypatch.setattr(RosterSnapshot, "write", unwritable)
+    roster = get_roster({}, RosterSnapshot(tmp_path / "roster.arrow"))
+    assert roster.version == ""
+    assert sorted(roster.animals["SHELTERCODE"]) == ["D2024001", "D2024002", "D2024003"]
+
+
+def test_routine_matches_against_the_synced_roster(monkeypatch):
+    from unittest.mock import Mock
+
+    import utils
+
+    roster = Roster(read_roster_csv(REPORT), "v1")
+    monkeypatch.setattr(animal_db_handler, "get_roster", lambda *args: roster)
+    monkeypatch.setattr(animal_db_handler, "get_all_animals", Mock(side_effect=AssertionError("full download")))
+    processor = Mock()
+    processor.gmail.get_messages.return_value = [{"id": "m1", "threadId": "t1"}]
+    utils.process_invoices(processor, 3)
+    assert processor.process_invoices.call_args.kwargs["animals"] is roster.animals
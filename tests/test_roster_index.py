@@ -0,0 +1,80 @@
+import gc
+import re
+
+import numpy as np
+import pandas as pd
+
+import roster_index
+from animal_db_handler import get_likely_animal, get_probable_matches, read_roster_csv
+from roster_index import NameIndex, StayIndex, on_shelter, soundex, stay_index
+
+
+def random_roster(n, seed=0):
+    rng = np.random.default_rng(seed)
+    starts = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, n), unit="D")
+    ends = starts + pd.to_timedelta(rng.exponential(40, n).astype(int), unit="D")
+    df = pd.DataFrame({"DATEBROUGHTIN": starts, "end_date": ends, "SHELTERCODE": [f"D{i}" for i in range(n)]})
+    df.loc[rng.choice(n, n // 50, replace=False), "end_date"] = pd.NaT
+    # The roster is sorted by end date, not by intake
+    return df.sort_values("end_date").reset_index(drop=True)
+
+
+def test_matches_boolean_mask():
+    df = random_roster(5_000)
+    index = StayIndex.from_frame(df)
+    for date in pd.date_range("2014-12-30", "2025-03-01", periods=97).append(pd.DatetimeIndex(df["DATEBROUGHTIN"][:20])):
+        expected = np.flatnonzero(((df["DATEBROUGHTIN"] <= date) & (df["end_date"] >= date)).to_numpy())
+        np.testing.assert_array_equal(index.on_shelter(date), expected)
+
+
+def test_on_shelter_returns_rows_in_frame_order():
+    df = random_roster(500)
+    date = df["DATEBROUGHTIN"].iloc[100]
+    pd.testing.assert_frame_equal(on_shelter(df, date), df[(df["DATEBROUGHTIN"] <= date) & (df["end_date"] >= date)])
+    assert on_shelter(df.iloc[:0], date).empty
+
+
+def test_index_is_cached_per_live_frame():
+    df = random_roster(100)
+    assert stay_index(df) is stay_index(df)
+    assert stay_index(df.copy()) is not stay_index(df)
+    key = id(df)
+    del df
+    gc.collect()
+    assert all(cached != key for cached, _ in roster_index._indexes)
+
+
+def test_soundex():
+    codes = {"robert": "R163", "rupert": "R163", "ashcraft": "A261", "tymczak": "T522", "pfister": "P236", "lee": "L000"}
+    assert {word: soundex(word) for word in codes} == codes
+    assert soundex("42") == ""
+
+
+def test_word_lookup_matches_regex():
+    names = pd.Series(["mochi bear", "koa", "bella-rose", "lani (2)", "koa jr.", "", None, "r2_d2", "bellarose"])
+    index = NameIndex(names)
+    for query in ["koa", "bear koa", "rose", "bella-rose", "jr.", "r2_d2", "nope", "lani"]:
+        pattern = r"\b" + r"\b|\b".join(re.escape(word) for word in query.split()) + r"\b"
+        expected = np.flatnonzero(names.str.contains(pattern, regex=True, na=False).to_numpy())
+        np.testing.assert_array_equal(index.rows_with_words(query.split()), expected)
+    np.testing.assert_array_equal(index.rows_with_words(["koa"], np.array([0, 4])), [4])
+
+
+def test_spelling_variants_match():
+    roster = read_roster_csv(
+        '"ANIMALNAME","SHELTERCODE","DATEBROUGHTIN","TOTALDAYSONSHELTER"\n'
+        '"Bella-Rose","D1","01/02/2024","30"\n'
+        '"Mochi","D2","01/02/2024","30"\n'
+        '"Mochi Bear","D3","01/02/2024","30"\n'
+        '"Koa","D4","01/02/2024","30"\n'
+        '"Maxwell","D5","01/02/2024","30"\n'
+        '"Maxwill","D6","01/02/2024","30"\n'
+    )
+    date = pd.Timestamp("2024-01-10")
+    assert get_likely_animal("Bellarose", date, roster).tolist() == ["Bella-Rose", "D1"]
+    assert get_likely_animal("Bela Rose", date, roster).tolist() == ["Bella-Rose", "D1"]
+    assert get_likely_animal("Kowa", date, roster).tolist() == ["Koa", "D4"]
+    # Two animals are equally close, so the charge stays unmatched
+    assert get_likely_animal("Maxwall", date, roster)["SHELTERCODE"] == "ERROR_CODE"
+    assert get_probable_matches("Bellarose", roster, date)["SHELTERCODE"].tolist() == ["D1"]
+    assert get_probable_matches("mochi", roster, date)["SHELTERCODE"].tolist() == ["D2", "D3"]
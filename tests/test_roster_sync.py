@@ -0,0 +1,94 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import animal_db_handler
+from animal_db_handler import sync_roster
+from roster_snapshot import RosterSnapshot
+
+HEADER = '"ID","ANIMALNAME","SHELTERCODE","DATEBROUGHTIN","TOTALDAYSONSHELTER"\n'
+FULL = HEADER + (
+    '"1","Mochi","D001","01/02/2024","30"\n'
+    '"2","Koa","D002","02/03/2024","12"\n'
+    '"3","Lani","D003","03/04/2024","5"\n'
+)
+DELTA = HEADER + (
+    '"2","Koa Bear","D002","02/03/2024","40"\n'
+    '"4","Nalu","D004","04/05/2024","1"\n'
+)
+
+
+class FakeShelterManager(BaseHTTPRequestHandler):
+    reports: dict = {}
+    requests: list = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        self.requests.append(query)
+        body = self.reports[query["id"][0]].encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    FakeShelterManager.reports = {"216": FULL, "300": DELTA}
+    FakeShelterManager.requests = []
+    monkeypatch.setattr(animal_db_handler, "ROSTER_DELTA_REPORT_ID", "300")
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeShelterManager)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+LOGIN = {"database": "db", "username": "u", "password": "p"}
+
+
+def test_delta_sync_merges_changes_into_snapshot(server, tmp_path):
+    snapshot = RosterSnapshot(tmp_path / "roster.arrow")
+    first = sync_roster(LOGIN, snapshot, server)
+    second = sync_roster(LOGIN, snapshot, server)
+
+    assert [r["id"] for r in FakeShelterManager.requests] == [["216"], ["300"]]
+    assert "ASK1" in FakeShelterManager.requests[1]
+    assert second.version != first.version
+    animals = second.animals.set_index("SHELTERCODE")
+    assert sorted(animals.index) == ["D001", "D002", "D003", "D004"]
+    assert animals.loc["D002", "ANIMALNAME"] == "Koa Bear"
+    assert animals.loc["D002", "TOTALDAYSONSHELTER"].days == 40
+    assert second.animals["end_date"].is_monotonic_increasing
+    # A delta is not a full sync, so the reconciliation clock keeps running
+    assert snapshot.full_sync_at < snapshot.written_at
+
+
+def test_empty_delta_keeps_version(server, tmp_path):
+    FakeShelterManager.reports["300"] = ""
+    snapshot = RosterSnapshot(tmp_path / "roster.arrow")
+    first = sync_roster(LOGIN, snapshot, server)
+    assert sync_roster(LOGIN, snapshot, server).version == first.version
+
+
+def test_full_reconciliation_drops_deleted_animals(server, tmp_path, monkeypatch):
+    snapshot = RosterSnapshot(tmp_path / "roster.arrow")
+    sync_roster(LOGIN, snapshot, server)
+    sync_roster(LOGIN, snapshot, server)
+
+    monkeypatch.setattr(animal_db_handler, "ROSTER_FULL_SYNC_SECONDS", -1)
+    roster = sync_roster(LOGIN, snapshot, server)
+    assert FakeShelterManager.requests[-1]["id"] == ["216"]
+    assert sorted(roster.animals["SHELTERCODE"]) == ["D001", "D002", "D003"]
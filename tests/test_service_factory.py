@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+import service_factory
+from google_services import DriveService, GmailService
+from service_factory import authorized_http, build_service, discovery_document, get_service
+
+
+def user_creds(refresh_token="refresh-1"):
+    return Credentials(token="token", refresh_token=refresh_token, client_id="client", client_secret="secret")
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    service_factory.clear_caches()
+    yield
+    service_factory.clear_caches()
+
+
+def test_build_service_uses_bundled_documents_offline(monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("discovery must not hit the network")
+
+    monkeypatch.setattr("httplib2.Http.request", no_network)
+    discovery_document.cache_clear()
+    drive = build_service("drive", "v3", user_creds())
+    gmail = build_service("gmail", "v1", user_creds())
+    assert hasattr(drive, "files") and hasattr(gmail, "users")
+
+    build_service("drive", "v3", user_creds())
+    assert discovery_document.cache_info().misses == 2
+
+
+def test_unknown_api_raises():
+    with pytest.raises(ValueError):
+        discovery_document("not-an-api", "v0")
+
+
+def test_transport_is_shared_per_account():
+    first = authorized_http(user_creds())
+    assert authorized_http(user_creds()) is first
+    assert authorized_http(user_creds("refresh-2")) is not first
+
+
+def test_transport_is_per_thread():
+    main = authorized_http(user_creds())
+    other = []
+    thread = threading.Thread(target=lambda: other.append(authorized_http(user_creds())))
+    thread.start()
+    thread.join()
+    assert other[0] is not main
+
+
+def test_get_service_reuses_instances():
+    drive = get_service(DriveService, user_creds())
+    assert get_service(DriveService, user_creds()) is drive
+    assert get_service(GmailService, user_creds()) is not drive
+    assert get_service(DriveService, user_creds("refresh-2")) is not drive
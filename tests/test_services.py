@@ -1,3 +1,56 @@
 import pytest
 
+from google_services import DriveService, parents_queries
 
+
+class FakeFiles:
+    """Stands in for `service.files()`, serving `pages` of results and recording every list call."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def list(self, **kwargs):
+        self.calls.append(kwargs)
+        self.response = self.pages.pop(0)
+        return self
+
+    def execute(self):
+        return self.response
+
+
+@pytest.fixture
+def drive_with(monkeypatch):
+    """A DriveService whose `files().list` serves `pages` in turn."""
+    def build(pages):
+        files = FakeFiles(pages)
+        monkeypatch.setattr("google_services.build_service", lambda *args: type("Service", (), {"files": lambda self: files})())
+        return DriveService(creds=None), files
+    return build
+
+
+def test_parents_queries_respect_the_length_limit():
+    ids = [f"folder{n:03d}" for n in range(100)]
+    queries = parents_queries(ids, max_length=500)
+    assert len(queries) > 1
+    assert all(len(q) <= 500 for q in queries)
+    assert " or ".join(queries) == " or ".join(f"'{i}' in parents" for i in ids)
+    assert parents_queries([]) == []
+
+
+def test_matching_folders_are_listed_in_one_query(drive_with):
+    drive, files = drive_with([
+        {"files": [{"id": "a"}, {"id": "b"}, {"id": "c"}]},
+        {"files": [{"id": "1", "name": "x.pdf"}], "nextPageToken": "next"},
+        {"files": [{"id": "2", "name": "y.pdf"}]},
+    ])
+
+    pdfs = drive.get_all_files_in_matching_folder("root", "_incomplete", "pdf")
+    assert [pdf["id"] for pdf in pdfs] == ["1", "2"]
+
+    folders, first, second = files.calls
+    assert folders["q"] == "'root' in parents and mimeType='application/vnd.google-apps.folder' and name contains '_incomplete'"
+    assert folders["fields"] == "nextPageToken,files(id)"
+    assert first["q"] == "('a' in parents or 'b' in parents or 'c' in parents) and mimeType='application/pdf'"
+    assert first["fields"] == "nextPageToken,files(id,name,webViewLink)"
+    assert second["pageToken"] == "next"